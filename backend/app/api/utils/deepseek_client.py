@@ -1,99 +1,89 @@
-import requests
-from typing import List, Dict, Any
-from app.api.utils.llm_interface import LLMClient
-from config.settings import settings
+import httpx
+from typing import List, Dict, Any, AsyncIterator
+from app.api.utils.llm_interface import AsyncLLMClient
+from app.api.utils.sse import iter_chat_chunks
+from app.api.utils.http_pool import get_http_client
+from app.api.utils.rate_limiter import get_limiter
+from app.api.utils.logger import get_logger
+from config.settings import DeepseekR1Settings
 
-class DeepSeekClient(LLMClient):
-    def chat_completion(self, messages: List[Dict[str, str]], thinking_enabled: bool = False) -> Dict[str, Any]:
-        """
-        DeepSeek API client implementation.
-        Note: thinking_enabled is implicitly handled by choosing the 'deepseek-reasoner' model in settings.
-        """
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {settings.DEEPSEEK_API_KEY}"
-        }
-        
-        # DeepSeek R1 (deepseek-reasoner) might have specific parameter constraints,
-        # but generally follows OpenAI format.
-        payload = {
-            "model": settings.LLM_MODEL,
-            "messages": messages,
-            "max_tokens": 8000, # Adjust as needed
-            "stream": False
-        }
-        
-        # If not reasoning model, we might want temperature. 
-        # For reasoner, it's often recommended to leave temperature default or 0.6.
-        # We'll set it only if not explicitly R1 or if we want to force it.
-        # But let's keep it simple.
-        if "reasoner" not in settings.LLM_MODEL:
-             payload["temperature"] = 1.0
+log = get_logger("llm")
 
+def _build_headers(config: DeepseekR1Settings) -> Dict[str, str]:
+    return {
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {config.DEEPSEEK_API_KEY}"
+    }
+
+def _build_payload(config: DeepseekR1Settings, messages: List[Dict[str, str]], stream: bool) -> Dict[str, Any]:
+    # DeepSeek R1 (deepseek-reasoner) might have specific parameter constraints,
+    # but generally follows OpenAI format.
+    payload = {
+        "model": config.LLM_MODEL,
+        "messages": messages,
+        "max_tokens": config.LLM_MAX_TOKENS,
+        "stream": stream
+    }
+
+    # If not reasoning model, we might want temperature. 
+    # For reasoner, it's often recommended to leave temperature default or 0.6.
+    # We'll set it only if not explicitly R1 or if we want to force it.
+    # But let's keep it simple.
+    if "reasoner" not in config.LLM_MODEL:
+         payload["temperature"] = 1.0
+    return payload
+
+class AsyncDeepSeekClient(AsyncLLMClient):
+    """
+    asyncio DeepSeek client running on the shared 'deepseek' connection pool.
+    """
+    provider = "deepseek"
+
+    def __init__(self, config: DeepseekR1Settings = None, model: str = None):
+        self.config = config or DeepseekR1Settings()
+        if model:
+            self.config.LLM_MODEL = model
+
+    @property
+    def model(self) -> str:
+        return self.config.LLM_MODEL
+
+    def request_payload(self, messages: List[Dict[str, str]], thinking_enabled: bool = False) -> Dict[str, Any]:
+        return _build_payload(self.config, messages, stream=False)
+
+    async def _chat_completion(self, messages: List[Dict[str, str]], thinking_enabled: bool = False) -> Dict[str, Any]:
+        client = get_http_client(self.provider)
         try:
-            response = requests.post(settings.DEEPSEEK_API_URL, json=payload, headers=headers)
+            # Non-streaming calls are background work (cards, summaries)
+            response = await get_limiter(self.provider).request(
+                lambda: client.post(self.config.DEEPSEEK_API_URL, json=self.request_payload(messages, thinking_enabled), headers=_build_headers(self.config)),
+                lane="background",
+                max_retries=self.config.LLM_MAX_RETRIES,
+            )
             response.raise_for_status()
             return response.json()
-        except requests.exceptions.RequestException as e:
-            # Log error properly in production
-            print(f"DeepSeek API Error: {e}")
-            if e.response:
-                print(f"Response: {e.response.text}")
+        except httpx.HTTPStatusError as e:
+            log.error("DeepSeek API error", provider="deepseek", error=str(e), response=e.response.text[:500])
             return {"error": str(e)}
+        except httpx.HTTPError as e:
+            log.error("DeepSeek API error", provider="deepseek", error=repr(e))
+            return {"error": str(e) or repr(e)}
 
-    def chat_completion_stream(self, messages: List[Dict[str, str]], thinking_enabled: bool = False):
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {settings.DEEPSEEK_API_KEY}"
-        }
-        
-        payload = {
-            "model": settings.LLM_MODEL,
-            "messages": messages,
-            "max_tokens": 8000,
-            "stream": True
-        }
-        
-        if "reasoner" not in settings.LLM_MODEL:
-             payload["temperature"] = 1.0
-
+    async def chat_completion_stream(self, messages: List[Dict[str, str]], thinking_enabled: bool = False, reasoning: bool = False) -> AsyncIterator[str]:
+        client = get_http_client(self.provider)
         try:
-            with requests.post(settings.DEEPSEEK_API_URL, json=payload, headers=headers, stream=True, timeout=60) as response:
-                    response.raise_for_status()
-                    import json
-                    for line in response.iter_lines():
-                        if line:
-                            line_str = line.decode('utf-8')
-                            print(f"[DeepSeek RAW] {line_str[:100]}") # Debug log
-                            if line_str.startswith('data: '):
-                                json_str = line_str[6:]
-                                if json_str.strip() == '[DONE]':
-                                    break
-                                try:
-                                    data = json.loads(json_str)
-                                    if "choices" in data and len(data["choices"]) > 0:
-                                        delta = data["choices"][0].get("delta", {})
-                                        content = delta.get("content", "")
-                                        reasoning = delta.get("reasoning_content", "")
-                                        
-                                        # Handle reasoning if needed (optional)
-                                        if reasoning:
-                                            print(f"[Reasoning] {reasoning[:50]}...", end="\r")
-                                            
-                                        if content:
-                                            yield content
-                                except json.JSONDecodeError:
-                                    print(f"[DeepSeek JSON Error] {json_str}")
-                                    pass
-                            else:
-                                # Handle non-SSE response or error body
-                                try:
-                                    data = json.loads(line_str)
-                                    if "error" in data:
-                                        yield f"[ERROR] {data['error']}"
-                                except:
-                                    pass
-        except requests.exceptions.RequestException as e:
-            print(f"DeepSeek Stream Error: {e}")
-            yield f"[ERROR] {str(e)}"
-
+            async with get_limiter(self.provider).stream(
+                lambda: client.stream("POST", self.config.DEEPSEEK_API_URL, json=_build_payload(self.config, messages, stream=True), headers=_build_headers(self.config)),
+                lane="interactive",
+                max_retries=self.config.LLM_STREAM_MAX_RETRIES,
+            ) as response:
+                if response.is_error:
+                    await response.aread()
+                    log.error("DeepSeek stream error", provider="deepseek", status=response.status_code, response=response.text[:200])
+                    yield f"[ERROR] {response.status_code} {response.reason_phrase}"
+                    return
+                async for chunk in iter_chat_chunks(response.aiter_bytes(), self.provider, reasoning):
+                    yield chunk
+        except httpx.HTTPError as e:
+            log.error("DeepSeek stream error", provider="deepseek", error=repr(e))
+            yield f"[ERROR] {str(e) or repr(e)}"
@@ -1,16 +1,9 @@
-from app.api.utils.llm_interface import LLMClient
-from app.api.utils.zhipu_client import ZhipuClient
-from app.api.utils.deepseek_client import DeepSeekClient
-from config.settings import settings
+from app.api.utils.llm_interface import AsyncLLMClient
+from app.api.utils.registry import llm_registry
 
-def get_llm_client() -> LLMClient:
+def get_async_llm_client(name: str = None) -> AsyncLLMClient:
     """
-    Factory function to get the configured LLM client.
+    Return a shared asyncio LLM client from the process-wide registry.
+    Clients are created once at startup, not per request.
     """
-    if settings.LLM_PROVIDER == "zhipu":
-        return ZhipuClient()
-    elif settings.LLM_PROVIDER == "deepseek":
-        return DeepSeekClient()
-    else:
-        # Default fallback or error
-        raise ValueError(f"Unsupported LLM provider: {settings.LLM_PROVIDER}")
+    return llm_registry.get(name)
@@ -0,0 +1,306 @@
+import asyncio
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from app.api.utils.llm_interface import AsyncLLMClient, Reasoning, stream_provider
+from app.api.utils.logger import get_logger
+
+log = get_logger("llm")
+
+# Weight of the newest observation in the moving averages
+EWMA_ALPHA = 0.2
+
+class ProviderHealth:
+    """
+    Rolling health of one upstream: success rate and time-to-first-token
+    moving averages, plus a circuit breaker.
+
+    The circuit opens after `failure_threshold` consecutive failures. After
+    `cooldown` seconds one probe request is let through ("half_open"); its
+    outcome closes the circuit again or restarts the cooldown.
+    """
+    def __init__(self, name: str, failure_threshold: int = 3, cooldown: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.opened_at = 0.0
+        self.consecutive_failures = 0
+        self.success_rate = 1.0
+        self.latency: Optional[float] = None
+        self.requests = 0
+        self.failures = 0
+        self._probing = False
+
+    def allow(self, now: float = None) -> bool:
+        now = time.monotonic() if now is None else now
+        if self.state == "open":
+            if now - self.opened_at < self.cooldown:
+                return False
+            self.state = "half_open"
+        if self.state == "half_open":
+            if self._probing:
+                return False
+            self._probing = True
+        return True
+
+    def record_success(self, latency: float):
+        self.requests += 1
+        self.consecutive_failures = 0
+        self.success_rate += EWMA_ALPHA * (1.0 - self.success_rate)
+        self.latency = latency if self.latency is None else self.latency + EWMA_ALPHA * (latency - self.latency)
+        if self.state != "closed":
+            log.info("Circuit closed", provider=self.name)
+        self.state = "closed"
+        self._probing = False
+
+    def record_failure(self, reason: str):
+        self.requests += 1
+        self.failures += 1
+        self.consecutive_failures += 1
+        self.success_rate -= EWMA_ALPHA * self.success_rate
+        if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+            if self.state != "open":
+                log.warning("Circuit opened", provider=self.name, failures=self.consecutive_failures, reason=reason)
+            self.state = "open"
+            self.opened_at = time.monotonic()
+        self._probing = False
+
+    def release(self):
+        """
+        An attempt ended without a verdict (cancelled); free the probe slot.
+        """
+        self._probing = False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "success_rate": round(self.success_rate, 3),
+            "latency_s": round(self.latency, 3) if self.latency is not None else None,
+            "consecutive_failures": self.consecutive_failures,
+            "requests": self.requests,
+            "failures": self.failures,
+        }
+
+class FailoverStream:
+    """
+    One streamed reply from a FailoverClient. Once it has committed to an
+    upstream, `name` is that client's registry name and `provider` its
+    provider, for metrics (see stream_provider); both are None before that.
+    """
+    def __init__(self):
+        self.name: Optional[str] = None
+        self.provider: Optional[str] = None
+        self._chunks: Optional[AsyncIterator[str]] = None
+
+    def __aiter__(self):
+        return self
+
+    def __anext__(self):
+        return self._chunks.__anext__()
+
+    async def aclose(self):
+        await self._chunks.aclose()
+
+class FailoverClient(AsyncLLMClient):
+    """
+    Routes requests across several provider clients in preference order.
+
+    Providers with an open circuit are skipped, and healthy ones are tried
+    before degraded ones (success rate below `min_success_rate`). A stream
+    that yields no content within the first-token deadline, or errors before
+    its first token, is abandoned for the next provider; once content has
+    been sent the stream is committed to that provider.
+
+    Calls made with hedge=True start a backup request on the next provider
+    if the first has not answered after `hedge_delay` seconds, and take
+    whichever succeeds first.
+    """
+    provider = "failover"
+
+    def __init__(
+        self,
+        clients: List[Tuple[str, AsyncLLMClient]],
+        first_token_timeout: float = 15.0,
+        thinking_first_token_timeout: float = 60.0,
+        hedge_delay: float = 0.0,
+        failure_threshold: int = 3,
+        cooldown: float = 30.0,
+        min_success_rate: float = 0.5,
+    ):
+        if not clients:
+            raise ValueError("FailoverClient needs at least one client")
+        self.clients = clients
+        self.first_token_timeout = first_token_timeout
+        self.thinking_first_token_timeout = thinking_first_token_timeout
+        self.hedge_delay = hedge_delay
+        self.min_success_rate = min_success_rate
+        self.health = {name: ProviderHealth(name, failure_threshold, cooldown) for name, _ in clients}
+        self.failovers = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    @property
+    def model(self) -> str:
+        # Prompts are budgeted for the preferred model
+        return self.clients[0][1].model
+
+    def request_payload(self, messages: List[Dict[str, str]], thinking_enabled: bool = False) -> Dict[str, Any]:
+        return self.clients[0][1].request_payload(messages, thinking_enabled)
+
+    def excluding(self, name: str) -> Optional["FailoverClient"]:
+        """
+        A FailoverClient over the other providers, sharing their health, or
+        None if there are no others.
+        """
+        others = [(other, client) for other, client in self.clients if other != name]
+        if not others:
+            return None
+        router = FailoverClient(
+            others, self.first_token_timeout, self.thinking_first_token_timeout, self.hedge_delay,
+            min_success_rate=self.min_success_rate,
+        )
+        router.health = {other: self.health[other] for other, _ in others}
+        return router
+
+    def _candidates(self) -> List[Tuple[str, AsyncLLMClient]]:
+        healthy, degraded = [], []
+        for name, client in self.clients:
+            health = self.health[name]
+            if health.state == "open" and time.monotonic() - health.opened_at < health.cooldown:
+                continue
+            (healthy if health.success_rate >= self.min_success_rate else degraded).append((name, client))
+        return healthy + degraded
+
+    async def _attempt(self, name: str, client: AsyncLLMClient, messages, thinking_enabled: bool, allowed: bool = False) -> Dict[str, Any]:
+        """
+        One request to `name`. `allowed` means the caller already passed its circuit breaker.
+        """
+        health = self.health[name]
+        if not allowed and not health.allow():
+            return {"error": f"{name}: circuit open"}
+        started = time.monotonic()
+        try:
+            response = await client._chat_completion(messages, thinking_enabled)
+        except asyncio.CancelledError:
+            health.release()
+            raise
+        except Exception as e:
+            response = {"error": str(e) or repr(e)}
+        if "error" in response:
+            health.record_failure(str(response["error"])[:100])
+        else:
+            health.record_success(time.monotonic() - started)
+        return response
+
+    async def _chat_completion(self, messages: List[Dict[str, str]], thinking_enabled: bool = False) -> Dict[str, Any]:
+        return await self._complete_in_order(self._candidates(), messages, thinking_enabled)
+
+    async def _complete_in_order(self, candidates, messages, thinking_enabled: bool) -> Dict[str, Any]:
+        response = {"error": "no LLM provider available"}
+        attempted = 0
+        for name, client in candidates:
+            if not self.health[name].allow():
+                continue
+            if attempted:
+                self.failovers += 1
+                log.warning("Failing over", provider=name, error=response['error'])
+            attempted += 1
+            response = await self._attempt(name, client, messages, thinking_enabled, allowed=True)
+            if "error" not in response:
+                return response
+        return response
+
+    async def _hedged_completion(self, messages: List[Dict[str, str]], thinking_enabled: bool = False) -> Dict[str, Any]:
+        candidates = self._candidates()
+        if self.hedge_delay <= 0 or len(candidates) < 2:
+            return await self._complete_in_order(candidates, messages, thinking_enabled)
+
+        (primary_name, primary), (backup_name, backup) = candidates[0], candidates[1]
+        primary_task = asyncio.create_task(self._attempt(primary_name, primary, messages, thinking_enabled))
+        done, _ = await asyncio.wait({primary_task}, timeout=self.hedge_delay)
+        if done:
+            response = primary_task.result()
+            if "error" not in response:
+                return response
+            return await self._complete_in_order(candidates[1:], messages, thinking_enabled)
+
+        self.hedges += 1
+        log.info("Hedging slow request", provider=primary_name, backup=backup_name, hedge_delay=self.hedge_delay)
+        backup_task = asyncio.create_task(self._attempt(backup_name, backup, messages, thinking_enabled))
+        pending = {primary_task, backup_task}
+        response = {"error": "no LLM provider available"}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    response = task.result()
+                    if "error" not in response:
+                        if task is backup_task:
+                            self.hedge_wins += 1
+                        return response
+        finally:
+            for task in pending:
+                task.cancel()
+        return response
+
+    def chat_completion_stream(self, messages: List[Dict[str, str]], thinking_enabled: bool = False, reasoning: bool = False) -> "FailoverStream":
+        stream = FailoverStream()
+        stream._chunks = self._stream(stream, messages, thinking_enabled, reasoning)
+        return stream
+
+    async def _stream(self, route: "FailoverStream", messages, thinking_enabled: bool, reasoning: bool) -> AsyncIterator[str]:
+        deadline = self.thinking_first_token_timeout if thinking_enabled else self.first_token_timeout
+        last_error = "no LLM provider available"
+        attempted = 0
+        for name, client in self._candidates():
+            health = self.health[name]
+            if not health.allow():
+                continue
+            if attempted:
+                self.failovers += 1
+                log.warning("Failing over stream", provider=name, error=last_error)
+            attempted += 1
+            started = time.monotonic()
+            stream = client.chat_completion_stream(messages, thinking_enabled=thinking_enabled, reasoning=reasoning)
+            try:
+                first = await asyncio.wait_for(stream.__anext__(), timeout=deadline)
+            except asyncio.TimeoutError:
+                last_error = f"{name}: no first token within {deadline}s"
+                health.record_failure(last_error)
+                await stream.aclose()
+                continue
+            except StopAsyncIteration:
+                last_error = f"{name}: empty stream"
+                health.record_failure(last_error)
+                continue
+            except asyncio.CancelledError:
+                health.release()
+                await stream.aclose()
+                raise
+            if not isinstance(first, Reasoning) and first.startswith("[ERROR]"):
+                last_error = f"{name}: {first[8:]}"
+                health.record_failure(last_error)
+                await stream.aclose()
+                continue
+
+            # Committed to this provider from here on
+            health.record_success(time.monotonic() - started)
+            route.name, route.provider = name, stream_provider(client, stream)
+            log.debug("Streaming", provider=name, first_token_seconds=round(time.monotonic() - started, 3))
+            try:
+                yield first
+                async for chunk in stream:
+                    yield chunk
+            finally:
+                await stream.aclose()
+            return
+        yield f"[ERROR] {last_error}"
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "order": [name for name, _ in self.clients],
+            "providers": {name: health.stats() for name, health in self.health.items()},
+            "failovers": self.failovers,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+        }
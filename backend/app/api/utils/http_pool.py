@@ -0,0 +1,41 @@
+import httpx
+from typing import Dict
+from config.settings import settings
+
+# One pooled AsyncClient per provider, kept for the whole process so that
+# keep-alive connections (and their TLS sessions) are reused across requests.
+_clients: Dict[str, httpx.AsyncClient] = {}
+
+def build_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=settings.HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY,
+    )
+
+def build_timeout() -> httpx.Timeout:
+    return httpx.Timeout(
+        connect=settings.HTTP_CONNECT_TIMEOUT,
+        read=settings.HTTP_READ_TIMEOUT,
+        write=settings.HTTP_WRITE_TIMEOUT,
+        pool=settings.HTTP_POOL_TIMEOUT,
+    )
+
+def get_http_client(provider: str) -> httpx.AsyncClient:
+    """
+    Return the shared connection pool for a provider, creating it on first use.
+    """
+    client = _clients.get(provider)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(limits=build_limits(), timeout=build_timeout())
+        _clients[provider] = client
+    return client
+
+async def close_http_clients():
+    """
+    Close every provider pool. Called once at application shutdown.
+    """
+    clients = list(_clients.values())
+    _clients.clear()
+    for client in clients:
+        await client.aclose()
@@ -1,28 +1,98 @@
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any
+from typing import List, Dict, Any, AsyncIterator
+from app.api.utils.response_cache import response_cache
 
-class LLMClient(ABC): 
-    @abstractmethod
-    def chat_completion(
+class Reasoning(str):
+    """
+    A streamed chunk of the model's reasoning (`reasoning_content`) rather
+    than its answer. Only yielded to callers that ask for reasoning=True;
+    everyone else gets the answer text alone, as before.
+    """
+    __slots__ = ()
+
+def stream_provider(client: "AsyncLLMClient", stream) -> str:
+    """
+    Provider serving a stream returned by `client.chat_completion_stream`.
+    Routing clients' streams say which upstream they committed to; for
+    everyone else it is the client's own provider.
+    """
+    return getattr(stream, "provider", None) or client.provider
+
+class AsyncLLMClient(ABC):
+    """
+    LLM provider client, safe to await from the event loop.
+    """
+    provider: str = ""
+
+    async def chat_completion(
         self, messages: List[Dict[str, str]],
-        thinking_enabled: bool = False
+        thinking_enabled: bool = False,
+        cache: bool = False,
+        hedge: bool = False
     ) -> Dict[str, Any]:
         """
         Send a chat completion request to the LLM provider.
-        
+
         :param messages: List of message dictionaries (role, content).
         :param thinking_enabled: Whether to enable "thinking" or "reasoning" mode.
+        :param cache: Serve identical requests from the shared response cache.
+                      Only for calls whose answer may be reused, not for chat replies.
+        :param hedge: Allow a routing client to race a backup provider when the
+                      first is slow. Single-provider clients ignore it.
         :return: The response dictionary from the API.
         """
+        fetch = self._hedged_completion if hedge else self._chat_completion
+        if not cache or not response_cache.enabled:
+            return await fetch(messages, thinking_enabled)
+        return await response_cache.get_or_fetch(
+            self.cache_key(messages, thinking_enabled),
+            lambda: fetch(messages, thinking_enabled),
+        )
+
+    def cache_key(self, messages: List[Dict[str, str]], thinking_enabled: bool = False) -> str:
+        return response_cache.make_key(self.provider, self.request_payload(messages, thinking_enabled))
+
+    @abstractmethod
+    def request_payload(self, messages: List[Dict[str, str]], thinking_enabled: bool = False) -> Dict[str, Any]:
+        """
+        Body of the non-streaming request, which is also what the cache key hashes.
+        """
         pass
 
     @abstractmethod
-    def chat_completion_stream(
+    async def _chat_completion(
         self, messages: List[Dict[str, str]],
         thinking_enabled: bool = False
-    ):
+    ) -> Dict[str, Any]:
+        """
+        Uncached request to the provider; implemented by each client.
+        """
+        pass
+
+    async def _hedged_completion(
+        self, messages: List[Dict[str, str]],
+        thinking_enabled: bool = False
+    ) -> Dict[str, Any]:
+        return await self._chat_completion(messages, thinking_enabled)
+
+    @abstractmethod
+    def chat_completion_stream(
+        self, messages: List[Dict[str, str]],
+        thinking_enabled: bool = False,
+        reasoning: bool = False
+    ) -> AsyncIterator[str]:
         """
         Send a streaming chat completion request to the LLM provider.
-        Yields chunks of content.
+        Returns an async iterator over chunks of content.
+
+        :param reasoning: Also yield the model's reasoning, as Reasoning chunks
+                          ahead of the content. Otherwise it is discarded.
+        """
+        pass
+
+    async def aclose(self):
+        """
+        Release resources owned by this client. Shared connection pools are
+        closed separately, so the default is a no-op.
         """
         pass
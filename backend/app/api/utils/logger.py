@@ -0,0 +1,187 @@
+"""
+Structured, non-blocking logging.
+
+Every record is one JSON object per line on stdout:
+
+    {"ts":"2026-01-01T12:00:00.123Z","level":"info","category":"llm","msg":"...", ...fields}
+
+A log call only checks the level and puts the LogRecord on a bounded queue;
+a listener thread formats and writes it, so json.dumps and stdout I/O never
+run on the event loop. When the queue is full, records are dropped (and
+counted) instead of blocking a request.
+
+Modules log under a category (`get_logger("llm")`), and each category's
+level can be set separately: LOG_LEVELS="llm=DEBUG,chat=WARNING". Large
+debug payloads go through `sampled`, which builds them for only a fraction
+(LOG_DEBUG_SAMPLE_RATE) of calls.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import time
+from typing import Any, Dict, Optional
+
+ROOT = "greenbanana"
+
+def _level(name: str) -> Optional[int]:
+    value = logging.getLevelName(name.strip().upper())
+    return value if isinstance(value, int) else None
+
+def parse_levels(spec: str) -> Dict[str, int]:
+    """
+    "llm=DEBUG, chat=warning" -> {"llm": 10, "chat": 30}. Bad entries are ignored.
+    """
+    levels = {}
+    for part in (spec or "").split(","):
+        category, _, level = part.partition("=")
+        value = _level(level)
+        if category.strip() and value is not None:
+            levels[category.strip()] = value
+    return levels
+
+def _category(record: logging.LogRecord) -> str:
+    return record.name[len(ROOT) + 1:] if record.name.startswith(ROOT + ".") else record.name
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname.lower(),
+            "category": _category(record),
+            "msg": record.getMessage(),
+        }
+        data.update(getattr(record, "fields", None) or {})
+        if record.exc_info:
+            data["exc"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str, separators=(",", ":"))
+
+class TextFormatter(logging.Formatter):
+    """
+    Human-readable variant for local development (LOG_FORMAT=text).
+    """
+    def format(self, record: logging.LogRecord) -> str:
+        line = f"{time.strftime('%H:%M:%S', time.localtime(record.created))} {record.levelname:<7} [{_category(record)}] {record.getMessage()}"
+        fields = getattr(record, "fields", None)
+        if fields:
+            line += " " + " ".join(f"{k}={json.dumps(v, ensure_ascii=False, default=str)}" for k, v in fields.items())
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that never blocks and leaves all formatting to the listener.
+    """
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The stock prepare() formats here, on the caller's thread; the
+        # listener in this process can format the record itself
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+class StructuredLogger:
+    """
+    Thin wrapper over a stdlib logger taking structured fields as keywords:
+
+        log.info("Stream cancelled", stream_id=sid, tokens=120)
+    """
+    __slots__ = ("_logger",)
+
+    def __init__(self, name: str):
+        self._logger = logging.getLogger(name)
+
+    def is_enabled(self, level: int) -> bool:
+        return self._logger.isEnabledFor(level)
+
+    def _log(self, level: int, msg: str, fields: Dict[str, Any], exc_info=False):
+        if self._logger.isEnabledFor(level):
+            self._logger.log(level, msg, extra={"fields": fields} if fields else None, exc_info=exc_info)
+
+    def debug(self, msg: str, **fields):
+        self._log(logging.DEBUG, msg, fields)
+
+    def info(self, msg: str, **fields):
+        self._log(logging.INFO, msg, fields)
+
+    def warning(self, msg: str, **fields):
+        self._log(logging.WARNING, msg, fields)
+
+    def error(self, msg: str, **fields):
+        self._log(logging.ERROR, msg, fields)
+
+    def exception(self, msg: str, **fields):
+        self._log(logging.ERROR, msg, fields, exc_info=True)
+
+    def sampled(self, msg: str, rate: Optional[float] = None, **fields):
+        """
+        Debug record for a sample of calls. Callable field values are only
+        evaluated when the record is kept, so expensive payloads cost nothing
+        the rest of the time.
+        """
+        if not self._logger.isEnabledFor(logging.DEBUG):
+            return
+        rate = _state["sample_rate"] if rate is None else rate
+        if rate < 1.0 and random.random() >= rate:
+            return
+        fields = {k: (v() if callable(v) else v) for k, v in fields.items()}
+        fields["sample_rate"] = rate
+        self._logger.log(logging.DEBUG, msg, extra={"fields": fields})
+
+def get_logger(category: str) -> StructuredLogger:
+    return StructuredLogger(f"{ROOT}.{category}")
+
+_state: Dict[str, Any] = {"handler": None, "listener": None, "sample_rate": 1.0}
+
+def setup_logging(
+    level: str = "INFO",
+    levels: str = "",
+    fmt: str = "json",
+    sample_rate: float = 1.0,
+    queue_size: int = 10000,
+    stream=None,
+):
+    """
+    Route every category logger through the queue to `stream` (stdout).
+    Calling it again replaces the previous configuration.
+    """
+    shutdown_logging()
+    root = logging.getLogger(ROOT)
+    root.setLevel(_level(level) or logging.INFO)
+    root.propagate = False
+    for category, category_level in parse_levels(levels).items():
+        logging.getLogger(f"{ROOT}.{category}").setLevel(category_level)
+
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(TextFormatter() if fmt == "text" else JsonFormatter())
+    handler = _DroppingQueueHandler(queue.Queue(maxsize=queue_size))
+    listener = logging.handlers.QueueListener(handler.queue, output)
+    root.handlers = [handler]
+    listener.start()
+    _state.update(handler=handler, listener=listener, sample_rate=sample_rate)
+
+def shutdown_logging():
+    """
+    Stop the listener thread after it has written everything queued.
+    """
+    listener = _state.get("listener")
+    if listener is not None:
+        listener.stop()
+        _state["listener"] = None
+
+def dropped_records() -> int:
+    handler = _state.get("handler")
+    return handler.dropped if handler else 0
+
+atexit.register(shutdown_logging)
@@ -1,24 +1,128 @@
-from typing import List, Dict
+from typing import Dict, List, Optional
+from app.knowledge.documents import KnowledgeDoc, load_documents, fingerprint
+from app.knowledge.index import KnowledgeIndex, build_index, open_index
+from app.knowledge import vectors
+from config.settings import settings
+from app.api.utils.logger import get_logger
+
+log = get_logger("knowledge")
+
+# Used when the knowledge directory is empty or missing
+DEFAULT_KNOWLEDGE = {
+    "焦虑": "焦虑是一种常见的情绪反应，通常是对未来不确定性的担忧。适度的焦虑可以提高警觉性，但过度的焦虑会影响生活。",
+    "抑郁": "抑郁不仅仅是心情不好，而是一种持续的情绪低落状态，可能伴随兴趣丧失、睡眠障碍等。",
+    "压力": "压力是身体对挑战或需求的反应。学会压力管理技巧，如深呼吸、正念冥想，有助于缓解压力。",
+    "失眠": "失眠可能由压力、焦虑或不良睡眠习惯引起。建立规律的作息时间非常重要。"
+}
+
+SEARCH_MODES = ("keyword", "semantic", "hybrid")
+
+# Reciprocal rank fusion constant for hybrid mode
+RRF_K = 60
+
+def _embedding_text(doc: KnowledgeDoc) -> str:
+    return " ".join([doc.title] + doc.keywords + [doc.body])
 
 class PsychologyKnowledge:
-    def __init__(self):
-        # 这里可以加载本地TXT或向量数据库
-        # 为了演示，我们使用简单的硬编码知识库
-        self.knowledge_base = {
-            "焦虑": "焦虑是一种常见的情绪反应，通常是对未来不确定性的担忧。适度的焦虑可以提高警觉性，但过度的焦虑会影响生活。",
-            "抑郁": "抑郁不仅仅是心情不好，而是一种持续的情绪低落状态，可能伴随兴趣丧失、睡眠障碍等。",
-            "压力": "压力是身体对挑战或需求的反应。学会压力管理技巧，如深呼吸、正念冥想，有助于缓解压力。",
-            "失眠": "失眠可能由压力、焦虑或不良睡眠习惯引起。建立规律的作息时间非常重要。"
-        }
-
-    def search(self, query: str) -> str:
+    def __init__(
+        self,
+        knowledge_dir: str = settings.KNOWLEDGE_DIR,
+        index_path: str = settings.KNOWLEDGE_INDEX_PATH,
+        mode: str = settings.KNOWLEDGE_SEARCH_MODE,
+        vectors_path: str = settings.KNOWLEDGE_VECTORS_PATH,
+    ):
+        # 知识库来自 knowledge_dir 下的 TXT 文件，启动时构建/加载磁盘索引（内存映射）
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unsupported knowledge search mode: {mode}")
+        if mode != "keyword" and not vectors.numpy_available():
+            log.warning("numpy not installed, falling back to keyword search", mode=mode)
+            mode = "keyword"
+        self.knowledge_dir = knowledge_dir
+        self.index_path = index_path
+        self.vectors_path = vectors_path
+        self.mode = mode
+        self._index: Optional[KnowledgeIndex] = None
+        self._vectors: Optional["vectors.VectorIndex"] = None
+
+    def _documents(self) -> List[KnowledgeDoc]:
+        docs = load_documents(self.knowledge_dir)
+        if not docs:
+            docs = [KnowledgeDoc(key, [key], value) for key, value in DEFAULT_KNOWLEDGE.items()]
+        return docs
+
+    def load(self, rebuild: bool = False) -> KnowledgeIndex:
+        """
+        Open the on-disk index (and vectors, outside keyword mode), rebuilding
+        them first if the knowledge files changed.
+        """
+        current = fingerprint(self.knowledge_dir)
+        index = None if rebuild else open_index(self.index_path, current)
+        embedder = None
+        vector_index = None
+        if self.mode != "keyword":
+            embedder = vectors.create_embedder(settings.KNOWLEDGE_EMBEDDING_MODEL, settings.KNOWLEDGE_VECTOR_DIM)
+            vector_index = None if rebuild else vectors.open_vectors(self.vectors_path, embedder, current)
+
+        if index is None or (embedder is not None and vector_index is None):
+            docs = self._documents()
+            if embedder is not None and vector_index is None:
+                log.info("Embedding knowledge entries", entries=len(docs), embedder=embedder.name, path=self.vectors_path)
+                vectors.build_vectors([_embedding_text(doc) for doc in docs], self.vectors_path, embedder, fingerprint=current)
+                vector_index = vectors.VectorIndex(self.vectors_path, embedder)
+            if index is None:
+                log.info("Building knowledge index", entries=len(docs), path=self.index_path)
+                build_index(docs, self.index_path, fingerprint=current)
+                index = KnowledgeIndex(self.index_path)
+        self._index = index
+        self._vectors = vector_index
+        return index
+
+    @property
+    def index(self) -> KnowledgeIndex:
+        if self._index is None:
+            self.load()
+        return self._index
+
+    def _ranked(self, query: str, top_k: int) -> List[tuple]:
+        index = self.index
+        if self.mode == "keyword":
+            return index.search(query, top_k=top_k, min_score=settings.KNOWLEDGE_MIN_SCORE)
+        semantic = self._vectors.search(query, top_k=top_k, min_similarity=settings.KNOWLEDGE_MIN_SIMILARITY)
+        if self.mode == "semantic":
+            return semantic
+        keyword = index.search(query, top_k=top_k, min_score=settings.KNOWLEDGE_MIN_SCORE)
+        fused: Dict[int, float] = {}
+        for ranking in (keyword, semantic):
+            for rank, (doc_id, _) in enumerate(ranking):
+                fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (RRF_K + rank + 1)
+        return sorted(fused.items(), key=lambda item: item[1], reverse=True)[:top_k]
+
+    def search_entries(self, query: str, top_k: int = None) -> List[tuple]:
+        """
+        Best matching (title, body, score) entries for `query`.
+        """
+        if not query:
+            return []
+        top_k = top_k or settings.KNOWLEDGE_TOP_K
+        index = self.index
+        return [index.document(doc_id) + (score,) for doc_id, score in self._ranked(query, top_k)]
+
+    def search(self, query: str, top_k: int = None, max_chars: int = None) -> str:
         """
-        简单的关键词匹配检索
+        按配置的模式（关键词 / 语义 / 混合）检索，返回可直接拼入 system prompt
+        的知识文本，总长度不超过 max_chars
         """
+        max_chars = max_chars or settings.KNOWLEDGE_MAX_CHARS
         results = []
-        for key, value in self.knowledge_base.items():
-            if key in query:
-                results.append(f"【{key}知识】: {value}")
+        used = 0
+        for title, body, _ in self.search_entries(query, top_k):
+            item = f"【{title}知识】: {body}"
+            if used + len(item) > max_chars:
+                if not results:
+                    results.append(item[:max_chars])
+                break
+            results.append(item)
+            used += len(item) + 1
         
         if results:
             return "\n".join(results)
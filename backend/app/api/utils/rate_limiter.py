@@ -0,0 +1,329 @@
+import asyncio
+import email.utils
+import random
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, Optional
+import httpx
+from config.settings import settings
+from app.api.utils.metrics import metrics
+from app.api.utils.logger import get_logger
+
+log = get_logger("llm")
+
+# Interactive chat streams are always admitted before background work
+LANES = ("interactive", "background")
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Seconds to wait from a Retry-After header (delta-seconds or HTTP date).
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+def backoff_delay(attempt: int, base: float, cap: float, retry_after: Optional[float] = None) -> float:
+    """
+    Retry-After if the server sent one, otherwise "full jitter" exponential
+    backoff, so clients that failed together don't retry together.
+    """
+    if retry_after is not None:
+        return min(cap, retry_after)
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+# Every upstream attempt, including retried ones: status is the HTTP code or the transport error
+UPSTREAM_RESPONSES = metrics.counter("llm_upstream_responses_total", "LLM provider responses by HTTP status or error", ["provider", "status"])
+
+class TokenBucket:
+    """
+    Request-rate cap: `rate` requests per second with bursts up to `burst`.
+    """
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+class AdaptiveLimiter:
+    """
+    Per-provider admission control in front of the upstream API.
+
+    Concurrency is adjusted AIMD-style: every success raises the limit by
+    1/limit (about +1 per round of requests), every 429/5xx or timeout
+    halves it, at most once per `decrease_interval` so a burst of failures
+    from the same moment only counts once.
+
+    Streams only hold their slot until the response headers arrive, so the
+    limit governs how many requests are being started, not replies in
+    progress.
+
+    Waiting requests are admitted by lane: interactive before background,
+    and background work can never take the last `interactive_reserve` slots.
+    An optional token bucket caps the request rate on top.
+    """
+    def __init__(
+        self,
+        name: str,
+        initial_limit: int = 8,
+        min_limit: int = 1,
+        max_limit: int = 64,
+        rate: float = 0.0,
+        burst: int = 10,
+        interactive_reserve: int = 1,
+        decrease_factor: float = 0.5,
+        decrease_interval: float = 1.0,
+        retry_base_delay: float = 0.5,
+        retry_max_delay: float = 20.0,
+    ):
+        self.name = name
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.interactive_reserve = interactive_reserve
+        self.decrease_factor = decrease_factor
+        self.decrease_interval = decrease_interval
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self._bucket = TokenBucket(rate, burst) if rate > 0 else None
+        self._waiters: Dict[str, Deque[asyncio.Future]] = {lane: deque() for lane in LANES}
+        self._last_decrease = 0.0
+
+        self.in_flight = 0
+        self.admitted = {lane: 0 for lane in LANES}
+        self.successes = 0
+        self.throttled = 0
+        self.retries = 0
+
+    def _capacity(self, lane: str) -> int:
+        limit = max(self.min_limit, int(self.limit))
+        if lane == "background":
+            return max(1, limit - self.interactive_reserve)
+        return limit
+
+    def _can_start(self, lane: str) -> bool:
+        if self.in_flight >= self._capacity(lane):
+            return False
+        return lane == "interactive" or not self._waiters["interactive"]
+
+    async def acquire(self, lane: str = "interactive"):
+        if lane not in LANES:
+            raise ValueError(f"Unknown lane: {lane}")
+        if not self._waiters[lane] and self._can_start(lane):
+            self.in_flight += 1
+        else:
+            future = asyncio.get_running_loop().create_future()
+            self._waiters[lane].append(future)
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    # The slot was handed over just as we were cancelled
+                    self.release()
+                else:
+                    try:
+                        self._waiters[lane].remove(future)
+                    except ValueError:
+                        pass
+                raise
+        self.admitted[lane] += 1
+        if self._bucket:
+            try:
+                await self._bucket.acquire()
+            except asyncio.CancelledError:
+                self.release()
+                raise
+
+    def release(self):
+        self.in_flight -= 1
+        self._wake()
+
+    def _wake(self):
+        for lane in LANES:
+            waiters = self._waiters[lane]
+            while waiters and self._can_start(lane):
+                future = waiters.popleft()
+                if future.done():
+                    continue
+                self.in_flight += 1
+                future.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self, lane: str = "interactive") -> AsyncIterator[None]:
+        await self.acquire(lane)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def on_success(self):
+        self.successes += 1
+        self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+        self._wake()
+
+    def on_overload(self, reason: str):
+        self.throttled += 1
+        now = time.monotonic()
+        if now - self._last_decrease < self.decrease_interval:
+            return
+        self._last_decrease = now
+        previous = self.limit
+        self.limit = max(float(self.min_limit), self.limit * self.decrease_factor)
+        log.warning("Provider overloaded, lowering concurrency", provider=self.name, reason=reason, previous=round(previous, 1), limit=round(self.limit, 1))
+
+    def _retry_delay(self, attempt: int, response: Optional[httpx.Response]) -> float:
+        retry_after = parse_retry_after(response.headers.get("Retry-After")) if response is not None else None
+        return backoff_delay(attempt, self.retry_base_delay, self.retry_max_delay, retry_after)
+
+    async def request(
+        self,
+        send: Callable[[], Awaitable[httpx.Response]],
+        lane: str = "background",
+        max_retries: int = 3,
+    ) -> httpx.Response:
+        """
+        Run `send` inside a slot, retrying 429/5xx responses and transport
+        errors with backoff. The last response (or error) is returned as is.
+        """
+        attempt = 0
+        while True:
+            response = None
+            async with self.slot(lane):
+                try:
+                    response = await send()
+                except (httpx.TimeoutException, httpx.NetworkError) as e:
+                    UPSTREAM_RESPONSES.inc(provider=self.name, status=type(e).__name__)
+                    self.on_overload(type(e).__name__)
+                    if attempt >= max_retries:
+                        raise
+                else:
+                    UPSTREAM_RESPONSES.inc(provider=self.name, status=str(response.status_code))
+                    if response.status_code not in RETRYABLE_STATUS:
+                        self.on_success()
+                        return response
+                    self.on_overload(f"HTTP {response.status_code}")
+                    if attempt >= max_retries:
+                        return response
+            delay = self._retry_delay(attempt, response)
+            attempt += 1
+            self.retries += 1
+            log.info("Retrying request", provider=self.name, attempt=attempt, max_retries=max_retries, delay=round(delay, 2))
+            await asyncio.sleep(delay)
+
+    @asynccontextmanager
+    async def stream(
+        self,
+        open_stream: Callable[[], Any],
+        lane: str = "interactive",
+        max_retries: int = 1,
+    ) -> AsyncIterator[httpx.Response]:
+        """
+        Open a streaming response inside a slot. The slot is given back as
+        soon as the response headers arrive: holding it for the whole reply
+        would make the next chat wait for an entire answer before its first
+        token, so concurrent streams are bounded by the connection pool
+        (HTTP_MAX_CONNECTIONS) instead. Only the opening is retried: once the
+        body is being read, errors go to the caller.
+        """
+        attempt = 0
+        while True:
+            response = None
+            await self.acquire(lane)
+            held = True
+            try:
+                try:
+                    async with open_stream() as response:
+                        UPSTREAM_RESPONSES.inc(provider=self.name, status=str(response.status_code))
+                        if response.status_code not in RETRYABLE_STATUS or attempt >= max_retries:
+                            if response.status_code in RETRYABLE_STATUS:
+                                self.on_overload(f"HTTP {response.status_code}")
+                            else:
+                                self.on_success()
+                            held = False
+                            self.release()
+                            yield response
+                            return
+                        self.on_overload(f"HTTP {response.status_code}")
+                except (httpx.TimeoutException, httpx.NetworkError) as e:
+                    if response is not None:
+                        # Failed while the caller was reading the body, already counted by status
+                        raise
+                    UPSTREAM_RESPONSES.inc(provider=self.name, status=type(e).__name__)
+                    self.on_overload(type(e).__name__)
+                    if attempt >= max_retries:
+                        raise
+            finally:
+                if held:
+                    self.release()
+            delay = self._retry_delay(attempt, response)
+            attempt += 1
+            self.retries += 1
+            log.info("Retrying stream", provider=self.name, attempt=attempt, max_retries=max_retries, delay=round(delay, 2))
+            await asyncio.sleep(delay)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "waiting": {lane: len(waiters) for lane, waiters in self._waiters.items()},
+            "admitted": dict(self.admitted),
+            "successes": self.successes,
+            "throttled": self.throttled,
+            "retries": self.retries,
+        }
+
+_limiters: Dict[str, AdaptiveLimiter] = {}
+
+def get_limiter(provider: str) -> AdaptiveLimiter:
+    """
+    Return the shared limiter for a provider, creating it on first use.
+    """
+    limiter = _limiters.get(provider)
+    if limiter is None:
+        limiter = AdaptiveLimiter(
+            provider,
+            initial_limit=settings.LLM_CONCURRENCY_INITIAL,
+            min_limit=settings.LLM_CONCURRENCY_MIN,
+            max_limit=settings.LLM_CONCURRENCY_MAX,
+            rate=settings.LLM_RATE_LIMIT_RPS,
+            burst=settings.LLM_RATE_LIMIT_BURST,
+            interactive_reserve=settings.LLM_INTERACTIVE_RESERVE,
+            retry_base_delay=settings.LLM_RETRY_BASE_DELAY,
+            retry_max_delay=settings.LLM_RETRY_MAX_DELAY,
+        )
+        _limiters[provider] = limiter
+    return limiter
+
+def limiter_stats() -> Dict[str, Any]:
+    return {name: limiter.stats() for name, limiter in _limiters.items()}
+
+metrics.gauge_callback(
+    "llm_concurrency", "Per-provider adaptive concurrency limit, requests in flight and requests waiting for a slot",
+    lambda: {
+        (name, kind): value
+        for name, limiter in _limiters.items()
+        for kind, value in (("limit", limiter.limit), ("in_flight", limiter.in_flight),
+                            ("waiting", sum(len(w) for w in limiter._waiters.values())))
+    },
+    ["provider", "kind"],
+)
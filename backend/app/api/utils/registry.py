@@ -0,0 +1,118 @@
+from typing import Dict, List, Optional
+from app.api.utils.llm_interface import AsyncLLMClient
+from app.api.utils.zhipu_client import AsyncZhipuClient
+from app.api.utils.deepseek_client import AsyncDeepSeekClient
+from app.api.utils.failover import FailoverClient
+from app.api.utils.http_pool import close_http_clients
+from app.api.utils.rate_limiter import limiter_stats
+from config.settings import settings, MODEL_NAME
+from app.api.utils.logger import get_logger
+
+log = get_logger("llm")
+
+CLIENT_CLASSES = {
+    'zhipu': AsyncZhipuClient,
+    'deepseek': AsyncDeepSeekClient,
+}
+
+class LLMClientRegistry:
+    """
+    Process-wide set of LLM clients, created once at startup and shared by all
+    requests and background tasks. Clients are looked up by name: the provider
+    name ("deepseek") for its default model, or "provider:model" for extras.
+    """
+    def __init__(self):
+        self._clients: Dict[str, AsyncLLMClient] = {}
+        self._default: Optional[str] = None
+
+    def register(self, name: str, client: AsyncLLMClient, default: bool = False):
+        self._clients[name] = client
+        if default or self._default is None:
+            self._default = name
+
+    def get(self, name: str = None) -> AsyncLLMClient:
+        if not self._clients:
+            # Used outside the FastAPI lifecycle (scripts, tests)
+            self.register_defaults()
+        key = name or self._default
+        if key not in self._clients:
+            raise ValueError(f"Unsupported LLM provider: {key}")
+        return self._clients[key]
+
+    def names(self) -> List[str]:
+        return list(self._clients.keys())
+
+    @property
+    def default_name(self) -> Optional[str]:
+        return self._default
+
+    def register_defaults(self):
+        """
+        Register one client per known provider plus any LLM_EXTRA_MODELS entries.
+        The provider selected in settings becomes the default.
+        """
+        for provider, client_cls in CLIENT_CLASSES.items():
+            if provider not in self._clients:
+                self.register(provider, client_cls(), default=(provider == MODEL_NAME))
+
+        for entry in settings.LLM_EXTRA_MODELS.split(","):
+            entry = entry.strip()
+            if entry:
+                self._register_model(entry, "LLM_EXTRA_MODELS")
+
+        fallback = settings.CHAT_REASONING_FALLBACK.strip()
+        if ":" in fallback and fallback not in self._clients:
+            self._register_model(fallback, "CHAT_REASONING_FALLBACK")
+
+        if settings.LLM_FAILOVER_ORDER and "failover" not in self._clients:
+            self.register_failover([n.strip() for n in settings.LLM_FAILOVER_ORDER.split(",") if n.strip()])
+
+    def _register_model(self, entry: str, source: str):
+        """
+        Register a "provider:model" client under that name.
+        """
+        provider, _, model = entry.partition(":")
+        if provider not in CLIENT_CLASSES or not model:
+            log.warning("Ignoring invalid model entry", entry=entry, source=source)
+            return
+        self.register(entry, CLIENT_CLASSES[provider](model=model))
+
+    def register_failover(self, names: List[str]):
+        """
+        Register a FailoverClient over the named clients as the default.
+        """
+        unknown = [name for name in names if name not in self._clients]
+        if unknown:
+            raise ValueError(f"Unknown LLM clients in LLM_FAILOVER_ORDER: {unknown}")
+        router = FailoverClient(
+            [(name, self._clients[name]) for name in names],
+            first_token_timeout=settings.LLM_FIRST_TOKEN_TIMEOUT,
+            thinking_first_token_timeout=settings.LLM_THINKING_FIRST_TOKEN_TIMEOUT,
+            hedge_delay=settings.LLM_HEDGE_DELAY_SECONDS,
+            failure_threshold=settings.LLM_CIRCUIT_FAILURE_THRESHOLD,
+            cooldown=settings.LLM_CIRCUIT_COOLDOWN_SECONDS,
+        )
+        self.register("failover", router, default=True)
+
+    def stats(self):
+        router = self._clients.get("failover")
+        return {
+            "clients": self.names(),
+            "default": self._default,
+            "failover": router.stats() if router else None,
+            "limiters": limiter_stats(),
+        }
+
+    async def startup(self):
+        self.register_defaults()
+        log.info("LLM clients registered", clients=self.names(), default=self._default)
+
+    async def shutdown(self):
+        clients = list(self._clients.values())
+        self._clients.clear()
+        self._default = None
+        for client in clients:
+            await client.aclose()
+        await close_http_clients()
+
+llm_registry = LLMClientRegistry()
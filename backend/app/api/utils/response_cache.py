@@ -0,0 +1,175 @@
+import asyncio
+import copy
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+from config.settings import settings
+from app.api.utils.logger import get_logger
+
+log = get_logger("llm")
+
+def usage_tokens(response: Dict[str, Any]) -> int:
+    usage = response.get("usage") or {}
+    return usage.get("total_tokens") or 0
+
+class ResponseCache:
+    """
+    Content-addressed cache of non-streaming LLM responses.
+
+    Keys hash the provider and the full request payload (model, messages,
+    max_tokens, temperature, thinking), so any change to the prompt is a
+    different entry. Entries expire after `ttl` seconds and the least
+    recently used are evicted past `max_entries`. With `disk_dir` set, entries
+    are also written there as JSON files and survive restarts.
+
+    Identical requests that arrive while one is in flight wait for it
+    instead of going upstream again; if that request is cancelled (its
+    client went away), one of them takes over. Error responses are never
+    stored.
+    """
+    def __init__(self, max_entries: int = 1024, ttl: float = 3600, disk_dir: str = "", enabled: bool = True):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.disk_dir = disk_dir
+        self.enabled = enabled
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires_at, response)
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.joined = 0
+        self.misses = 0
+        self.saved_tokens = 0
+
+    @staticmethod
+    def make_key(provider: str, payload: Dict[str, Any]) -> str:
+        canonical = json.dumps([provider, payload], sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    async def get_or_fetch(self, key: str, fetch: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        while True:
+            response = self._get_memory(key)
+            if response is None and self.disk_dir:
+                response = await asyncio.to_thread(self._read_disk, key)
+                if response is not None:
+                    self.disk_hits += 1
+                    self._put_memory(key, response)
+            if response is not None:
+                self.hits += 1
+                self.saved_tokens += usage_tokens(response)
+                return copy.deepcopy(response)
+
+            inflight = self._inflight.get(key)
+            if inflight is None:
+                break
+            response = await asyncio.shield(inflight)
+            if response is None:
+                # The request we joined was cancelled; look again, maybe taking over
+                continue
+            self.joined += 1
+            self.saved_tokens += usage_tokens(response)
+            return copy.deepcopy(response)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            response = await fetch()
+        except asyncio.CancelledError:
+            # Only this caller went away: joiners retry instead of failing with it
+            future.set_result(None)
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # joiners re-raise it; don't warn when there are none
+            raise
+        finally:
+            self._inflight.pop(key, None)
+        future.set_result(response)
+
+        if "error" not in response:
+            self._put_memory(key, response)
+            if self.disk_dir:
+                await asyncio.to_thread(self._write_disk, key, response)
+        return copy.deepcopy(response)
+
+    def discard(self, key: str):
+        """
+        Drop an entry, e.g. a response the caller could not use.
+        """
+        self._entries.pop(key, None)
+        if self.disk_dir:
+            try:
+                os.remove(self._disk_path(key))
+            except OSError:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.joined + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "joined_inflight": self.joined,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.joined) / lookups, 4) if lookups else 0.0,
+            "saved_tokens": self.saved_tokens,
+        }
+
+    def _get_memory(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, response = entry
+        if expires_at < time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return response
+
+    def _put_memory(self, key: str, response: Dict[str, Any], expires_at: float = None):
+        self._entries[key] = (expires_at or time.time() + self.ttl, response)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key[:2], f"{key}.json")
+
+    def _read_disk(self, key: str) -> Optional[Dict[str, Any]]:
+        path = self._disk_path(key)
+        try:
+            with open(path, encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get("expires_at", 0) < time.time():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        return entry.get("response")
+
+    def _write_disk(self, key: str, response: Dict[str, Any]):
+        path = self._disk_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.tmp.{os.getpid()}"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"expires_at": time.time() + self.ttl, "response": response}, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            log.warning("Response cache write failed", path=path, error=str(e))
+
+response_cache = ResponseCache(
+    max_entries=settings.LLM_CACHE_MAX_ENTRIES,
+    ttl=settings.LLM_CACHE_TTL_SECONDS,
+    disk_dir=settings.LLM_CACHE_DIR,
+    enabled=settings.LLM_CACHE_ENABLED,
+)
@@ -0,0 +1,170 @@
+"""
+Incremental decoder for OpenAI-style streaming chat completions (the
+`data: {...}` / `data: [DONE]` server-sent events DeepSeek and Zhipu send).
+
+The decoder works on the raw bytes as they arrive: each read is split into
+events on blank lines without decoding it to str first, the usual one-line
+`data:` event goes straight to the JSON parser, and only unusual events
+(several `data:` lines, comments, other fields) are parsed line by line.
+Events may be cut anywhere across reads; CRLF and CR line endings are
+accepted. Each event becomes a StreamDelta with just the fields the clients
+use. benchmarks/bench_sse.py measures it.
+"""
+import json
+from typing import Any, AsyncIterator, Iterable, Iterator, List
+from app.api.utils.llm_interface import Reasoning
+from app.api.utils.logger import get_logger
+
+log = get_logger("llm")
+
+try:
+    import orjson
+except ImportError:  # optional, roughly doubles decoding throughput
+    orjson = None
+
+_json_decode = json.JSONDecoder().decode
+
+def _json_loads(payload: bytes):
+    # json.loads(bytes) sniffs the encoding first; SSE is always UTF-8
+    return _json_decode(payload.decode("utf-8"))
+
+_loads = orjson.loads if orjson is not None else _json_loads
+
+class StreamDelta:
+    """
+    One decoded event: answer text, reasoning text, finish_reason, usage
+    and/or an error payload. Fields the event did not carry are None.
+    """
+    __slots__ = ("content", "reasoning", "finish_reason", "usage", "error")
+
+    def __init__(self, content: str = None, reasoning: str = None, finish_reason: str = None, usage: dict = None, error: Any = None):
+        self.content = content
+        self.reasoning = reasoning
+        self.finish_reason = finish_reason
+        self.usage = usage
+        self.error = error
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__ if getattr(self, name) is not None)
+        return f"StreamDelta({fields})"
+
+class SSEDecoder:
+    """
+    Feed it bytes as they arrive; it returns the deltas completed so far.
+    `done` is set once `data: [DONE]` has been seen.
+    """
+    def __init__(self, provider: str = ""):
+        self.provider = provider
+        self.done = False
+        self.undecodable = 0
+        self._buffer = b""
+
+    def feed(self, data: bytes) -> List[StreamDelta]:
+        out: List[StreamDelta] = []
+        if self._buffer:
+            data = self._buffer + data
+        tail = b""
+        if b"\r" in data:
+            if data.endswith(b"\r"):
+                # May be the first half of a \r\n split across reads
+                data, tail = data[:-1], b"\r"
+            data = data.replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+        events = data.split(b"\n\n")
+        self._buffer = events.pop() + tail
+        for event in events:
+            if event.startswith(b"data: ") and b"\n" not in event:
+                self._event(event[6:], out)  # the usual one-line event
+            elif event:
+                self._lines(event, out)
+        return out
+
+    def finish(self) -> List[StreamDelta]:
+        """
+        Flush an unterminated last event at the end of the body.
+        """
+        out = self.feed(b"\n\n") if self._buffer.strip() else []
+        self._buffer = b""
+        return out
+
+    def _lines(self, event: bytes, out: List[StreamDelta]):
+        data = []
+        for line in event.split(b"\n"):
+            if line.startswith(b"data:"):
+                value = line[5:]
+                data.append(value[1:] if value.startswith(b" ") else value)
+            elif line.startswith(b"{"):
+                # Not SSE at all: a JSON error body sent with a 200
+                self._event(line, out)
+            # else a comment (":..."), a field the clients don't use (event,
+            # id, retry) or a stray blank line
+        if len(data) == 1:
+            self._event(data[0], out)
+        elif data:
+            # Spec: one event, lines joined by "\n". Some servers instead send
+            # a complete JSON object per data line without blank lines between.
+            if not self._event(b"\n".join(data), out, quiet=True):
+                for payload in data:
+                    self._event(payload, out)
+
+    def _event(self, payload: bytes, out: List[StreamDelta], quiet: bool = False) -> bool:
+        if not payload.startswith(b"{") and payload.strip() == b"[DONE]":
+            self.done = True
+            return True
+        try:
+            obj = _loads(payload)
+        except ValueError:  # also UnicodeDecodeError and orjson.JSONDecodeError
+            if not quiet:
+                self.undecodable += 1
+                log.warning("Undecodable stream line", provider=self.provider, line=payload[:200].decode("utf-8", "replace"))
+            return False
+        if not isinstance(obj, dict):
+            return True
+
+        error = obj.get("error")
+        if error is not None:
+            out.append(StreamDelta(error=error))
+        content = reasoning = finish_reason = None
+        choices = obj.get("choices")
+        if choices:
+            choice = choices[0]
+            delta = choice.get("delta")
+            if delta:
+                content = delta.get("content") or None
+                reasoning = delta.get("reasoning_content") or None
+            finish_reason = choice.get("finish_reason")
+        usage = obj.get("usage")
+        if content or reasoning or finish_reason or usage:
+            out.append(StreamDelta(content, reasoning, finish_reason, usage))
+        return True
+
+def _chunks(deltas: Iterable[StreamDelta], provider: str, reasoning: bool) -> Iterator[str]:
+    """
+    Deltas as the chunks the LLM clients yield: answer text, Reasoning
+    chunks if `reasoning`, and "[ERROR] ..." for an error event.
+    """
+    for delta in deltas:
+        if delta.error is not None:
+            yield f"[ERROR] {delta.error}"
+        if delta.reasoning:
+            log.sampled("Reasoning chunk", provider=provider, reasoning=delta.reasoning[:50])
+            if reasoning:
+                yield Reasoning(delta.reasoning)
+        if delta.content:
+            yield delta.content
+        if delta.finish_reason == "length":
+            log.warning("Reply cut off at max_tokens", provider=provider)
+        if delta.usage:
+            log.debug("Stream usage", provider=provider, usage=delta.usage)
+
+async def iter_chat_chunks(byte_stream: AsyncIterator[bytes], provider: str, reasoning: bool = False) -> AsyncIterator[str]:
+    """
+    Chunks of a streaming chat completion, from e.g. httpx's response.aiter_bytes().
+    """
+    decoder = SSEDecoder(provider)
+    async for data in byte_stream:
+        for chunk in _chunks(decoder.feed(data), provider, reasoning):
+            yield chunk
+        if decoder.done:
+            return
+    for chunk in _chunks(decoder.finish(), provider, reasoning):
+        yield chunk
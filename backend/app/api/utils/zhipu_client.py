@@ -1,85 +1,84 @@
-import requests
-from typing import List, Dict, Any
-from app.api.utils.llm_interface import LLMClient
-from config.settings import settings
+import httpx
+from typing import List, Dict, Any, AsyncIterator
+from app.api.utils.llm_interface import AsyncLLMClient
+from app.api.utils.sse import iter_chat_chunks
+from app.api.utils.http_pool import get_http_client
+from app.api.utils.rate_limiter import get_limiter
+from app.api.utils.logger import get_logger
+from config.settings import ZhiPuSettings
 
-class ZhipuClient(LLMClient):
-    def chat_completion(self, messages: List[Dict[str, str]], thinking_enabled: bool = False) -> Dict[str, Any]:
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {settings.ZHIPU_API_KEY}"
-        }
-        
-        payload = {
-            "model": settings.LLM_MODEL,
-            "messages": messages,
-            "max_tokens": 65536,
-            "temperature": 1.0
+log = get_logger("llm")
+
+def _build_headers(config: ZhiPuSettings) -> Dict[str, str]:
+    return {
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {config.ZHIPU_API_KEY}"
+    }
+
+def _build_payload(config: ZhiPuSettings, messages: List[Dict[str, str]], thinking_enabled: bool, stream: bool) -> Dict[str, Any]:
+    payload = {
+        "model": config.LLM_MODEL,
+        "messages": messages,
+        "max_tokens": config.LLM_MAX_TOKENS,
+        "temperature": 1.0
+    }
+    if stream:
+        payload["stream"] = True
+
+    if thinking_enabled:
+        payload["thinking"] = {
+            "type": "enabled"
         }
-        
-        if thinking_enabled:
-            payload["thinking"] = {
-                "type": "enabled"
-            }
-            
+    return payload
+
+class AsyncZhipuClient(AsyncLLMClient):
+    """
+    asyncio Zhipu client running on the shared 'zhipu' connection pool.
+    """
+    provider = "zhipu"
+
+    def __init__(self, config: ZhiPuSettings = None, model: str = None):
+        self.config = config or ZhiPuSettings()
+        if model:
+            self.config.LLM_MODEL = model
+
+    @property
+    def model(self) -> str:
+        return self.config.LLM_MODEL
+
+    def request_payload(self, messages: List[Dict[str, str]], thinking_enabled: bool = False) -> Dict[str, Any]:
+        return _build_payload(self.config, messages, thinking_enabled, stream=False)
+
+    async def _chat_completion(self, messages: List[Dict[str, str]], thinking_enabled: bool = False) -> Dict[str, Any]:
+        client = get_http_client(self.provider)
         try:
-            response = requests.post(settings.ZHIPU_API_URL, json=payload, headers=headers)
+            # Non-streaming calls are background work (cards, summaries)
+            response = await get_limiter(self.provider).request(
+                lambda: client.post(self.config.ZHIPU_API_URL, json=self.request_payload(messages, thinking_enabled), headers=_build_headers(self.config)),
+                lane="background",
+                max_retries=self.config.LLM_MAX_RETRIES,
+            )
             response.raise_for_status()
             return response.json()
-        except requests.exceptions.RequestException as e:
-            # Log error properly in production
-            # For now, return a structure that indicates error
-            return {"error": str(e)}
+        except httpx.HTTPError as e:
+            log.error("Zhipu API error", provider="zhipu", error=repr(e))
+            return {"error": str(e) or repr(e)}
 
-    def chat_completion_stream(self, messages: List[Dict[str, str]], thinking_enabled: bool = False):
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {settings.ZHIPU_API_KEY}"
-        }
-        
-        payload = {
-            "model": settings.LLM_MODEL,
-            "messages": messages,
-            "max_tokens": 65536,
-            "temperature": 1.0,
-            "stream": True
-        }
-        
-        if thinking_enabled:
-            payload["thinking"] = {
-                "type": "enabled"
-            }
-            
+    async def chat_completion_stream(self, messages: List[Dict[str, str]], thinking_enabled: bool = False, reasoning: bool = False) -> AsyncIterator[str]:
+        client = get_http_client(self.provider)
         try:
-            with requests.post(settings.ZHIPU_API_URL, json=payload, headers=headers, stream=True, timeout=60) as response:
-                    response.raise_for_status()
-                    import json
-                    for line in response.iter_lines():
-                        if line:
-                            line_str = line.decode('utf-8')
-                            # print(f"[Zhipu RAW] {line_str[:100]}") # Debug log
-                            if line_str.startswith('data: '):
-                                json_str = line_str[6:]
-                                if json_str.strip() == '[DONE]':
-                                    break
-                                try:
-                                    data = json.loads(json_str)
-                                    if "choices" in data and len(data["choices"]) > 0:
-                                        delta = data["choices"][0].get("delta", {})
-                                        content = delta.get("content", "")
-                                        if content:
-                                            yield content
-                                except json.JSONDecodeError:
-                                    print(f"[Zhipu JSON Error] {json_str}")
-                                    pass
-                            else:
-                                # Handle non-SSE response
-                                try:
-                                    data = json.loads(line_str)
-                                    if "error" in data:
-                                        yield f"[ERROR] {data['error']}"
-                                except:
-                                    pass
-        except requests.exceptions.RequestException as e:
-            print(f"Zhipu Stream Error: {e}")
-            yield f"[ERROR] {str(e)}"
+            async with get_limiter(self.provider).stream(
+                lambda: client.stream("POST", self.config.ZHIPU_API_URL, json=_build_payload(self.config, messages, thinking_enabled, stream=True), headers=_build_headers(self.config)),
+                lane="interactive",
+                max_retries=self.config.LLM_STREAM_MAX_RETRIES,
+            ) as response:
+                if response.is_error:
+                    await response.aread()
+                    log.error("Zhipu stream error", provider="zhipu", status=response.status_code, response=response.text[:200])
+                    yield f"[ERROR] {response.status_code} {response.reason_phrase}"
+                    return
+                async for chunk in iter_chat_chunks(response.aiter_bytes(), self.provider, reasoning):
+                    yield chunk
+        except httpx.HTTPError as e:
+            log.error("Zhipu stream error", provider="zhipu", error=repr(e))
+            yield f"[ERROR] {str(e) or repr(e)}"
@@ -1,60 +1,167 @@
-from fastapi import APIRouter, HTTPException, Body, BackgroundTasks
+from fastapi import APIRouter, HTTPException, Body, BackgroundTasks, Query, Request
 from fastapi.responses import StreamingResponse
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from pydantic import BaseModel
-from app.storage.conversation_storage import save_message
-from app.services.card_service import get_or_create_card
+from app.storage.async_storage import save_message, history_cache, message_writer
+from app.services.card_service import get_or_create_card, card_scheduler
 from app.services.chat_service import ChatService
-import json
+from app.services.stream_protocol import MEDIA_TYPES, EventEncoder, encode_events, encode_text, negotiate_format
+from app.services.stream_registry import ChatStream, stream_registry
+from config.settings import settings
+from app.api.utils.response_cache import response_cache
+from app.api.utils.registry import llm_registry
+from app.api.utils.logger import get_logger
 import asyncio
 
-import traceback
-
 router = APIRouter()
 
-class LogRequest(BaseModel):
-    level: str
+log = get_logger("http")
+frontend_log = get_logger("frontend")
+
+class LogEntry(BaseModel):
+    level: str = "info"
     message: str
     context: Dict[str, Any] = {}
+    ts: Optional[float] = None # client time, ms since epoch
+
+class LogRequest(BaseModel):
+    # A single entry (the original format) and/or a batch in `entries`
+    level: str = "info"
+    message: Optional[str] = None
+    context: Dict[str, Any] = {}
+    entries: List[LogEntry] = []
 
 @router.post("/log")
-async def log_frontend_error(log: LogRequest):
-    print(f"\n[FRONTEND-{log.level.upper()}] {log.message}")
-    if log.context:
-        print(f"Context: {json.dumps(log.context, indent=2, ensure_ascii=False)}")
-    return {"status": "ok"}
+async def log_frontend_error(payload: LogRequest):
+    """
+    Ingest mini-program logs. Clients buffer entries and send them in
+    batches; anything past LOG_FRONTEND_MAX_BATCH in one request is dropped.
+    """
+    entries = list(payload.entries)
+    if payload.message is not None:
+        entries.insert(0, LogEntry(level=payload.level, message=payload.message, context=payload.context))
+    accepted = entries[:settings.LOG_FRONTEND_MAX_BATCH]
+    for entry in accepted:
+        level = entry.level.lower()
+        emit = {"debug": frontend_log.debug, "warn": frontend_log.warning, "warning": frontend_log.warning,
+                "error": frontend_log.error}.get(level, frontend_log.info)
+        emit(entry.message, context=entry.context, client_ts=entry.ts)
+    return {"status": "ok", "accepted": len(accepted), "dropped": len(entries) - len(accepted)}
+
+def _stream_response(stream: ChatStream, fmt: str, after: int = 0) -> StreamingResponse:
+    # Checked before the response starts: once it has, an expired offset can
+    # only be reported in the body
+    if after + 1 < stream.first_seq:
+        raise HTTPException(status_code=410, detail=f"Events after seq {after} are no longer buffered")
+    headers = {"X-Stream-Id": stream.stream_id}
+    if fmt == "text":
+        return StreamingResponse(encode_text(stream.follow(after)), media_type="text/plain", headers=headers)
+    # No caching or proxy buffering, or events arrive in bursts
+    headers.update({"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    return StreamingResponse(
+        encode_events(
+            stream.follow(after),
+            EventEncoder(fmt, started=stream.started),
+            heartbeat_interval=settings.STREAM_HEARTBEAT_SECONDS,
+            pack_interval=settings.STREAM_PACK_INTERVAL_MS / 1000,
+            pack_max_chars=settings.STREAM_PACK_MAX_CHARS,
+        ),
+        media_type=MEDIA_TYPES[fmt],
+        headers=headers
+    )
 
 @router.post("/chat")
 async def chat(
+    request: Request,
     background_tasks: BackgroundTasks,
     user_id: str = Body(..., embed=True),
     content: str = Body(..., embed=True),
     mode: str = Body("concise", embed=True),
-    thinking_enabled: bool = Body(False, embed=True)
+    thinking_enabled: bool = Body(False, embed=True),
+    stream_format: str = Body(None, embed=True),
+    client_msg_id: str = Body(None, embed=True),
+    show_reasoning: bool = Body(False, embed=True)
 ):
     """
     Main chat endpoint for GreenBanana (Streaming).
+
+    Replies stream as text/plain by default. Clients that send
+    `Accept: text/event-stream` / `application/x-ndjson`, or
+    `stream_format: "sse" | "ndjson"`, get framed events instead:
+    delta, suggestions, usage, error and done, plus heartbeats. With
+    `show_reasoning`, a reasoning model's thinking is streamed as
+    "reasoning" events before the first delta (framed formats only).
+
+    The generation runs independently of this response (see
+    StreamRegistry); its id is returned in the X-Stream-Id header for
+    GET /chat/streams/{stream_id}. Re-sending a message with the same
+    `client_msg_id` (or Idempotency-Key header) attaches to the existing
+    generation instead of saving and answering it twice.
     """
+    try:
+        fmt = negotiate_format(request.headers.get("accept"), stream_format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    idempotency_key = client_msg_id or request.headers.get("idempotency-key")
+    existing = stream_registry.find(user_id, idempotency_key)
+    if existing:
+        log.info("Duplicate chat request, attaching to running stream",
+                 user_id=user_id, idempotency_key=idempotency_key, stream_id=existing.stream_id)
+        stream_registry.deduplicated += 1
+        return _stream_response(existing, fmt)
+
+    # Registered before the first await so a concurrent retry finds it
+    stream = stream_registry.create(user_id, idempotency_key)
     try:
         # 1. Save User Message
-        current_msg = save_message(user_id, "user", content)
+        current_msg = await save_message(user_id, "user", content)
         
         # 2. Delegate to ChatService
-        return StreamingResponse(
-            ChatService.chat_stream_generator(
-                user_id=user_id,
-                content=content,
-                mode=mode,
-                thinking_enabled=thinking_enabled,
-                current_msg_id=current_msg.id
-            ),
-            media_type="text/plain"
-        )
+        stream_registry.run(stream, ChatService.chat_events(
+            user_id=user_id,
+            content=content,
+            mode=mode,
+            thinking_enabled=thinking_enabled,
+            current_msg=current_msg,
+            show_reasoning=show_reasoning
+        ))
+        return _stream_response(stream, fmt)
 
     except Exception as e:
-        traceback.print_exc() # Print full traceback to console
+        stream_registry.discard(stream)
+        log.exception("Chat request failed", user_id=user_id)
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/chat/streams")
+async def chat_stream_stats():
+    """
+    Running, detached and resumable chat generations in this worker.
+    """
+    return stream_registry.stats()
+
+@router.get("/chat/streams/{stream_id}")
+async def resume_chat_stream(request: Request, stream_id: str, after: int = Query(None, ge=0), stream_format: str = None):
+    """
+    Replay a generation's events after seq `after` (or the SSE Last-Event-ID
+    header), then follow it live. Defaults to NDJSON.
+    """
+    stream = stream_registry.get(stream_id)
+    if stream is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired stream")
+    try:
+        fmt = negotiate_format(request.headers.get("accept"), stream_format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if fmt == "text":
+        fmt = "ndjson"
+    if after is None:
+        last_event_id = request.headers.get("last-event-id")
+        after = int(last_event_id) if last_event_id and last_event_id.isdigit() else 0
+    response = _stream_response(stream, fmt, after)
+    stream_registry.resumed += 1
+    return response
+
 @router.post("/generate_card")
 async def generate_card(
     user_id: str = Body(..., embed=True)
@@ -63,8 +170,7 @@ async def generate_card(
     Generate an anti-anxiety card based on recent conversation.
     """
     try:
-        print(f"\n[DEBUG] >>> Received Generate Card Request")
-        print(f"[DEBUG] User ID: {user_id}")
+        log.debug("Generate card request", user_id=user_id)
         
         result = await get_or_create_card(user_id)
         
@@ -76,5 +182,37 @@ async def generate_card(
         raise HTTPException(status_code=500, detail=error_detail)
              
     except Exception as e:
-        traceback.print_exc() # Print full traceback to console
+        log.exception("Generate card request failed", user_id=user_id)
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/card_queue")
+async def card_queue_stats():
+    """
+    Background card generation queue depth and counters.
+    """
+    return card_scheduler.stats()
+
+@router.get("/llm_cache")
+async def llm_cache_stats():
+    """
+    LLM response cache hits, misses and tokens saved.
+    """
+    return response_cache.stats()
+
+@router.get("/llm_providers")
+async def llm_provider_stats():
+    """
+    Registered LLM clients, per-provider rate limiter state and, with
+    failover enabled, per-provider health.
+    """
+    return llm_registry.stats()
+
+@router.get("/storage_stats")
+async def storage_stats():
+    """
+    History cache hit/miss stats and write-behind queue counters.
+    """
+    return {
+        "history_cache": history_cache.stats(),
+        "message_writer": message_writer.stats(),
+    }
@@ -0,0 +1,107 @@
+from array import array
+from bisect import bisect_left
+from collections import deque
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+class FlatAutomaton:
+    """
+    Aho-Corasick automaton stored as flat integer arrays, so it can be written
+    to disk and used straight from a memory map without rebuilding.
+
+    State s has transitions trans_chars/trans_next[trans_offsets[s]:trans_offsets[s + 1]]
+    (sorted by character code), a failure link fail[s], and emits the keyword
+    ids out_ids[out_offsets[s]:out_offsets[s + 1]].
+    """
+    __slots__ = ("trans_offsets", "trans_chars", "trans_next", "fail", "out_offsets", "out_ids")
+
+    def __init__(
+        self,
+        trans_offsets: Sequence[int],
+        trans_chars: Sequence[int],
+        trans_next: Sequence[int],
+        fail: Sequence[int],
+        out_offsets: Sequence[int],
+        out_ids: Sequence[int],
+    ):
+        self.trans_offsets = trans_offsets
+        self.trans_chars = trans_chars
+        self.trans_next = trans_next
+        self.fail = fail
+        self.out_offsets = out_offsets
+        self.out_ids = out_ids
+
+    def arrays(self) -> List[Sequence[int]]:
+        return [self.trans_offsets, self.trans_chars, self.trans_next, self.fail, self.out_offsets, self.out_ids]
+
+    def _goto(self, state: int, code: int) -> int:
+        lo, hi = self.trans_offsets[state], self.trans_offsets[state + 1]
+        if lo == hi:
+            return -1
+        i = bisect_left(self.trans_chars, code, lo, hi)
+        if i < hi and self.trans_chars[i] == code:
+            return self.trans_next[i]
+        return -1
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, int]]:
+        """
+        Yield (end_position, keyword_id) for every keyword occurrence in `text`.
+        """
+        state = 0
+        for pos, ch in enumerate(text):
+            code = ord(ch)
+            while True:
+                nxt = self._goto(state, code)
+                if nxt >= 0:
+                    state = nxt
+                    break
+                if state == 0:
+                    break
+                state = self.fail[state]
+            for i in range(self.out_offsets[state], self.out_offsets[state + 1]):
+                yield pos, self.out_ids[i]
+
+def build_automaton(keywords: Sequence[str]) -> FlatAutomaton:
+    """
+    Build the automaton for `keywords`; keyword ids are their list positions.
+    """
+    goto: List[Dict[int, int]] = [{}]
+    outputs: List[List[int]] = [[]]
+    for keyword_id, keyword in enumerate(keywords):
+        state = 0
+        for ch in keyword:
+            code = ord(ch)
+            nxt = goto[state].get(code)
+            if nxt is None:
+                nxt = len(goto)
+                goto[state][code] = nxt
+                goto.append({})
+                outputs.append([])
+            state = nxt
+        if keyword:
+            outputs[state].append(keyword_id)
+
+    # Breadth-first failure links; outputs inherit those of their failure state
+    fail = [0] * len(goto)
+    queue = deque(goto[0].values())
+    while queue:
+        state = queue.popleft()
+        for code, nxt in goto[state].items():
+            queue.append(nxt)
+            f = fail[state]
+            while f and code not in goto[f]:
+                f = fail[f]
+            candidate = goto[f].get(code, 0)
+            fail[nxt] = candidate if candidate != nxt else 0
+            outputs[nxt].extend(outputs[fail[nxt]])
+
+    trans_offsets, trans_chars, trans_next = array("I", [0]), array("I"), array("I")
+    out_offsets, out_ids = array("I", [0]), array("I")
+    for state in range(len(goto)):
+        for code in sorted(goto[state]):
+            trans_chars.append(code)
+            trans_next.append(goto[state][code])
+        trans_offsets.append(len(trans_chars))
+        out_ids.extend(outputs[state])
+        out_offsets.append(len(out_ids))
+
+    return FlatAutomaton(trans_offsets, trans_chars, trans_next, array("I", fail), out_offsets, out_ids)
@@ -0,0 +1,69 @@
+import hashlib
+import os
+from typing import List
+
+class KnowledgeDoc:
+    __slots__ = ("title", "keywords", "body")
+
+    def __init__(self, title: str, keywords: List[str], body: str):
+        self.title = title
+        self.keywords = keywords
+        self.body = body
+
+def parse_documents(text: str) -> List[KnowledgeDoc]:
+    """
+    Parse a knowledge file. Each entry starts with a "# 标题" line, may have a
+    "关键词: a, b, c" line, and the rest is the body:
+
+        # 焦虑
+        关键词: 焦虑, 紧张, 担心
+        焦虑是一种常见的情绪反应……
+    """
+    docs = []
+    title, keywords, body = None, [], []
+
+    def flush():
+        if title:
+            words = [title] + [k for k in keywords if k and k != title]
+            docs.append(KnowledgeDoc(title, words, "\n".join(body).strip()))
+
+    for raw_line in text.splitlines():
+        line = raw_line.strip()
+        if line.startswith("# "):
+            flush()
+            title, keywords, body = line[2:].strip(), [], []
+        elif title is None or not line:
+            continue
+        elif line.startswith("关键词:") or line.startswith("关键词："):
+            keywords = [k.strip() for k in line[4:].replace("，", ",").split(",") if k.strip()]
+        else:
+            body.append(line)
+    flush()
+    return [doc for doc in docs if doc.body]
+
+def knowledge_files(directory: str) -> List[str]:
+    if not os.path.isdir(directory):
+        return []
+    return sorted(
+        os.path.join(directory, name)
+        for name in os.listdir(directory)
+        if name.endswith(".txt")
+    )
+
+def load_documents(directory: str) -> List[KnowledgeDoc]:
+    docs = []
+    for path in knowledge_files(directory):
+        with open(path, encoding="utf-8") as f:
+            docs.extend(parse_documents(f.read()))
+    return docs
+
+def fingerprint(directory: str) -> str:
+    """
+    Content hash of all knowledge files, stored in the index to detect staleness.
+    """
+    digest = hashlib.sha1()
+    for path in knowledge_files(directory):
+        digest.update(os.path.basename(path).encode("utf-8"))
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
@@ -0,0 +1,233 @@
+import hashlib
+import heapq
+import json
+import math
+import mmap
+import os
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Sequence, Tuple
+from app.knowledge.aho_corasick import FlatAutomaton, build_automaton
+from app.knowledge.documents import KnowledgeDoc
+from app.knowledge.tokenizer import normalize, tokenize
+from app.api.utils.logger import get_logger
+
+log = get_logger("knowledge")
+
+MAGIC = b"GBKIDX01"
+FORMAT_VERSION = 1
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+# Score added for every keyword (Aho-Corasick) hit on a document
+KEYWORD_BOOST = 10.0
+
+# Postings are stored best-first, so a query only needs the head of each list
+MAX_POSTINGS_PER_TERM = 256
+
+def term_hash(term: str) -> int:
+    return int.from_bytes(hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest(), "little")
+
+def _align(offset: int) -> int:
+    return (offset + 7) & ~7
+
+def build_index(docs: Sequence[KnowledgeDoc], path: str, fingerprint: str = ""):
+    """
+    Build the keyword automaton and BM25 postings for `docs` and write them
+    to `path` (atomically, via a temporary file).
+    """
+    # Keywords -> Aho-Corasick automaton
+    keywords, kw_docs = [], array("I")
+    for doc_id, doc in enumerate(docs):
+        for keyword in doc.keywords:
+            keywords.append(normalize(keyword))
+            kw_docs.append(doc_id)
+    automaton = build_automaton(keywords)
+    kw_lens = array("I", [len(k) for k in keywords])
+
+    # Title, keywords and body all count as document text for BM25
+    doc_terms = [Counter(tokenize(" ".join([doc.title] + doc.keywords + [doc.body]))) for doc in docs]
+    doc_lens = [sum(terms.values()) for terms in doc_terms]
+    avgdl = (sum(doc_lens) / len(docs)) if docs else 0.0
+
+    postings: Dict[int, List[Tuple[float, int]]] = defaultdict(list)
+    df = Counter()
+    for terms in doc_terms:
+        df.update(terms.keys())
+    n_docs = len(docs)
+    for doc_id, terms in enumerate(doc_terms):
+        norm = K1 * (1 - B + B * doc_lens[doc_id] / avgdl) if avgdl else K1
+        for term, tf in terms.items():
+            idf = math.log(1 + (n_docs - df[term] + 0.5) / (df[term] + 0.5))
+            impact = idf * tf * (K1 + 1) / (tf + norm)
+            postings[term_hash(term)].append((impact, doc_id))
+
+    term_hashes = array("Q", sorted(postings))
+    post_offsets, post_docs, post_impacts = array("I", [0]), array("I"), array("f")
+    for h in term_hashes:
+        for impact, doc_id in sorted(postings[h], reverse=True):
+            post_docs.append(doc_id)
+            post_impacts.append(impact)
+        post_offsets.append(len(post_docs))
+
+    blob = bytearray()
+    doc_offsets = array("Q", [0])
+    for doc in docs:
+        blob += f"{doc.title}\x1f{doc.body}".encode("utf-8")
+        doc_offsets.append(len(blob))
+
+    sections = {
+        "term_hashes": term_hashes,
+        "post_offsets": post_offsets,
+        "post_docs": post_docs,
+        "post_impacts": post_impacts,
+        "kw_docs": kw_docs,
+        "kw_lens": kw_lens,
+        "ac_trans_offsets": automaton.trans_offsets,
+        "ac_trans_chars": automaton.trans_chars,
+        "ac_trans_next": automaton.trans_next,
+        "ac_fail": automaton.fail,
+        "ac_out_offsets": automaton.out_offsets,
+        "ac_out_ids": automaton.out_ids,
+        "doc_offsets": doc_offsets,
+        "doc_blob": array("B", bytes(blob)),
+    }
+
+    # Lay sections out after the header; header length depends on the
+    # offsets, so size it with placeholder offsets first.
+    layout = {name: [0, arr.typecode, len(arr)] for name, arr in sections.items()}
+    meta = {
+        "version": FORMAT_VERSION,
+        "fingerprint": fingerprint,
+        "byteorder": sys.byteorder,
+        "n_docs": n_docs,
+        "n_terms": len(term_hashes),
+        "n_keywords": len(keywords),
+        "avgdl": avgdl,
+        "sections": layout,
+    }
+    header_len = len(MAGIC) + 8 + len(json.dumps(meta).encode("utf-8")) + 16 * len(sections)
+    offset = _align(header_len)
+    for name, arr in sections.items():
+        layout[name][0] = offset
+        offset = _align(offset + len(arr) * arr.itemsize)
+    meta_bytes = json.dumps(meta).encode("utf-8")
+    assert len(MAGIC) + 8 + len(meta_bytes) <= layout["term_hashes"][0]
+
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<Q", len(meta_bytes)))
+        f.write(meta_bytes)
+        for name, arr in sections.items():
+            f.write(b"\0" * (layout[name][0] - f.tell()))
+            f.write(arr.tobytes())
+    os.replace(tmp_path, path)
+
+class KnowledgeIndex:
+    """
+    Read-only view of an index written by `build_index`, memory-mapped so
+    opening it costs a header parse regardless of knowledge base size.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"Not a knowledge index: {path}")
+        (meta_len,) = struct.unpack_from("<Q", self._mmap, len(MAGIC))
+        start = len(MAGIC) + 8
+        self.meta = json.loads(self._mmap[start:start + meta_len].decode("utf-8"))
+        if self.meta.get("version") != FORMAT_VERSION or self.meta.get("byteorder") != sys.byteorder:
+            raise ValueError(f"Incompatible knowledge index: {path}")
+
+        view = memoryview(self._mmap)
+        arrays = {}
+        for name, (offset, typecode, count) in self.meta["sections"].items():
+            itemsize = array(typecode).itemsize
+            arrays[name] = view[offset:offset + count * itemsize].cast(typecode)
+        self._a = arrays
+        self.automaton = FlatAutomaton(
+            arrays["ac_trans_offsets"], arrays["ac_trans_chars"], arrays["ac_trans_next"],
+            arrays["ac_fail"], arrays["ac_out_offsets"], arrays["ac_out_ids"],
+        )
+
+    @property
+    def fingerprint(self) -> str:
+        return self.meta.get("fingerprint", "")
+
+    def __len__(self) -> int:
+        return self.meta["n_docs"]
+
+    def document(self, doc_id: int) -> Tuple[str, str]:
+        offsets = self._a["doc_offsets"]
+        raw = self._a["doc_blob"][offsets[doc_id]:offsets[doc_id + 1]].tobytes().decode("utf-8")
+        title, _, body = raw.partition("\x1f")
+        return title, body
+
+    def keyword_hits(self, query: str) -> Dict[int, int]:
+        """
+        doc_id -> number of distinct keywords of that document found in `query`.
+        """
+        kw_docs = self._a["kw_docs"]
+        seen = set()
+        hits: Dict[int, int] = defaultdict(int)
+        for _, keyword_id in self.automaton.iter_matches(normalize(query)):
+            if keyword_id not in seen:
+                seen.add(keyword_id)
+                hits[kw_docs[keyword_id]] += 1
+        return hits
+
+    def bm25(self, query: str, max_postings: int = MAX_POSTINGS_PER_TERM) -> Dict[int, float]:
+        term_hashes = self._a["term_hashes"]
+        offsets, docs, impacts = self._a["post_offsets"], self._a["post_docs"], self._a["post_impacts"]
+        n_terms = len(term_hashes)
+        scores: Dict[int, float] = defaultdict(float)
+        for term in set(tokenize(query)):
+            h = term_hash(term)
+            i = bisect_left(term_hashes, h)
+            if i == n_terms or term_hashes[i] != h:
+                continue
+            lo = offsets[i]
+            hi = min(offsets[i + 1], lo + max_postings)
+            for j in range(lo, hi):
+                scores[docs[j]] += impacts[j]
+        return scores
+
+    def search(self, query: str, top_k: int = 3, min_score: float = 0.0) -> List[Tuple[int, float]]:
+        """
+        Top `top_k` (doc_id, score) for `query`. A document qualifies through a
+        keyword hit, or through a BM25 score of at least `min_score`.
+        """
+        if not query:
+            return []
+        hits = self.keyword_hits(query)
+        scores = self.bm25(query)
+        for doc_id, count in hits.items():
+            scores[doc_id] += KEYWORD_BOOST * count
+        candidates = [
+            (score, doc_id) for doc_id, score in scores.items()
+            if doc_id in hits or score >= min_score
+        ]
+        return [(doc_id, score) for score, doc_id in heapq.nlargest(top_k, candidates)]
+
+def open_index(path: str, fingerprint: Optional[str] = None) -> Optional[KnowledgeIndex]:
+    """
+    Open `path` if it exists, is readable and (when given) matches `fingerprint`.
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        index = KnowledgeIndex(path)
+    except (ValueError, OSError) as e:
+        log.warning("Ignoring unusable index", path=path, error=str(e))
+        return None
+    if fingerprint is not None and index.fingerprint != fingerprint:
+        return None
+    return index
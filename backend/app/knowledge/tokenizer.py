@@ -0,0 +1,26 @@
+import re
+from typing import List
+
+# CJK runs and latin/digit words; everything else (spaces, punctuation) separates tokens
+_TOKEN_RE = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff]+|[a-z0-9]+")
+_CJK_RE = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff]")
+
+def normalize(text: str) -> str:
+    return text.lower()
+
+def tokenize(text: str) -> List[str]:
+    """
+    Index terms for BM25. Chinese has no word boundaries, so CJK runs are
+    split into overlapping character bigrams (a lone character stays a
+    unigram); latin words and numbers are kept whole.
+    """
+    terms = []
+    for run in _TOKEN_RE.findall(normalize(text)):
+        if _CJK_RE.match(run):
+            if len(run) == 1:
+                terms.append(run)
+            else:
+                terms.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            terms.append(run)
+    return terms
@@ -0,0 +1,196 @@
+import hashlib
+import json
+import math
+import os
+from typing import Dict, List, Optional, Sequence, Tuple
+from app.knowledge.tokenizer import _CJK_RE, _TOKEN_RE, normalize
+from app.api.utils.logger import get_logger
+
+log = get_logger("knowledge")
+
+try:
+    import numpy as np
+except ImportError:  # semantic retrieval is optional
+    np = None
+
+def numpy_available() -> bool:
+    return np is not None
+
+def _normalize_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).astype(np.float32, copy=False)
+
+class HashingEmbedder:
+    """
+    Offline text embedding without a model: character unigrams and bigrams
+    (latin words whole) hashed into `dim` signed buckets, log-scaled, weighted
+    by bucket IDF over the knowledge base, and L2-normalised.
+
+    Unigrams let a query match through single shared characters: "睡不着"
+    reaches an entry mentioning "睡眠" without sharing a keyword. The IDF
+    weights keep particles like "不" and "的" from dominating. Paraphrases
+    with no characters in common cannot be matched: "睡不着" against an entry
+    that only says "失眠" scores nothing. That needs an embedding model
+    (SentenceTransformerEmbedder, KNOWLEDGE_EMBEDDING_MODEL).
+    """
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+        self.idf = None
+
+    @property
+    def name(self) -> str:
+        return f"hashing-{self.dim}"
+
+    def _raw(self, texts: Sequence[str]):
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            buckets: Dict[int, float] = {}
+            for run in _TOKEN_RE.findall(normalize(text)):
+                if _CJK_RE.match(run):
+                    features = list(run) + [run[i:i + 2] for i in range(len(run) - 1)]
+                else:
+                    features = [run]
+                for feature in features:
+                    h = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+                    bucket = h % self.dim
+                    buckets[bucket] = buckets.get(bucket, 0.0) + (1.0 if h >> 63 else -1.0)
+            for bucket, value in buckets.items():
+                matrix[row, bucket] = math.copysign(math.log1p(abs(value)), value)
+        return matrix
+
+    def fit(self, texts: Sequence[str]):
+        raw = self._raw(texts)
+        df = np.count_nonzero(raw, axis=0)
+        self.idf = (np.log((1 + len(texts)) / (1 + df)) + 1).astype(np.float32)
+        return _normalize_rows(raw * self.idf)
+
+    def embed(self, texts: Sequence[str]):
+        raw = self._raw(texts)
+        if self.idf is not None:
+            raw *= self.idf
+        return _normalize_rows(raw)
+
+    def state(self) -> dict:
+        return {"idf": self.idf.tolist() if self.idf is not None else None}
+
+    def load_state(self, state: dict):
+        idf = state.get("idf")
+        self.idf = np.asarray(idf, dtype=np.float32) if idf is not None else None
+
+class SentenceTransformerEmbedder:
+    """
+    CPU embedding model through sentence-transformers (optional dependency),
+    e.g. "BAAI/bge-small-zh-v1.5". Catches paraphrases with no characters in
+    common, at a few milliseconds per query.
+    """
+    def __init__(self, model_name: str):
+        from sentence_transformers import SentenceTransformer
+        self.model_name = model_name
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.dim = self.model.get_sentence_embedding_dimension()
+
+    @property
+    def name(self) -> str:
+        return self.model_name
+
+    def fit(self, texts: Sequence[str]):
+        return self.embed(texts)
+
+    def embed(self, texts: Sequence[str]):
+        vectors = self.model.encode(list(texts), batch_size=64, normalize_embeddings=True)
+        return np.asarray(vectors, dtype=np.float32)
+
+    def state(self) -> dict:
+        return {}
+
+    def load_state(self, state: dict):
+        pass
+
+def create_embedder(model_name: str = "", dim: int = 512):
+    """
+    The configured embedding model, or the hashing embedder when none is set
+    or sentence-transformers is not installed.
+    """
+    if model_name:
+        try:
+            return SentenceTransformerEmbedder(model_name)
+        except ImportError:
+            log.warning("sentence-transformers not installed, using hashing embedder", model=model_name)
+    return HashingEmbedder(dim)
+
+def _meta_path(path: str) -> str:
+    return f"{path}.json"
+
+def build_vectors(texts: Sequence[str], path: str, embedder, fingerprint: str = ""):
+    """
+    Embed `texts` into a .npy matrix at `path`, with a JSON sidecar holding
+    the fingerprint and embedder state. Both are written atomically.
+    """
+    matrix = embedder.fit(texts)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.tmp.{os.getpid()}.npy"
+    np.save(tmp_path, matrix)
+    tmp_meta = f"{_meta_path(path)}.tmp.{os.getpid()}"
+    with open(tmp_meta, "w", encoding="utf-8") as f:
+        json.dump({"fingerprint": fingerprint, "embedder": embedder.name, "state": embedder.state()}, f)
+    os.replace(tmp_path, path)
+    os.replace(tmp_meta, _meta_path(path))
+
+class VectorIndex:
+    """
+    Document vectors memory-mapped from disk, scored by exact dot products.
+    At tens of thousands of rows one matrix product is a few milliseconds,
+    so there is no approximate index in front of it.
+    """
+    def __init__(self, path: str, embedder):
+        self.path = path
+        self.embedder = embedder
+        with open(_meta_path(path), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        if self.meta.get("embedder") != embedder.name:
+            raise ValueError(f"Vector file {path} was built with {self.meta.get('embedder')}")
+        embedder.load_state(self.meta.get("state") or {})
+        self.matrix = np.load(path, mmap_mode="r")
+        if self.matrix.ndim != 2 or self.matrix.shape[1] != embedder.dim:
+            raise ValueError(f"Vector file {path} does not match dim={embedder.dim}")
+
+    @property
+    def fingerprint(self) -> str:
+        return self.meta.get("fingerprint", "")
+
+    def __len__(self) -> int:
+        return self.matrix.shape[0]
+
+    def search_batch(self, queries: Sequence[str], top_k: int = 3, min_similarity: float = 0.0) -> List[List[Tuple[int, float]]]:
+        """
+        Top `top_k` (doc_id, cosine similarity) per query, from one matrix product.
+        """
+        if not len(self) or not queries:
+            return [[] for _ in queries]
+        scores = self.embedder.embed(queries) @ self.matrix.T
+        k = min(top_k, scores.shape[1])
+        results = []
+        for row in scores:
+            top = np.argpartition(-row, k - 1)[:k]
+            top = top[np.argsort(-row[top])]
+            results.append([(int(i), float(row[i])) for i in top if row[i] >= min_similarity])
+        return results
+
+    def search(self, query: str, top_k: int = 3, min_similarity: float = 0.0) -> List[Tuple[int, float]]:
+        return self.search_batch([query], top_k, min_similarity)[0]
+
+def open_vectors(path: str, embedder, fingerprint: Optional[str] = None) -> Optional[VectorIndex]:
+    """
+    Open `path` if it exists, was built by `embedder` and (when given) matches `fingerprint`.
+    """
+    if not os.path.exists(path) or not os.path.exists(_meta_path(path)):
+        return None
+    try:
+        vectors = VectorIndex(path, embedder)
+    except (ValueError, OSError) as e:
+        log.warning("Ignoring unusable vector file", path=path, error=str(e))
+        return None
+    if fingerprint is not None and vectors.fingerprint != fingerprint:
+        return None
+    return vectors
@@ -0,0 +1,216 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, Optional, Set
+from config.settings import settings
+from app.api.utils.metrics import timed
+from app.api.utils.logger import get_logger
+
+log = get_logger("cards")
+
+class CardGenerationScheduler:
+    """
+    Background queue for card regeneration.
+
+    - Requests are coalesced per user: only the latest one runs.
+    - Each user is debounced, so a burst of messages triggers one generation
+      `debounce_seconds` after the last message.
+    - At most `max_concurrency` generations run at once across all users.
+    - A user that asks again while its card is being generated is re-queued
+      once the running generation finishes.
+    - With `leases`, a generation first takes the user's lease in the shared
+      database, waiting up to `lease_wait` seconds while another worker
+      holds it, so workers never generate the same card at once.
+    """
+    def __init__(
+        self,
+        generate_fn: Callable[[str], Awaitable],
+        debounce_seconds: float = settings.CARD_DEBOUNCE_SECONDS,
+        max_concurrency: int = settings.CARD_MAX_CONCURRENCY,
+        max_pending: int = settings.CARD_MAX_PENDING,
+        leases=None,
+        lease_seconds: float = settings.CARD_LEASE_SECONDS,
+        lease_wait: float = settings.CARD_LEASE_WAIT_SECONDS,
+        lease_poll: float = 0.5,
+    ):
+        self._generate_fn = generate_fn
+        self.debounce_seconds = debounce_seconds
+        self.max_concurrency = max_concurrency
+        self.max_pending = max_pending
+        self.leases = leases if lease_seconds > 0 else None
+        self.lease_seconds = lease_seconds
+        self.lease_wait = lease_wait
+        self.lease_poll = lease_poll
+
+        self._pending: Dict[str, float] = {} # user_id -> monotonic due time
+        self._running: Dict[str, asyncio.Task] = {}
+        self._rerun: Set[str] = set()
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+
+        self.scheduled = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.completed = 0
+        self.failed = 0
+        self.lease_timeouts = 0
+
+    def schedule(self, user_id: str, delay: float = None) -> bool:
+        """
+        Request a card regeneration for a user. Returns False if the request was dropped.
+        `delay` overrides the debounce (0 = as soon as a slot is free).
+        Must be called from the event loop.
+        """
+        self._ensure_started()
+
+        if user_id in self._running:
+            # Picked up again as soon as the running generation finishes
+            if user_id in self._rerun:
+                self.coalesced += 1
+            self._rerun.add(user_id)
+            return True
+
+        if user_id in self._pending:
+            self.coalesced += 1
+        elif len(self._pending) >= self.max_pending:
+            self.dropped += 1
+            log.warning("Card queue full, dropping request", user_id=user_id, max_pending=self.max_pending)
+            return False
+        else:
+            self.scheduled += 1
+
+        due_at = time.monotonic() + (self.debounce_seconds if delay is None else delay)
+        if delay is not None and user_id in self._pending:
+            due_at = min(due_at, self._pending[user_id])
+        self._pending[user_id] = due_at
+        self._wakeup.set()
+        return True
+
+    async def run_now(self, user_id: str):
+        """
+        Generate a user's card immediately and return the result. Joins the
+        running generation for that user instead of starting a second one.
+        """
+        self._ensure_started()
+        task = self._running.get(user_id)
+        if task is None:
+            if user_id in self._pending:
+                del self._pending[user_id]
+                self.coalesced += 1
+            else:
+                self.scheduled += 1
+            task = self._running[user_id] = asyncio.create_task(self._run(user_id))
+        # Shield so a client timeout does not cancel work other callers share
+        return await asyncio.shield(task)
+
+    def is_running(self, user_id: str) -> bool:
+        return user_id in self._running
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "queue_depth": len(self._pending),
+            "running": len(self._running),
+            "scheduled": self.scheduled,
+            "coalesced": self.coalesced,
+            "dropped": self.dropped,
+            "completed": self.completed,
+            "failed": self.failed,
+            "lease_timeouts": self.lease_timeouts,
+        }
+
+    async def start(self):
+        self._ensure_started()
+
+    async def stop(self, timeout: float = 10.0):
+        """
+        Stop dispatching, drop pending requests and wait briefly for running ones.
+        """
+        if self._dispatcher:
+            self._dispatcher.cancel()
+            try:
+                await self._dispatcher
+            except asyncio.CancelledError:
+                pass
+            self._dispatcher = None
+
+        if self._pending:
+            log.info("Discarding pending card requests on shutdown", pending=len(self._pending))
+        self._pending.clear()
+        self._rerun.clear()
+
+        running = list(self._running.values())
+        if running:
+            done, not_done = await asyncio.wait(running, timeout=timeout)
+            for task in not_done:
+                task.cancel()
+
+    def _ensure_started(self):
+        if self._dispatcher is None or self._dispatcher.done():
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._wakeup = asyncio.Event()
+            self._dispatcher = asyncio.create_task(self._dispatch_loop())
+
+    async def _dispatch_loop(self):
+        while True:
+            self._wakeup.clear()
+            now = time.monotonic()
+            due = [user_id for user_id, due_at in self._pending.items() if due_at <= now]
+            for user_id in due:
+                del self._pending[user_id]
+                self._running[user_id] = asyncio.create_task(self._run(user_id))
+
+            if self._pending:
+                delay = min(self._pending.values()) - now
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=max(delay, 0))
+                except asyncio.TimeoutError:
+                    pass
+            else:
+                await self._wakeup.wait()
+
+    async def _acquire_lease(self, name: str) -> bool:
+        deadline = time.monotonic() + self.lease_wait
+        while not await self.leases.acquire(name, self.lease_seconds):
+            if time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(self.lease_poll)
+        return True
+
+    async def _run(self, user_id: str):
+        lease = f"card:{user_id}"
+        held = False
+        try:
+            if self.leases is not None:
+                # Outside the semaphore: waiting on another worker must not
+                # take a slot from this worker's other users
+                held = await self._acquire_lease(lease)
+                if not held:
+                    self.lease_timeouts += 1
+                    self.failed += 1
+                    log.warning("Card lease busy, giving up", user_id=user_id, waited=self.lease_wait)
+                    return {"error": "Card is being generated by another worker"}
+            async with self._semaphore:
+                with timed("card"):
+                    result = await self._generate_fn(user_id)
+            if isinstance(result, dict) and "error" in result:
+                self.failed += 1
+            else:
+                self.completed += 1
+            return result
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.failed += 1
+            log.exception("Card task failed", user_id=user_id)
+            return {"error": f"Unexpected Error: {e}"}
+        finally:
+            if held:
+                try:
+                    await self.leases.release(lease)
+                except Exception as e:
+                    # It expires on its own
+                    log.warning("Card lease release failed", user_id=user_id, error=str(e))
+            self._running.pop(user_id, None)
+            if user_id in self._rerun:
+                self._rerun.discard(user_id)
+                self.schedule(user_id)
@@ -1,45 +1,102 @@
-from app.storage.conversation_storage import get_history, save_card_cache, get_card_cache
+from app.storage.async_storage import save_card_cache, get_card_cache, count_messages_after
 from app.templates.prompt_templates import PromptTemplates
-from app.api.utils.factory import get_llm_client
+from app.api.utils.factory import get_async_llm_client
+from app.api.utils.response_cache import response_cache
+from app.api.utils.metrics import metrics
+from app.storage.leases import leases
+from app.services.card_scheduler import CardGenerationScheduler
+from app.services.summary_service import build_card_conversation
 import json
-import traceback
+from app.api.utils.logger import get_logger
+
+log = get_logger("cards")
 
 async def get_or_create_card(user_id: str):
     """
-    Orchestrates the card generation process: checks cache first, then generates if needed.
+    Orchestrates the card generation process: serves the cached card, stale or
+    not, and only blocks on the LLM when there is no card at all.
+
+    The returned card carries a `freshness` block:
+    - "fresh": the card covers the user's latest message.
+    - "stale": newer messages exist; a regeneration has been queued.
+    - "generated": there was no usable card, it was generated for this request.
     """
     try:
         # 1. Try cache first
-        cached_json = get_card_cache(user_id)
-        if cached_json:
-            print(f"[DEBUG] Cache hit for {user_id}")
+        cache = await get_card_cache(user_id)
+        if cache and cache.card_json:
             try:
-                return json.loads(cached_json)
+                card_data = json.loads(cache.card_json)
             except json.JSONDecodeError:
-                print(f"[DEBUG] Cached JSON invalid, regenerating...")
-        
-        print(f"[DEBUG] Cache miss for {user_id}, generating now...")
-        
-        # 2. Fallback to immediate generation
-        return await generate_and_cache_card_task(user_id)
+                log.warning("Cached card JSON invalid, regenerating", user_id=user_id)
+                card_data = None
+
+            if card_data is not None:
+                if cache.last_message_id is None:
+                    # Written before versioning existed, treat as stale
+                    messages_behind = await count_messages_after(user_id)
+                else:
+                    messages_behind = await count_messages_after(user_id, cache.last_message_id)
+
+                if messages_behind == 0:
+                    log.debug("Card cache hit", user_id=user_id, status="fresh")
+                    status = "fresh"
+                else:
+                    log.debug("Card cache hit, revalidating", user_id=user_id, status="stale", messages_behind=messages_behind)
+                    status = "stale"
+                    card_scheduler.schedule(user_id, delay=0)
+
+                card_data["freshness"] = {
+                    "status": status,
+                    "messages_behind": messages_behind,
+                    "updating": status == "stale",
+                    "updated_at": cache.updated_at.isoformat() if cache.updated_at else None,
+                }
+                return card_data
+
+        log.debug("Card cache miss, generating now", user_id=user_id)
+
+        # 2. Fallback to immediate generation, joining any in-flight one
+        result = await card_scheduler.run_now(user_id)
+        if not result:
+            return {"error": "No conversation history to build a card from"}
+        if "error" in result:
+            return result
+        card_data = dict(result)
+        card_data["freshness"] = {
+            "status": "generated",
+            "messages_behind": 0,
+            "updating": False,
+            "updated_at": None,
+        }
+        return card_data
         
     except Exception as e:
         error_msg = f"Unexpected Error in get_or_create_card: {e}"
-        print(f"[ERROR] {error_msg}")
-        traceback.print_exc()
+        log.exception("Card lookup failed", user_id=user_id)
         return {"error": error_msg}
 
 async def generate_and_cache_card_task(user_id: str):
     try:
-        print(f"\n[BACKGROUND] >>> Starting Card Generation for {user_id}")
+        log.info("Generating card", user_id=user_id)
         
-        # 1. Get recent history
-        history = get_history(user_id, limit=50)
-        if not history:
-             print("[BACKGROUND] No history found, skipping.")
+        # 1. Rolling summary + messages since it was last updated
+        context = await build_card_conversation(user_id)
+        if not context:
+             log.info("No history for card, skipping", user_id=user_id)
              return
              
-        conversation_text = "\n".join([f"{msg.role}: {msg.content}" for msg in reversed(history)])
+        conversation_text, last_message_id = context
+
+        # Another worker may have generated it while this one waited for the lease
+        cache = await get_card_cache(user_id)
+        if cache and cache.card_json and last_message_id is not None and cache.last_message_id == last_message_id:
+            try:
+                card_data = json.loads(cache.card_json)
+                log.info("Card already up to date, skipping", user_id=user_id)
+                return card_data
+            except json.JSONDecodeError:
+                pass
         
         # 2. Build Prompt
         # Use replace instead of format to avoid issues with braces in conversation_text
@@ -47,13 +104,16 @@ async def generate_and_cache_card_task(user_id: str):
         messages = [{"role": "user", "content": prompt}]
         
         # 3. Call LLM
-        client = get_llm_client()
-        # Disable thinking for JSON generation to ensure strict format
-        response = client.chat_completion(messages, thinking_enabled=False)
+        client = get_async_llm_client()
+        # Disable thinking for JSON generation to ensure strict format.
+        # The prompt only changes with the conversation, so an identical
+        # request (retry, re-run, another worker) reuses the cached answer.
+        # With provider failover configured, a slow upstream is hedged.
+        response = await client.chat_completion(messages, thinking_enabled=False, cache=True, hedge=True)
         
         if "error" in response:
              error_msg = f"LLM Error: {response['error']}"
-             print(f"[BACKGROUND] {error_msg}")
+             log.error("Card generation failed", user_id=user_id, error=error_msg)
              return {"error": error_msg}
              
         ai_content = ""
@@ -62,7 +122,7 @@ async def generate_and_cache_card_task(user_id: str):
             
         if not ai_content:
              error_msg = "Empty response from LLM"
-             print(f"[BACKGROUND] {error_msg}")
+             log.error("Card generation failed", user_id=user_id, error=error_msg)
              return {"error": error_msg}
 
         # 4. Parse and Validate JSON
@@ -72,18 +132,27 @@ async def generate_and_cache_card_task(user_id: str):
             # Verify it's valid JSON
             card_data = json.loads(clean_content) 
             
-            # 5. Save to Cache
-            save_card_cache(user_id, clean_content)
-            print(f"[BACKGROUND] Card cached successfully for {user_id}")
+            # 5. Save to Cache, tagged with the newest message it summarises
+            await save_card_cache(user_id, clean_content, last_message_id=last_message_id)
+            log.info("Card cached", user_id=user_id)
             return card_data
             
         except json.JSONDecodeError:
+             # Don't keep serving an unusable answer from the cache
+             response_cache.discard(client.cache_key(messages, thinking_enabled=False))
              error_msg = f"JSON Parse Error: {ai_content}"
-             print(f"[BACKGROUND] {error_msg}")
+             log.error("Card generation failed", user_id=user_id, error="JSON Parse Error", content=ai_content[:500])
              return {"error": error_msg}
              
     except Exception as e:
         error_msg = f"Unexpected Error: {e}"
-        print(f"[BACKGROUND] {error_msg}")
-        traceback.print_exc()
+        log.exception("Card generation failed", user_id=user_id)
         return {"error": error_msg}
+
+card_scheduler = CardGenerationScheduler(generate_and_cache_card_task, leases=leases)
+
+metrics.gauge_callback(
+    "card_tasks", "Background card generations (queued = waiting for debounce or a slot)",
+    lambda: {("queued",): card_scheduler.stats()["queue_depth"], ("running",): card_scheduler.stats()["running"]},
+    ["state"],
+)
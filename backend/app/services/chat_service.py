@@ -1,21 +1,71 @@
 from typing import AsyncGenerator
-import json
 import asyncio
-import traceback
 import re
-from app.storage.conversation_storage import save_message, get_history
+import time
+from app.storage.async_storage import save_message, get_history, get_summary
 from app.api.utils.psychology_knowledge import psychology_knowledge
 from app.templates.prompt_templates import PromptTemplates
-from app.api.utils.factory import get_llm_client
-from app.services.card_service import generate_and_cache_card_task
+from app.api.utils.factory import get_async_llm_client
+from app.services.card_service import card_scheduler
+from app.services.context_builder import build_chat_context, estimate_tokens, get_context_budget
+from app.services.stream_parser import StreamEvent, SuggestionStreamParser, strip_suggestions
+from app.services.reasoning import ReasoningStream
+from app.api.utils.llm_interface import Reasoning
+from app.api.utils.metrics import metrics, observe_stage, timed
 from config.settings import settings
+from app.api.utils.logger import get_logger
+
+log = get_logger("chat")
+
+# Appended to a reply saved after its generation was cancelled
+INTERRUPTED_MARKER = "……（回复已中断）"
+
+TTFT_SECONDS = metrics.histogram(
+    "chat_ttft_seconds", "Time from calling the provider to its first reasoning / answer chunk", ["provider", "channel"],
+)
+TOKENS_PER_SECOND = metrics.histogram(
+    "chat_tokens_per_second", "Estimated completion tokens per second after the first chunk", ["provider"],
+    buckets=(1, 5, 10, 20, 30, 50, 75, 100, 150, 250),
+)
+
+def _reasoning_fallback():
+    name = settings.CHAT_REASONING_FALLBACK
+    if not name:
+        return None
+    try:
+        return get_async_llm_client(name)
+    except ValueError:
+        log.warning("Unknown CHAT_REASONING_FALLBACK, ignoring it", fallback=name)
+        return None
+
+def _ms(at, start):
+    return round((at - start) * 1000) if at is not None else None
+
+def _is_same_message(msg, current_msg) -> bool:
+    if current_msg is None:
+        return False
+    # Unflushed write-behind records have no id yet but are the same object
+    return msg is current_msg or (current_msg.id is not None and msg.id == current_msg.id)
 
 class ChatService:
     @staticmethod
-    async def chat_stream_generator(user_id: str, content: str, mode: str, thinking_enabled: bool, current_msg_id: str = None) -> AsyncGenerator[bytes, None]:
+    async def chat_events(
+        user_id: str, content: str, mode: str, thinking_enabled: bool, current_msg=None, show_reasoning: bool = False,
+    ) -> AsyncGenerator[StreamEvent, None]:
+        """
+        Run one chat turn and yield its reply as typed events: "delta",
+        "suggestions", "usage" (estimated token counts) and "error", plus
+        "reasoning" with the model's reasoning text if `show_reasoning`.
+        Reasoning is budgeted (CHAT_REASONING_MAX_SECONDS / _TOKENS); past
+        the budget the answer comes from CHAT_REASONING_FALLBACK.
+        The reply is saved without its suggestions marker; if the generation
+        is cancelled, whatever arrived so far is saved with INTERRUPTED_MARKER.
+        """
+        parser = None
         try:
             # 1. Retrieve Knowledge
-            knowledge = psychology_knowledge.search(content)
+            with timed("retrieval"):
+                knowledge = psychology_knowledge.search(content)
             
             # 2. Build Messages
             if mode == "professional":
@@ -26,39 +76,105 @@ class ChatService:
             if knowledge:
                 system_prompt += f"\n\n相关心理学知识库：\n{knowledge}"
                 
-            messages = [{"role": "system", "content": system_prompt}]
-            
-            # Add History
-            history = get_history(user_id, limit=20) 
-            for msg in reversed(history):
-                if current_msg_id and msg.id == current_msg_id:
-                    continue # Exclude current message if found in history (though usually history doesn't include it if saved *just* now depending on impl, but best to be safe)
-                messages.append({"role": msg.role, "content": msg.content})
-            
-            # Add Current User Message explicitly at the end
-            messages.append({"role": "user", "content": content})
-            
-            print(f"[DEBUG] Sending messages to LLM: {json.dumps(messages, ensure_ascii=False)}")
+            # Add History (oldest first), excluding the message we just saved
+            with timed("history"):
+                history = await get_history(user_id, limit=settings.CHAT_HISTORY_LIMIT)
+            history_turns = [
+                {"role": msg.role, "content": strip_suggestions(msg.content) if msg.role == "assistant" else msg.content}
+                for msg in reversed(history)
+                if not _is_same_message(msg, current_msg)
+            ]
+
+            client = get_async_llm_client()
+
+            # Fit everything into the model's prompt budget. For conversations
+            # longer than the history window, the rolling card summary stands in
+            # for the turns left out.
+            older_history = len(history) >= settings.CHAT_HISTORY_LIMIT
+            summary_row = await get_summary(user_id) if older_history else None
+            with timed("prompt_build"):
+                context = build_chat_context(
+                    system_prompt,
+                    history_turns,
+                    content,
+                    budget=get_context_budget(client.model),
+                    summary=summary_row.summary if summary_row else None,
+                    older_history=older_history,
+                )
+            messages = context.messages
+
+            log.debug(
+                "Prompt built", user_id=user_id, prompt_tokens=context.prompt_tokens, budget=context.budget,
+                history_used=context.history_used, history_dropped=context.history_dropped,
+                history_truncated=context.history_truncated, summary_used=context.summary_used,
+            )
+            # The full prompt is large; it is only serialised for sampled records
+            log.sampled("Prompt messages", user_id=user_id, messages=lambda: messages)
 
-            # 3. Call LLM (Stream)
-            client = get_llm_client()
-            full_content = ""
+            # 3. Call LLM (Stream), splitting the suggestions marker off as it arrives
+            parser = SuggestionStreamParser()
             
-            print(f"[DEBUG] Starting stream with {settings.LLM_PROVIDER}")
-            for chunk in client.chat_completion_stream(messages, thinking_enabled=thinking_enabled):
+            log.debug("Starting stream", user_id=user_id, provider=client.provider, model=client.model)
+            reply = ReasoningStream(
+                client, messages, thinking_enabled=thinking_enabled,
+                max_seconds=settings.CHAT_REASONING_MAX_SECONDS,
+                max_tokens=settings.CHAT_REASONING_MAX_TOKENS,
+                fallback=_reasoning_fallback(),
+            )
+            reasoning_seen = answer_seen = False
+            async for chunk in reply:
+                if isinstance(chunk, Reasoning):
+                    if not reasoning_seen:
+                        reasoning_seen = True
+                        TTFT_SECONDS.observe(reply.first_reasoning_at - reply.started, provider=reply.reasoning_provider, channel="reasoning")
+                        observe_stage("ttft_reasoning", reply.first_reasoning_at - reply.started)
+                    if show_reasoning:
+                        yield StreamEvent("reasoning", str(chunk))
+                    continue
                 if chunk.startswith("[ERROR]"):
-                     yield chunk.encode('utf-8')
+                     yield StreamEvent("error", chunk[len("[ERROR]"):].strip())
                      return
+                if not answer_seen:
+                    answer_seen = True
+                    TTFT_SECONDS.observe(reply.first_answer_at - reply.started, provider=reply.answer_provider, channel="answer")
+                    observe_stage("ttft", reply.first_answer_at - reply.started)
                 
-                full_content += chunk
-                yield chunk.encode('utf-8')
+                for event in parser.feed(chunk):
+                    yield event
+            for event in parser.finish():
+                yield event
+            stream_end = time.perf_counter()
+            observe_stage("stream", stream_end - reply.started)
             
             # 4. Save AI Message
+            full_content = parser.text
+            completion_tokens = estimate_tokens(full_content)
+            if reply.first_answer_at is not None and stream_end > reply.first_answer_at:
+                TOKENS_PER_SECOND.observe(completion_tokens / (stream_end - reply.first_answer_at), provider=reply.answer_provider)
+            yield StreamEvent("usage", {
+                "provider": reply.answer_provider or reply.answered_by.provider,
+                "model": reply.answered_by.model,
+                "prompt_tokens": context.prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "reasoning_tokens": reply.reasoning_tokens,
+                "estimated": True,
+                "ttft_ms": _ms(reply.first_answer_at, reply.started),
+                "reasoning_ttft_ms": _ms(reply.first_reasoning_at, reply.started),
+                "reasoning_ms": round(reply.reasoning_seconds * 1000) if reply.reasoning_seconds is not None else None,
+                "reasoning_cut": reply.cut,
+                "stream_ms": round((stream_end - reply.started) * 1000),
+            })
             if full_content:
-                save_message(user_id, "assistant", full_content)
-                # Trigger background card generation
-                asyncio.create_task(generate_and_cache_card_task(user_id))
+                await save_message(user_id, "assistant", full_content)
+                # Queue background card generation (debounced, coalesced per user)
+                card_scheduler.schedule(user_id)
                 
+        except asyncio.CancelledError:
+            partial = parser.text if parser else ""
+            if partial:
+                log.info("Generation cancelled, saving partial reply", user_id=user_id, chars=len(partial))
+                await save_message(user_id, "assistant", partial + INTERRUPTED_MARKER)
+            raise
         except Exception as e:
-            traceback.print_exc()
-            yield f"[ERROR] {str(e)}".encode('utf-8')
+            log.exception("Chat turn failed", user_id=user_id)
+            yield StreamEvent("error", str(e))
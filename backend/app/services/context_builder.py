@@ -0,0 +1,127 @@
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+from config.settings import settings
+
+# Rough per-character costs, after DeepSeek's published rule of thumb
+# (1 Chinese character ~ 0.6 token, 1 English character ~ 0.3 token).
+# Good enough for budgeting; we never need the exact count.
+CJK_TOKENS_PER_CHAR = 0.6
+OTHER_TOKENS_PER_CHAR = 0.3
+MESSAGE_OVERHEAD_TOKENS = 4
+
+TRUNCATION_MARKER = "…（内容过长，已省略）"
+
+def _is_cjk(ch: str) -> bool:
+    code = ord(ch)
+    return (
+        0x4E00 <= code <= 0x9FFF      # CJK Unified Ideographs
+        or 0x3400 <= code <= 0x4DBF   # Extension A
+        or 0x3000 <= code <= 0x303F   # CJK punctuation
+        or 0xFF00 <= code <= 0xFFEF   # Full-width forms
+    )
+
+def estimate_tokens(text: str) -> int:
+    if not text:
+        return 0
+    cjk = sum(1 for ch in text if _is_cjk(ch))
+    return int(cjk * CJK_TOKENS_PER_CHAR + (len(text) - cjk) * OTHER_TOKENS_PER_CHAR) + 1
+
+def estimate_message_tokens(message: Dict[str, str]) -> int:
+    return estimate_tokens(message["content"]) + MESSAGE_OVERHEAD_TOKENS
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """
+    Keep the head of `text` so that it fits in roughly `max_tokens`.
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    budget = max_tokens - estimate_tokens(TRUNCATION_MARKER)
+    used = 0.0
+    for i, ch in enumerate(text):
+        used += CJK_TOKENS_PER_CHAR if _is_cjk(ch) else OTHER_TOKENS_PER_CHAR
+        if used > budget:
+            return text[:i] + TRUNCATION_MARKER
+    return text
+
+def get_context_budget(model: str) -> int:
+    return settings.CONTEXT_TOKEN_BUDGETS.get(model, settings.CONTEXT_TOKEN_BUDGET_DEFAULT)
+
+@dataclass
+class ContextWindow:
+    messages: List[Dict[str, str]]
+    prompt_tokens: int
+    budget: int
+    history_used: int = 0
+    history_dropped: int = 0
+    history_truncated: int = 0
+    summary_used: bool = False
+
+def build_chat_context(
+    system_prompt: str,
+    history: List[Dict[str, str]],
+    user_content: str,
+    budget: int,
+    summary: Optional[str] = None,
+    older_history: bool = False,
+) -> ContextWindow:
+    """
+    Assemble system prompt + history + current message within a token budget.
+
+    Priority, highest first: system prompt, current user message, most recent
+    history turns. Older turns longer than CONTEXT_MAX_TURN_TOKENS are
+    truncated; turns that no longer fit are dropped, and if a rolling summary
+    is available it stands in for them.
+
+    :param history: Previous turns, oldest first.
+    :param older_history: True if the conversation goes back further than `history`,
+        in which case the summary is added even when nothing had to be dropped.
+    """
+    system = {"role": "system", "content": system_prompt}
+    current = {"role": "user", "content": user_content}
+
+    remaining = budget - estimate_message_tokens(system)
+    # The user's own message is never dropped, only cut down if it alone is too big
+    current_budget = max(remaining - MESSAGE_OVERHEAD_TOKENS, settings.CONTEXT_MAX_TURN_TOKENS)
+    if estimate_message_tokens(current) > current_budget + MESSAGE_OVERHEAD_TOKENS:
+        current["content"] = truncate_to_tokens(user_content, current_budget)
+    remaining -= estimate_message_tokens(current)
+
+    kept: List[Dict[str, str]] = []
+    truncated = 0
+    recent_turns = settings.CONTEXT_FULL_RECENT_TURNS
+    for age, msg in enumerate(reversed(history)):
+        content = msg["content"]
+        # The latest few turns are kept whole; older ones are capped
+        was_truncated = False
+        if age >= recent_turns and estimate_tokens(content) > settings.CONTEXT_MAX_TURN_TOKENS:
+            content = truncate_to_tokens(content, settings.CONTEXT_MAX_TURN_TOKENS)
+            was_truncated = True
+        item = {"role": msg["role"], "content": content}
+        cost = estimate_message_tokens(item)
+        if cost > remaining:
+            break
+        kept.append(item)
+        remaining -= cost
+        truncated += was_truncated
+    kept.reverse()
+    dropped = len(history) - len(kept)
+
+    summary_used = False
+    if summary and (dropped or older_history):
+        summary_text = f"此前对话摘要（较早的对话已省略）：\n{summary}"
+        cost = estimate_tokens(summary_text) + 2
+        if cost <= remaining:
+            system["content"] = f"{system_prompt}\n\n{summary_text}"
+            remaining -= cost
+            summary_used = True
+
+    messages = [system] + kept + [current]
+    return ContextWindow(
+        messages=messages,
+        prompt_tokens=budget - remaining,
+        budget=budget,
+        history_used=len(kept),
+        history_dropped=dropped,
+        history_truncated=truncated,
+        summary_used=summary_used,
+    )
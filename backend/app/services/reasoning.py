@@ -0,0 +1,143 @@
+import asyncio
+import time
+from typing import AsyncIterator, Dict, List, Optional
+from app.api.utils.llm_interface import AsyncLLMClient, Reasoning, stream_provider
+from app.api.utils.failover import FailoverClient
+from app.api.utils.metrics import metrics
+from app.services.context_builder import estimate_tokens
+from app.api.utils.logger import get_logger
+
+log = get_logger("chat")
+
+REASONING_CUTS = metrics.counter(
+    "chat_reasoning_cuts_total", "Replies whose reasoning ran over budget and were answered by the fallback", ["budget"],
+)
+
+class ReasoningStream:
+    """
+    One chat reply from a model that may reason before answering.
+
+    Iterating yields the client's chunks unchanged: Reasoning chunks first,
+    then the answer. If the reply is still reasoning `max_seconds` after its
+    first reasoning chunk, or after an estimated `max_tokens` reasoning
+    tokens, that request is closed and the answer comes from another client
+    with thinking disabled: `fallback`, or for a FailoverClient its other
+    providers. Without one the reasoning is not cut, since asking the same
+    upstream again would double cost and latency. The fallback is not
+    budgeted, so a reply always gets an answer. Replies that don't reason
+    are never cut, however slow their first answer chunk.
+
+    Timings are perf_counter values, for the caller's metrics.
+    `reasoning_provider` and `answer_provider` name the upstreams that
+    actually served each part (through failover, not necessarily the
+    client's own provider).
+    """
+    def __init__(
+        self,
+        client: AsyncLLMClient,
+        messages: List[Dict[str, str]],
+        thinking_enabled: bool = False,
+        max_seconds: float = 0.0,
+        max_tokens: int = 0,
+        fallback: Optional[AsyncLLMClient] = None,
+    ):
+        self.client = client
+        self.messages = messages
+        self.thinking_enabled = thinking_enabled
+        self.max_seconds = max_seconds
+        self.max_tokens = max_tokens
+        self.fallback = fallback
+
+        self.answered_by = client
+        self.started: Optional[float] = None
+        self.first_reasoning_at: Optional[float] = None
+        self.first_answer_at: Optional[float] = None
+        self.reasoning_tokens = 0
+        self.reasoning_provider: Optional[str] = None
+        self.answer_provider: Optional[str] = None
+        self.cut: Optional[str] = None  # "seconds" or "tokens" once the budget ran out
+        self._cut_to: Optional[AsyncLLMClient] = None  # who answers if the budget runs out
+
+    @property
+    def reasoning_seconds(self) -> Optional[float]:
+        """
+        From the first reasoning chunk to the first answer chunk (or now).
+        """
+        if self.first_reasoning_at is None:
+            return None
+        return (self.first_answer_at or time.perf_counter()) - self.first_reasoning_at
+
+    def _observe(self, chunk: str, client: AsyncLLMClient, stream):
+        now = time.perf_counter()
+        if isinstance(chunk, Reasoning):
+            if self.first_reasoning_at is None:
+                self.first_reasoning_at = now
+                self.reasoning_provider = stream_provider(client, stream)
+            self.reasoning_tokens += estimate_tokens(chunk)
+        elif self.first_answer_at is None and not chunk.startswith("[ERROR]"):
+            self.first_answer_at = now
+            self.answer_provider = stream_provider(client, stream)
+
+    def _fallback_for(self, stream) -> Optional[AsyncLLMClient]:
+        """
+        Client to answer instead of the upstream reasoning on `stream`, or None.
+        """
+        if self.fallback is not None and self.fallback is not self.client:
+            return self.fallback
+        name = getattr(stream, "name", None)
+        if isinstance(self.client, FailoverClient) and name:
+            return self.client.excluding(name)
+        return None
+
+    def _over_token_budget(self) -> bool:
+        return (
+            self._cut_to is not None and bool(self.max_tokens)
+            and self.first_answer_at is None and self.reasoning_tokens >= self.max_tokens
+        )
+
+    async def __aiter__(self) -> AsyncIterator[str]:
+        self.started = time.perf_counter()
+        stream = self.client.chat_completion_stream(self.messages, thinking_enabled=self.thinking_enabled, reasoning=True)
+        try:
+            while True:
+                if self._cut_to is not None and self.max_seconds > 0 and self.first_answer_at is None:
+                    remaining = self.max_seconds - (time.perf_counter() - self.first_reasoning_at)
+                    try:
+                        if remaining <= 0:
+                            raise asyncio.TimeoutError
+                        chunk = await asyncio.wait_for(stream.__anext__(), timeout=remaining)
+                    except asyncio.TimeoutError:
+                        self.cut = "seconds"
+                        break
+                else:
+                    chunk = await stream.__anext__()
+                first_reasoning = self.first_reasoning_at is None and isinstance(chunk, Reasoning)
+                self._observe(chunk, self.client, stream)
+                if first_reasoning:
+                    # The budget starts now, if there is someone to hand over to
+                    self._cut_to = self._fallback_for(stream)
+                yield chunk
+                if self._over_token_budget():
+                    self.cut = "tokens"
+                    break
+        except StopAsyncIteration:
+            pass
+        finally:
+            await stream.aclose()
+        if not self.cut:
+            return
+
+        REASONING_CUTS.inc(budget=self.cut)
+        self.answered_by = self._cut_to
+        log.info(
+            "Reasoning over budget, answering with fallback", budget=self.cut,
+            reasoning_tokens=self.reasoning_tokens, seconds=round(time.perf_counter() - self.started, 2),
+            fallback=self.answered_by.model,
+        )
+        stream = self.answered_by.chat_completion_stream(self.messages, thinking_enabled=False, reasoning=True)
+        try:
+            async for chunk in stream:
+                self._observe(chunk, self.answered_by, stream)
+                yield chunk
+        finally:
+            await stream.aclose()
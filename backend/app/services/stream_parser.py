@@ -0,0 +1,132 @@
+import json
+import re
+from typing import Any, List, Optional
+
+# Models end every reply with |||SUGGESTIONS=["...", "..."]||| (sometimes SUGGESTION=)
+SUGGESTION_TAGS = ("|||SUGGESTIONS=", "|||SUGGESTION=")
+MARKER_END = "|||"
+_TAG_RE = re.compile(r"\|\|\|SUGGESTIONS?=")
+_MARKER_RE = re.compile(r"\|\|\|SUGGESTIONS?=.*?\|\|\|", re.DOTALL)
+_LIST_RE = re.compile(r"\[(.*?)(?:\]|$)", re.DOTALL)  # closing bracket may be cut off
+
+class StreamEvent:
+    """
+    One typed event of a chat reply: "delta" (display text), "suggestions"
+    (list of strings), "usage" (dict) or "error" (message).
+    """
+    __slots__ = ("type", "data")
+
+    def __init__(self, type: str, data: Any = None):
+        self.type = type
+        self.data = data
+
+    def __repr__(self):
+        return f"StreamEvent({self.type!r}, {self.data!r})"
+
+def strip_suggestions(text: str) -> str:
+    """
+    Remove suggestion markers from a stored reply (messages saved before the
+    streaming parser existed still contain them).
+    """
+    return _MARKER_RE.sub("", text).strip()
+
+def parse_suggestions(raw: str) -> List[str]:
+    """
+    The list inside a marker: JSON if possible, otherwise a loose [a, b] split.
+    """
+    try:
+        items = json.loads(raw.strip())
+    except ValueError:
+        match = _LIST_RE.search(raw)
+        if not match:
+            return []
+        items = [s.strip().strip("'\"") for s in match.group(1).split(",")]
+    if not isinstance(items, list):
+        return []
+    return [str(s).strip() for s in items if str(s).strip()]
+
+def format_suggestions_marker(suggestions: List[str]) -> str:
+    return f"{SUGGESTION_TAGS[0]}{json.dumps(suggestions, ensure_ascii=False, separators=(',', ':'))}{MARKER_END}"
+
+def _partial_tag_len(text: str) -> int:
+    """
+    Length of the longest suffix of `text` that could be the start of a tag.
+    """
+    for size in range(min(len(text), len(SUGGESTION_TAGS[0]) - 1), 0, -1):
+        tail = text[-size:]
+        if any(tag.startswith(tail) for tag in SUGGESTION_TAGS):
+            return size
+    return 0
+
+class SuggestionStreamParser:
+    """
+    Splits a streamed reply into display text and the suggestions marker.
+
+    Chunks can cut the marker anywhere, so text that might be the start of a
+    tag is held back until the next chunk decides it. Trailing whitespace is
+    held back too, so the newline models put before the marker is dropped
+    rather than sent. `text` is the full display text seen so far.
+    """
+    def __init__(self):
+        self._buffer = ""
+        self._marker: Optional[str] = None  # raw marker body while inside one
+        self._parts: List[str] = []
+        self.suggestions: Optional[List[str]] = None
+
+    @property
+    def text(self) -> str:
+        return "".join(self._parts)
+
+    def feed(self, chunk: str) -> List[StreamEvent]:
+        events: List[StreamEvent] = []
+        self._buffer += chunk
+        while self._buffer:
+            if self._marker is not None:
+                self._marker += self._buffer
+                self._buffer = ""
+                end = self._marker.find(MARKER_END)
+                if end < 0:
+                    break
+                raw, self._buffer = self._marker[:end], self._marker[end + len(MARKER_END):]
+                self._marker = None
+                self._emit_suggestions(raw, events)
+                continue
+
+            match = _TAG_RE.search(self._buffer)
+            if match:
+                self._emit_text(self._buffer[:match.start()].rstrip(), events)
+                self._buffer = self._buffer[match.end():]
+                self._marker = ""
+                continue
+
+            hold = _partial_tag_len(self._buffer)
+            safe = self._buffer[:len(self._buffer) - hold]
+            text = safe.rstrip()
+            self._emit_text(text, events)
+            self._buffer = self._buffer[len(text):]
+            break
+        return events
+
+    def finish(self) -> List[StreamEvent]:
+        """
+        Flush at end of stream. An unterminated marker is parsed as far as it got.
+        """
+        events: List[StreamEvent] = []
+        if self._marker is not None:
+            self._emit_suggestions(self._marker + self._buffer, events)
+            self._marker = None
+        else:
+            self._emit_text(self._buffer.rstrip(), events)
+        self._buffer = ""
+        return events
+
+    def _emit_text(self, text: str, events: List[StreamEvent]):
+        if text:
+            self._parts.append(text)
+            events.append(StreamEvent("delta", text))
+
+    def _emit_suggestions(self, raw: str, events: List[StreamEvent]):
+        suggestions = parse_suggestions(raw)
+        if suggestions:
+            self.suggestions = suggestions
+            events.append(StreamEvent("suggestions", suggestions))
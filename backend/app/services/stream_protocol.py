@@ -0,0 +1,178 @@
+import asyncio
+import json
+import time
+from typing import Any, AsyncGenerator, AsyncIterator, List, Optional, Tuple
+from app.services.stream_parser import StreamEvent, format_suggestions_marker
+
+# Wire formats for /api/chat: the original text/plain stream, or framed events
+FORMATS = ("text", "sse", "ndjson")
+
+MEDIA_TYPES = {
+    "text": "text/plain",
+    "sse": "text/event-stream",
+    "ndjson": "application/x-ndjson",
+}
+
+def negotiate_format(accept: Optional[str], requested: Optional[str] = None) -> str:
+    """
+    Pick the wire format: an explicit `stream_format` body field wins, then
+    the Accept header; anything else gets the legacy text stream.
+    """
+    if requested:
+        requested = requested.lower()
+        if requested not in FORMATS:
+            raise ValueError(f"Unsupported stream_format: {requested}")
+        return requested
+    accept = (accept or "").lower()
+    if "text/event-stream" in accept:
+        return "sse"
+    if "application/x-ndjson" in accept or "application/jsonl" in accept:
+        return "ndjson"
+    return "text"
+
+class EventEncoder:
+    """
+    Frames events as SSE or NDJSON. Every frame carries the stream's `seq`
+    (position of its last event, for resuming) and `t`, milliseconds since
+    the generation started, so clients can measure time to first token.
+
+    SSE:     id: 3\\nevent: delta\\ndata: {"seq":3,"t":812,"data":"..."}\\n\\n
+    NDJSON:  {"seq":3,"type":"delta","t":812,"data":"..."}\\n
+    """
+    def __init__(self, fmt: str, started: float = None):
+        if fmt not in ("sse", "ndjson"):
+            raise ValueError(f"Unsupported event format: {fmt}")
+        self.fmt = fmt
+        self.started = time.monotonic() if started is None else started
+
+    def frame(self, seq: int, event_type: str, data: Any = None) -> bytes:
+        elapsed_ms = int((time.monotonic() - self.started) * 1000)
+        if self.fmt == "sse":
+            body = json.dumps({"seq": seq, "t": elapsed_ms, "data": data}, ensure_ascii=False, separators=(",", ":"))
+            return f"id: {seq}\nevent: {event_type}\ndata: {body}\n\n".encode("utf-8")
+        payload = {"seq": seq, "type": event_type, "t": elapsed_ms, "data": data}
+        return (json.dumps(payload, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+
+    def heartbeat(self) -> bytes:
+        # Not numbered: keep-alives are not part of the reply
+        if self.fmt == "sse":
+            return b": ping\n\n"
+        return b'{"type":"heartbeat"}\n'
+
+_END = object()
+
+# Text events merged into one frame when they arrive close together
+PACKED_TYPES = ("delta", "reasoning")
+
+async def encode_events(
+    events: AsyncIterator[Tuple[int, StreamEvent]],
+    encoder: EventEncoder,
+    heartbeat_interval: float = 15.0,
+    pack_interval: float = 0.02,
+    pack_max_chars: int = 256,
+) -> AsyncGenerator[bytes, None]:
+    """
+    Encode (seq, event) pairs from ChatStream.follow.
+
+    The first delta goes out at once (it is the time to first token); later
+    deltas arriving within `pack_interval` of each other are merged into one
+    frame, up to `pack_max_chars`. "reasoning" events are packed the same
+    way, separately from the answer deltas. A heartbeat is sent after
+    `heartbeat_interval` seconds without output so idle proxies keep the
+    connection open while the model is thinking.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def pump():
+        try:
+            async for item in events:
+                await queue.put(item)
+        except Exception as e:
+            await queue.put((None, StreamEvent("error", str(e))))
+        finally:
+            await queue.put(_END)
+
+    producer = asyncio.create_task(pump())
+    pending: List[str] = []
+    pending_type = "delta"
+    pending_chars = 0
+    pending_since = 0.0
+    last_seq = 0
+    sent_types = set()
+
+    def flush() -> bytes:
+        nonlocal pending, pending_chars
+        if not pending:
+            return b""
+        frame = encoder.frame(last_seq, pending_type, "".join(pending))
+        pending, pending_chars = [], 0
+        return frame
+
+    try:
+        while True:
+            if pending:
+                timeout = max(0.0, pack_interval - (time.monotonic() - pending_since))
+            else:
+                timeout = heartbeat_interval
+            try:
+                item = await asyncio.wait_for(queue.get(), timeout)
+            except asyncio.TimeoutError:
+                yield flush() if pending else encoder.heartbeat()
+                continue
+
+            if item is _END:
+                break
+            seq, event = item
+            if event.type in PACKED_TYPES:
+                frames = flush() if event.type != pending_type else b""
+                if event.type not in sent_types:
+                    sent_types.add(event.type)
+                    last_seq = seq
+                    yield frames + encoder.frame(seq, event.type, event.data)
+                    continue
+                if frames:
+                    yield frames
+                if not pending:
+                    pending_since = time.monotonic()
+                    pending_type = event.type
+                last_seq = seq
+                pending.append(event.data)
+                pending_chars += len(event.data)
+                if pending_chars >= pack_max_chars:
+                    yield flush()
+                continue
+            frames = flush()
+            if seq is None:
+                # Failure while following (e.g. the resume offset expired), not a stream event
+                seq = last_seq
+            else:
+                last_seq = seq
+            yield frames + encoder.frame(seq, event.type, event.data)
+        tail = flush()
+        if tail:
+            yield tail
+    finally:
+        producer.cancel()
+
+async def encode_text(events: AsyncIterator[Tuple[int, StreamEvent]]) -> AsyncGenerator[bytes, None]:
+    """
+    Plain-text framing for existing clients: display text as it arrives,
+    errors as "[ERROR] ...", and the suggestions re-appended as one compact
+    marker at the end.
+    """
+    suggestions = None
+    try:
+        async for _, event in events:
+            if event.type == "delta":
+                yield event.data.encode('utf-8')
+            elif event.type == "suggestions":
+                suggestions = event.data
+            elif event.type == "error":
+                yield f"[ERROR] {event.data}".encode('utf-8')
+                return
+    except Exception as e:
+        # E.g. StreamExpired: the response has started, so report it in the body
+        yield f"[ERROR] {e}".encode('utf-8')
+        return
+    if suggestions:
+        yield format_suggestions_marker(suggestions).encode('utf-8')
@@ -0,0 +1,257 @@
+import asyncio
+import time
+import uuid
+from collections import deque
+from typing import AsyncIterator, Deque, Dict, Optional, Tuple
+from app.services.context_builder import estimate_tokens
+from app.services.stream_parser import StreamEvent
+from app.api.utils.metrics import metrics
+from config.settings import settings
+from app.api.utils.logger import get_logger
+
+log = get_logger("streams")
+
+CHAT_TURNS = metrics.counter("chat_turns_total", "Finished chat generations by outcome (ok, error, abandoned)", ["outcome"])
+
+class StreamExpired(Exception):
+    """
+    The requested resume offset has already left the replay buffer.
+    """
+
+class ChatStream:
+    """
+    One chat generation, decoupled from the HTTP response that started it.
+
+    A producer task appends the reply's events to a bounded replay buffer;
+    any number of responses follow the buffer from an offset. Event `seq`
+    numbers are 1-based positions in the stream and never change, so a
+    client that saw up to seq N resumes with `after=N`.
+    """
+    def __init__(self, stream_id: str, user_id: str, idempotency_key: Optional[str], max_events: int):
+        self.stream_id = stream_id
+        self.user_id = user_id
+        self.idempotency_key = idempotency_key
+        self.started = time.monotonic()
+        self.finished_at: Optional[float] = None
+        self._events: Deque[StreamEvent] = deque(maxlen=max_events)
+        self._count = 0
+        self._changed = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._on_detached = None
+        self._abandon_timer: Optional[asyncio.TimerHandle] = None
+        self.followers = 0
+        self.completion_tokens = 0 # estimated, from the deltas so far
+        self.abandoned = False
+
+    @property
+    def finished(self) -> bool:
+        return self.finished_at is not None
+
+    @property
+    def first_seq(self) -> int:
+        """
+        Lowest seq still in the replay buffer.
+        """
+        return self._count - len(self._events) + 1
+
+    def append(self, event: StreamEvent):
+        if event.type == "delta":
+            self.completion_tokens += estimate_tokens(event.data)
+        self._events.append(event)
+        self._count += 1
+        self._notify()
+
+    def _finish(self):
+        self.finished_at = time.monotonic()
+        self._notify()
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def follow(self, after: int = 0) -> AsyncIterator[Tuple[int, StreamEvent]]:
+        """
+        Yield (seq, event) for every event after `after`, live until the stream ends.
+        """
+        seq = after
+        self.followers += 1
+        if self._abandon_timer is not None:
+            # Someone came back within the grace window
+            self._abandon_timer.cancel()
+            self._abandon_timer = None
+        try:
+            while True:
+                while seq < self._count:
+                    if seq + 1 < self.first_seq:
+                        raise StreamExpired(f"events after seq {seq} are no longer buffered")
+                    seq += 1
+                    yield seq, self._events[seq - self.first_seq]
+                if self.finished:
+                    return
+                await self._changed.wait()
+        finally:
+            self.followers -= 1
+            if not self.followers and not self.finished and self._on_detached:
+                self._on_detached(self)
+
+class StreamRegistry:
+    """
+    In-process registry of chat streams, by stream id and by the client's
+    idempotency key. Finished streams stay resumable for `retention` seconds.
+    Streams live in one worker process; a resume must reach the same worker.
+
+    A generation nobody is following is cancelled after `disconnect_grace`
+    seconds: long enough to resume over a flaky connection, short enough
+    not to pay for a whole reply after the user has left.
+    """
+    def __init__(self, max_events: int = 4096, retention: float = 120.0, disconnect_grace: float = 10.0):
+        self.max_events = max_events
+        self.retention = retention
+        self.disconnect_grace = disconnect_grace
+        self._streams: Dict[str, ChatStream] = {}
+        self._by_key: Dict[Tuple[str, str], str] = {}
+        self.started = 0
+        self.resumed = 0
+        self.deduplicated = 0
+        self.abandoned = 0
+        self.tokens_saved = 0
+        # Completed replies, for estimating what an abandoned one would have cost
+        self._completed = 0
+        self._completed_tokens = 0
+
+    def create(self, user_id: str, idempotency_key: Optional[str] = None) -> ChatStream:
+        self._purge()
+        stream = ChatStream(uuid.uuid4().hex, user_id, idempotency_key, self.max_events)
+        self._streams[stream.stream_id] = stream
+        if idempotency_key:
+            self._by_key[(user_id, idempotency_key)] = stream.stream_id
+        self.started += 1
+        return stream
+
+    def get(self, stream_id: str) -> Optional[ChatStream]:
+        self._purge()
+        return self._streams.get(stream_id)
+
+    def find(self, user_id: str, idempotency_key: Optional[str]) -> Optional[ChatStream]:
+        """
+        The stream already started for this idempotency key, if any.
+        """
+        if not idempotency_key:
+            return None
+        self._purge()
+        stream_id = self._by_key.get((user_id, idempotency_key))
+        return self._streams.get(stream_id) if stream_id else None
+
+    def run(self, stream: ChatStream, events: AsyncIterator[StreamEvent]):
+        """
+        Start the producer. It keeps running for `disconnect_grace` seconds
+        after the last follower leaves (or if none ever attaches), then is
+        cancelled; the cancellation closes the upstream connection and the
+        partial reply is saved by the event source.
+        """
+        stream._on_detached = self._arm_abandon
+        stream._task = asyncio.create_task(self._produce(stream, events))
+        self._arm_abandon(stream)
+
+    def discard(self, stream: ChatStream):
+        self._remove(stream)
+
+    def _arm_abandon(self, stream: ChatStream):
+        if stream._abandon_timer is None:
+            loop = asyncio.get_running_loop()
+            stream._abandon_timer = loop.call_later(self.disconnect_grace, self._abandon, stream)
+
+    def _abandon(self, stream: ChatStream):
+        stream._abandon_timer = None
+        if stream.followers or stream.finished or stream._task is None or stream._task.done():
+            return
+        stream.abandoned = True
+        self.abandoned += 1
+        if self._completed:
+            average = self._completed_tokens / self._completed
+            self.tokens_saved += max(0, int(average) - stream.completion_tokens)
+        log.info("No client following, cancelling generation", stream_id=stream.stream_id,
+                 grace_seconds=self.disconnect_grace, completion_tokens=stream.completion_tokens)
+        stream._task.cancel()
+
+    async def _produce(self, stream: ChatStream, events: AsyncIterator[StreamEvent]):
+        ok = True
+        try:
+            async for event in events:
+                if event.type == "error":
+                    ok = False
+                elif event.type == "usage":
+                    self._completed += 1
+                    self._completed_tokens += event.data.get("completion_tokens", 0)
+                stream.append(event)
+        except asyncio.CancelledError:
+            ok = False
+            raise
+        except Exception as e:
+            log.exception("Chat generation failed", stream_id=stream.stream_id)
+            ok = False
+            stream.append(StreamEvent("error", str(e)))
+        finally:
+            if stream._abandon_timer is not None:
+                stream._abandon_timer.cancel()
+                stream._abandon_timer = None
+            done = {"ok": ok}
+            if stream.abandoned:
+                done["abandoned"] = True
+            CHAT_TURNS.inc(outcome="abandoned" if stream.abandoned else ("ok" if ok else "error"))
+            stream.append(StreamEvent("done", done))
+            stream._finish()
+
+    def _purge(self):
+        now = time.monotonic()
+        for stream in list(self._streams.values()):
+            if stream.finished and now - stream.finished_at > self.retention and not stream.followers:
+                self._remove(stream)
+
+    def _remove(self, stream: ChatStream):
+        self._streams.pop(stream.stream_id, None)
+        if stream.idempotency_key:
+            self._by_key.pop((stream.user_id, stream.idempotency_key), None)
+
+    async def stop(self):
+        """
+        Wait briefly for running generations to finish, then cancel the rest
+        so their partial replies are saved before storage shuts down.
+        """
+        tasks = [s._task for s in self._streams.values() if s._task and not s._task.done()]
+        if tasks:
+            log.info("Waiting for running generations on shutdown", running=len(tasks))
+            _, still_running = await asyncio.wait(tasks, timeout=settings.STREAM_SHUTDOWN_GRACE_SECONDS)
+            for task in still_running:
+                task.cancel()
+            if still_running:
+                await asyncio.wait(still_running)
+
+    def stats(self) -> Dict[str, int]:
+        running = sum(1 for s in self._streams.values() if not s.finished)
+        return {
+            "streams": len(self._streams),
+            "running": running,
+            "detached": sum(1 for s in self._streams.values() if not s.finished and not s.followers),
+            "started": self.started,
+            "resumed": self.resumed,
+            "deduplicated": self.deduplicated,
+            "abandoned": self.abandoned,
+            "tokens_saved_estimate": self.tokens_saved,
+        }
+
+stream_registry = StreamRegistry(
+    max_events=settings.STREAM_REPLAY_MAX_EVENTS,
+    retention=settings.STREAM_RETENTION_SECONDS,
+    disconnect_grace=settings.STREAM_DISCONNECT_GRACE_SECONDS,
+)
+
+metrics.gauge_callback(
+    "chat_streams", "Chat generations in this worker (running, detached = running with no client)",
+    lambda: {(state,): stream_registry.stats()[state] for state in ("running", "detached")},
+    ["state"],
+)
+metrics.gauge_callback(
+    "chat_tokens_saved_estimate", "Estimated completion tokens not generated thanks to abandoned-stream cancellation",
+    lambda: stream_registry.tokens_saved,
+)
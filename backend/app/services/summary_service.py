@@ -0,0 +1,94 @@
+from typing import List, Optional, Tuple
+from app.storage.async_storage import get_history, get_messages_after, get_summary, save_summary
+from app.templates.prompt_templates import PromptTemplates
+from app.api.utils.factory import get_async_llm_client
+from config.settings import settings
+from app.api.utils.logger import get_logger
+
+log = get_logger("cards")
+
+# A user's first summary only starts from this many latest messages,
+# matching how much history card generation used to read.
+BOOTSTRAP_MESSAGES = 50
+
+def format_messages(messages) -> str:
+    return "\n".join([f"{msg.role}: {msg.content}" for msg in messages])
+
+async def _fold(previous_summary: str, messages) -> Optional[str]:
+    """
+    Ask the LLM to merge `messages` into `previous_summary`. Returns None on failure.
+    """
+    prompt = (
+        PromptTemplates.SUMMARY_UPDATE_PROMPT
+        .replace("{max_chars}", str(settings.SUMMARY_MAX_CHARS))
+        .replace("{previous_summary}", previous_summary or "（暂无）")
+        .replace("{new_messages}", format_messages(messages))
+    )
+    client = get_async_llm_client()
+    response = await client.chat_completion([{"role": "user", "content": prompt}], thinking_enabled=False, cache=True)
+    if "error" in response:
+        log.error("Summary LLM error", error=response['error'])
+        return None
+    try:
+        summary = response["choices"][0]["message"]["content"].strip()
+    except (KeyError, IndexError, TypeError):
+        summary = ""
+    if not summary:
+        log.warning("Empty summary from LLM")
+        return None
+    return summary
+
+async def refresh_summary(user_id: str) -> Tuple[str, Optional[int]]:
+    """
+    Fold messages that fell out of the recent window into the user's rolling
+    summary. Only messages newer than the stored summary are sent to the LLM.
+
+    :return: (summary text, id of the newest message it covers)
+    """
+    row = await get_summary(user_id)
+    if row:
+        summary, upto = row.summary or "", row.last_message_id
+    else:
+        summary, upto = "", None
+        window = await get_history(user_id, limit=BOOTSTRAP_MESSAGES)
+        if len(window) == BOOTSTRAP_MESSAGES:
+            upto = min(msg.id for msg in window) - 1
+
+    keep = settings.SUMMARY_KEEP_RECENT
+    while True:
+        delta = await get_messages_after(user_id, upto, limit=settings.SUMMARY_FOLD_MAX + keep)
+        older = delta[:-keep] if keep else delta
+        if len(older) < settings.SUMMARY_FOLD_MIN:
+            break
+        folded = await _fold(summary, older)
+        if folded is None:
+            break
+        summary, upto = folded, older[-1].id
+        await save_summary(user_id, summary, upto)
+        log.info("Folded messages into summary", user_id=user_id, messages=len(older), upto=upto)
+
+    return summary, upto
+
+async def build_card_conversation(user_id: str) -> Optional[Tuple[str, int]]:
+    """
+    Conversation text for the card prompt: rolling summary plus the messages
+    not yet summarised. Its size stays roughly constant however long the user
+    has been talking.
+
+    :return: (conversation text, newest message id included) or None without history
+    """
+    summary, upto = await refresh_summary(user_id)
+    # Once folding has caught up, fewer messages than this are unsummarised.
+    # If it failed or is behind, only the newest ones go into the prompt.
+    limit = settings.SUMMARY_KEEP_RECENT + settings.SUMMARY_FOLD_MIN
+    recent: List = await get_messages_after(user_id, upto, limit=limit, newest=True)
+    if not recent and upto is None:
+        return None
+
+    parts = []
+    if summary:
+        parts.append(f"【此前对话摘要】\n{summary}")
+    if recent:
+        parts.append(f"【最近对话】\n{format_messages(recent)}" if summary else format_messages(recent))
+    last_message_id = recent[-1].id if recent else upto
+    return "\n\n".join(parts), last_message_id
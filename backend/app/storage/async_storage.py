@@ -0,0 +1,118 @@
+"""
+Async facade over conversation_storage.
+
+Every function has the same name and arguments as its synchronous
+counterpart but runs on a small dedicated thread pool, so SQLite commits and
+fsyncs never block the event loop. The backend is whatever
+settings.DATABASE_URL points at.
+
+Chat messages go through a write-behind queue (see write_behind.py) and
+get_history merges in the caller's not-yet-committed messages, so a user
+always reads their own writes. Recent history of active users is served
+from an in-memory write-through cache (see history_cache.py).
+"""
+import asyncio
+import functools
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+from app.storage import conversation_storage as storage
+from app.storage.write_behind import MessageWriteBehind
+from app.storage.history_cache import HistoryCache
+from app.storage.records import MessageRecord
+from app.api.utils.metrics import observe_stage
+from config.settings import settings
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=settings.DB_EXECUTOR_WORKERS, thread_name_prefix="db")
+    return _executor
+
+async def run_in_db_thread(fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    start = time.perf_counter()
+    try:
+        return await loop.run_in_executor(_get_executor(), functools.partial(fn, *args, **kwargs))
+    finally:
+        # Includes the wait for a free DB thread, which is what callers feel
+        observe_stage("db_write" if getattr(fn, "__name__", "").startswith(("save", "init", "acquire", "release")) else "db_read", time.perf_counter() - start)
+
+history_cache = HistoryCache(
+    max_bytes=settings.HISTORY_CACHE_MAX_MB * 1024 * 1024,
+    max_messages_per_user=settings.HISTORY_CACHE_MESSAGES_PER_USER,
+)
+
+message_writer = MessageWriteBehind(
+    storage.save_messages,
+    run_in_db_thread,
+    mode=settings.MESSAGE_WRITE_MODE,
+    max_batch=settings.MESSAGE_FLUSH_BATCH_SIZE,
+    flush_interval=settings.MESSAGE_FLUSH_INTERVAL_MS / 1000,
+    on_accept=history_cache.append,
+    on_drop=lambda record: history_cache.invalidate(record.user_id),
+)
+
+def shutdown_db_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+
+async def init_db():
+    return await run_in_db_thread(storage.init_db)
+
+async def save_message(user_id: str, role: str, content: str):
+    """
+    Queue a message for writing. Depending on MESSAGE_WRITE_MODE the returned
+    record may not have its `id` yet.
+    """
+    return await message_writer.save(user_id, role, content)
+
+async def get_history(user_id: str, limit: int = 10):
+    """
+    Latest `limit` messages as MessageRecords, newest first.
+    """
+    cached = history_cache.get(user_id, limit)
+    if cached is not None:
+        return cached
+
+    token = history_cache.begin_read(user_id)
+    # Snapshot before reading, so a batch committed in between is neither
+    # missed nor returned twice
+    pending = message_writer.pending_for(user_id)
+    rows = [MessageRecord.from_row(row) for row in await run_in_db_thread(storage.get_history, user_id, limit)]
+    if pending:
+        row_ids = {row.id for row in rows}
+        unseen = [record for record in pending if record.id is None or record.id not in row_ids]
+        # Newest first, like the database query
+        rows = (list(reversed(unseen)) + rows)[:limit]
+
+    history_cache.fill(user_id, rows, limit, token)
+    return rows
+
+async def get_messages_after(user_id: str, message_id: int = None, limit: int = None, newest: bool = False):
+    return await run_in_db_thread(storage.get_messages_after, user_id, message_id, limit, newest)
+
+async def count_messages_after(user_id: str, message_id: int = None) -> int:
+    return await run_in_db_thread(storage.count_messages_after, user_id, message_id)
+
+async def save_card_cache(user_id: str, card_json: str, last_message_id: int = None):
+    return await run_in_db_thread(storage.save_card_cache, user_id, card_json, last_message_id)
+
+async def get_card_cache(user_id: str):
+    return await run_in_db_thread(storage.get_card_cache, user_id)
+
+async def get_summary(user_id: str):
+    return await run_in_db_thread(storage.get_summary, user_id)
+
+async def save_summary(user_id: str, summary: str, last_message_id: int):
+    return await run_in_db_thread(storage.save_summary, user_id, summary, last_message_id)
+
+async def acquire_lease(name: str, owner: str, ttl: float) -> bool:
+    return await run_in_db_thread(storage.acquire_lease, name, owner, ttl)
+
+async def release_lease(name: str, owner: str):
+    return await run_in_db_thread(storage.release_lease, name, owner)
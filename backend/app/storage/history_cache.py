@@ -0,0 +1,143 @@
+import sys
+from collections import OrderedDict
+from typing import Dict, List, Optional
+from app.storage.records import MessageRecord
+
+# Rough fixed cost of one cached MessageRecord besides its content string
+RECORD_OVERHEAD_BYTES = 120
+
+def _record_size(record: MessageRecord) -> int:
+    return sys.getsizeof(record.content) + RECORD_OVERHEAD_BYTES
+
+class _UserHistory:
+    __slots__ = ("messages", "complete", "size")
+
+    def __init__(self, messages: List[MessageRecord], complete: bool):
+        self.messages = messages # oldest first
+        self.complete = complete # True if this is the user's entire history
+        self.size = sum(_record_size(m) for m in messages)
+
+class HistoryCache:
+    """
+    Bounded LRU of each active user's latest messages, in front of get_history.
+
+    Writes go through (`append`), so a cached user never needs a database
+    read for their recent turns. Eviction is by least recently used user,
+    until the estimated memory use is under `max_bytes`.
+
+    Reads that miss are filled back with a token from `begin_read`. If the
+    user wrote a message while that read was running, the fill is discarded
+    instead of caching a list that lacks it.
+    """
+    def __init__(self, max_bytes: int, max_messages_per_user: int, write_log_size: int = 10000):
+        self.max_bytes = max_bytes
+        self.max_messages_per_user = max_messages_per_user
+        self._users: "OrderedDict[str, _UserHistory]" = OrderedDict()
+        self._bytes = 0
+
+        # Sequence of the latest write per user, bounded; anything older than
+        # the log is assumed to have been written at `_forgotten_seq`.
+        self._seq = 0
+        self._write_log: "OrderedDict[str, int]" = OrderedDict()
+        self._write_log_size = write_log_size
+        self._forgotten_seq = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.rejected_fills = 0
+
+    def get(self, user_id: str, limit: int) -> Optional[List[MessageRecord]]:
+        """
+        Latest `limit` messages, newest first (like get_history), or None on a miss.
+        """
+        entry = self._users.get(user_id)
+        if entry is None or (not entry.complete and len(entry.messages) < limit):
+            self.misses += 1
+            return None
+        self._users.move_to_end(user_id)
+        self.hits += 1
+        return entry.messages[::-1][:limit]
+
+    def begin_read(self, user_id: str) -> int:
+        return self._seq
+
+    def fill(self, user_id: str, rows, limit: int, token: int):
+        """
+        Store the result of a database read (newest first, as returned by get_history).
+        """
+        if self._last_write(user_id) > token:
+            self.rejected_fills += 1
+            return
+        records = [MessageRecord.from_row(row) for row in rows]
+        complete = len(records) < limit
+        if len(records) > self.max_messages_per_user:
+            records = records[:self.max_messages_per_user]
+            complete = False
+        records.reverse()
+
+        self._drop(user_id)
+        entry = _UserHistory(records, complete)
+        self._users[user_id] = entry
+        self._bytes += entry.size
+        self._evict()
+
+    def append(self, record: MessageRecord):
+        """
+        Write-through for a message that was just saved.
+        """
+        self._seq += 1
+        self._write_log[record.user_id] = self._seq
+        self._write_log.move_to_end(record.user_id)
+        while len(self._write_log) > self._write_log_size:
+            _, seq = self._write_log.popitem(last=False)
+            self._forgotten_seq = max(self._forgotten_seq, seq)
+
+        entry = self._users.get(record.user_id)
+        if entry is None:
+            # Not cached: the next read loads it from the database
+            return
+        entry.messages.append(record)
+        size = _record_size(record)
+        entry.size += size
+        self._bytes += size
+        if len(entry.messages) > self.max_messages_per_user:
+            oldest = entry.messages.pop(0)
+            entry.size -= _record_size(oldest)
+            self._bytes -= _record_size(oldest)
+            entry.complete = False
+        self._users.move_to_end(record.user_id)
+        self._evict()
+
+    def invalidate(self, user_id: str):
+        self._seq += 1
+        self._write_log[user_id] = self._seq
+        self._write_log.move_to_end(user_id)
+        self._drop(user_id)
+
+    def stats(self) -> Dict[str, int]:
+        lookups = self.hits + self.misses
+        return {
+            "users": len(self._users),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "rejected_fills": self.rejected_fills,
+        }
+
+    def _last_write(self, user_id: str) -> int:
+        return self._write_log.get(user_id, self._forgotten_seq)
+
+    def _drop(self, user_id: str):
+        entry = self._users.pop(user_id, None)
+        if entry is not None:
+            self._bytes -= entry.size
+
+    def _evict(self):
+        while self._bytes > self.max_bytes and self._users:
+            _, entry = self._users.popitem(last=False)
+            self._bytes -= entry.size
+            self.evictions += 1
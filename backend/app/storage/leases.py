@@ -0,0 +1,38 @@
+"""
+Coordination between server workers (python run.py --prod) through the
+shared database.
+
+A lease is a named lock with an expiry: the holder releases it when done,
+and a lease left behind by a worker that died is taken over once it
+expires. Within one process the callers still coordinate in memory (the
+card scheduler joins running generations); leases only decide between
+processes.
+"""
+import os
+import socket
+import uuid
+from app.storage.async_storage import acquire_lease, release_lease
+
+# Unique per process, also across restarts that reuse a pid
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+class Leases:
+    def __init__(self, owner: str = WORKER_ID):
+        self.owner = owner
+        self.acquired = 0
+        self.contended = 0
+
+    async def acquire(self, name: str, ttl: float) -> bool:
+        if await acquire_lease(name, self.owner, ttl):
+            self.acquired += 1
+            return True
+        self.contended += 1
+        return False
+
+    async def release(self, name: str):
+        await release_lease(name, self.owner)
+
+    def stats(self):
+        return {"owner": self.owner, "acquired": self.acquired, "contended": self.contended}
+
+leases = Leases()
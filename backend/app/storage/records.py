@@ -0,0 +1,26 @@
+import datetime
+from typing import Optional
+
+class MessageRecord:
+    """
+    Compact, session-free copy of a Conversation row. Used for everything
+    that is kept in memory (history cache, write-behind queue) instead of
+    holding on to ORM objects.
+    """
+    __slots__ = ("id", "user_id", "role", "content", "created_at")
+
+    def __init__(self, id: Optional[int], user_id: str, role: str, content: str, created_at: datetime.datetime):
+        self.id = id
+        self.user_id = user_id
+        self.role = role
+        self.content = content
+        self.created_at = created_at
+
+    @classmethod
+    def from_row(cls, row) -> "MessageRecord":
+        if isinstance(row, MessageRecord):
+            return row
+        return cls(row.id, row.user_id, row.role, row.content, row.created_at)
+
+    def __repr__(self):
+        return f"MessageRecord(id={self.id}, user_id={self.user_id!r}, role={self.role!r})"
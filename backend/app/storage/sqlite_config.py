@@ -0,0 +1,41 @@
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from config.settings import settings
+
+def sqlite_pragmas() -> dict:
+    """
+    PRAGMAs applied to every new SQLite connection.
+
+    WAL lets readers run alongside the writer, busy_timeout makes concurrent
+    writers wait for the lock instead of failing with "database is locked",
+    and a larger page cache plus mmap keep hot history pages in memory.
+    """
+    return {
+        "journal_mode": settings.SQLITE_JOURNAL_MODE,
+        "synchronous": settings.SQLITE_SYNCHRONOUS,
+        # Negative cache_size is in KiB rather than pages
+        "cache_size": -settings.SQLITE_CACHE_SIZE_KB,
+        "mmap_size": settings.SQLITE_MMAP_SIZE,
+        "busy_timeout": settings.SQLITE_BUSY_TIMEOUT_MS,
+        "temp_store": "MEMORY",
+        "foreign_keys": "ON",
+    }
+
+def configure_sqlite(engine: Engine):
+    """
+    Register a connect hook that applies `sqlite_pragmas()` on `engine`.
+    No-op for non-SQLite engines.
+    """
+    if engine.dialect.name != "sqlite":
+        return
+
+    pragmas = sqlite_pragmas()
+
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
@@ -0,0 +1,218 @@
+import asyncio
+import datetime
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional
+from app.storage.records import MessageRecord
+from app.api.utils.logger import get_logger
+
+log = get_logger("storage")
+
+MODES = ("sync", "batched", "async")
+
+class PendingMessage(MessageRecord):
+    """
+    A chat message accepted for writing. `id` is filled in once the batch
+    containing it has been committed.
+    """
+    __slots__ = ("attempts", "future")
+
+    def __init__(self, user_id: str, role: str, content: str):
+        # Naive UTC, like Conversation.created_at
+        now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+        super().__init__(None, user_id, role, content, now)
+        self.attempts = 0
+        self.future: Optional[asyncio.Future] = None
+
+class MessageWriteBehind:
+    """
+    Queues message inserts and commits them in batches, either when
+    `max_batch` messages are waiting or `flush_interval` seconds after the
+    first one arrived.
+
+    Durability modes:
+    - "sync":    every save is its own transaction (the old behaviour).
+    - "batched": save waits until its batch is committed (group commit).
+                 Durable on return, one fsync shared by many messages.
+    - "async":   save returns at once, the batch is committed shortly after.
+                 Up to `flush_interval` of messages can be lost on a crash.
+    """
+    def __init__(
+        self,
+        write_batch: Callable[[List[PendingMessage]], List[int]],
+        run_blocking: Callable[..., Awaitable],
+        mode: str = "batched",
+        max_batch: int = 64,
+        flush_interval: float = 0.02,
+        max_attempts: int = 3,
+        on_accept: Callable[[PendingMessage], None] = None,
+        on_drop: Callable[[PendingMessage], None] = None,
+    ):
+        if mode not in MODES:
+            raise ValueError(f"Unsupported message write mode: {mode}")
+        self._write_batch = write_batch
+        self._run_blocking = run_blocking
+        self.mode = mode
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_attempts = max_attempts
+        # Hooks for write-through caches: called when a message is accepted,
+        # and when it is given up on after failing to commit
+        self._on_accept = on_accept
+        self._on_drop = on_drop
+
+        self._queue: Deque[PendingMessage] = deque()
+        self._pending_by_user: Dict[str, List[PendingMessage]] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._flusher: Optional[asyncio.Task] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._stopping = False
+
+        self.batches = 0
+        self.written = 0
+        self.failed = 0
+
+    async def save(self, user_id: str, role: str, content: str) -> PendingMessage:
+        record = PendingMessage(user_id, role, content)
+        if self._on_accept:
+            self._on_accept(record)
+        if self.mode == "sync":
+            try:
+                await self._commit([record])
+            except Exception:
+                self.failed += 1
+                if self._on_drop:
+                    self._on_drop(record)
+                raise
+            return record
+
+        self._ensure_started()
+        if self.mode == "batched":
+            record.future = asyncio.get_running_loop().create_future()
+        self._queue.append(record)
+        self._pending_by_user.setdefault(user_id, []).append(record)
+        if len(self._queue) >= self.max_batch or len(self._queue) == 1:
+            self._wakeup.set()
+
+        if record.future is not None:
+            await record.future
+        return record
+
+    def pending_for(self, user_id: str) -> List[PendingMessage]:
+        """
+        Messages of this user that are not committed yet, oldest first.
+        """
+        return list(self._pending_by_user.get(user_id, ()))
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "queued": len(self._queue),
+            "batches": self.batches,
+            "written": self.written,
+            "failed": self.failed,
+        }
+
+    async def flush(self):
+        """
+        Commit everything queued so far.
+        """
+        while self._queue:
+            await self._flush_once()
+
+    async def start(self):
+        if self.mode != "sync":
+            self._ensure_started()
+
+    async def stop(self):
+        """
+        Stop the background flusher and commit whatever is still queued.
+
+        The flusher is asked to finish rather than cancelled: a cancel landing
+        while a batch is being committed in the DB thread would leave that
+        batch written but its records pending and their savers waiting.
+        """
+        if self._flusher:
+            self._stopping = True
+            self._wakeup.set()
+            try:
+                await self._flusher
+            finally:
+                self._flusher = None
+                self._stopping = False
+        if self._queue:
+            log.info("Flushing queued messages on shutdown", queued=len(self._queue))
+        while self._queue:
+            try:
+                await self.flush()
+            except Exception:
+                # Failing records are dropped after max_attempts, so this ends
+                log.exception("Shutdown flush failed")
+
+    def _ensure_started(self):
+        if self._flusher is None or self._flusher.done():
+            self._wakeup = asyncio.Event()
+            self._flush_lock = asyncio.Lock()
+            self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def _flush_loop(self):
+        while not self._stopping:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            if len(self._queue) < self.max_batch and not self._stopping:
+                # Give concurrent writers a moment to join this batch
+                await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception:
+                log.exception("Message flush failed")
+                if not self._stopping:
+                    await asyncio.sleep(self.flush_interval)
+                self._wakeup.set()
+
+    async def _flush_once(self):
+        async with self._flush_lock:
+            batch = []
+            while self._queue and len(batch) < self.max_batch:
+                batch.append(self._queue.popleft())
+            if not batch:
+                return
+            try:
+                await self._commit(batch)
+            except Exception as e:
+                retry = []
+                for record in batch:
+                    record.attempts += 1
+                    if record.attempts < self.max_attempts:
+                        retry.append(record)
+                    else:
+                        self.failed += 1
+                        self._forget(record)
+                        if self._on_drop:
+                            self._on_drop(record)
+                        if record.future is not None and not record.future.done():
+                            record.future.set_exception(e)
+                        log.error("Dropping message after repeated write failures", user_id=record.user_id, attempts=record.attempts, error=str(e))
+                # Back to the front, keeping order
+                self._queue.extendleft(reversed(retry))
+                raise
+            for record in batch:
+                self._forget(record)
+                if record.future is not None and not record.future.done():
+                    record.future.set_result(record.id)
+
+    async def _commit(self, batch: List[PendingMessage]):
+        ids = await self._run_blocking(self._write_batch, batch)
+        for record, new_id in zip(batch, ids):
+            record.id = new_id
+        self.batches += 1
+        self.written += len(batch)
+
+    def _forget(self, record: PendingMessage):
+        pending = self._pending_by_user.get(record.user_id)
+        if pending is None:
+            return
+        try:
+            pending.remove(record)
+        except ValueError:
+            pass
+        if not pending:
+            del self._pending_by_user[record.user_id]
@@ -81,4 +81,22 @@ class PromptTemplates:
 
 对话内容（按时间顺序）：
 {conversation_content}
+"""
+
+    SUMMARY_UPDATE_PROMPT = """你是一位“Mood Lab”的记录员，负责维护一份用户对话的滚动摘要，供之后生成“反焦虑卡片”使用。
+
+请把【新增对话】合并进【已有摘要】，输出一份更新后的完整摘要。
+
+要求：
+1. 保留用户的核心烦恼、情绪变化、触发事件、自我评价和已经尝试过的应对方式。
+2. 保留对话中给出过的关键建议，以及用户对这些建议的反应。
+3. 去掉寒暄、重复内容和“建议回复”选项。
+4. 使用第三人称客观陈述，按时间顺序组织，总长度不超过{max_chars}字。
+5. 只输出摘要正文，不要输出标题、解释或Markdown。
+
+【已有摘要】
+{previous_summary}
+
+【新增对话】
+{new_messages}
 """
@@ -0,0 +1,108 @@
+"""
+Knowledge retrieval benchmark: keyword vs semantic vs hybrid search latency.
+
+Usage (from backend/):
+    python -m benchmarks.bench_knowledge --entries 20000
+
+Grows the shipped knowledge base to --entries synthetic entries (sentences
+of the real entries recombined under new titles), builds the keyword index
+and the vector file in a temporary directory, then times
+PsychologyKnowledge.search_entries in each mode. Semantic and hybrid modes
+need numpy.
+"""
+import argparse
+import os
+import random
+import re
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+QUERIES = [
+    "我最近压力好大，晚上睡不着",
+    "晚上睡不着怎么办",
+    "考研复习不下去了，一直拖延",
+    "和男朋友吵架了，心里很难受",
+    "什么都不想做，提不起劲",
+    "一上台发言就心跳加速",
+    "总觉得自己不够好",
+    "今天天气不错",
+]
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def report(name, samples_ms):
+    print(
+        f"{name:<28} n={len(samples_ms):<6} "
+        f"p50={percentile(samples_ms, 50):7.3f}ms  "
+        f"p99={percentile(samples_ms, 99):7.3f}ms  "
+        f"mean={statistics.mean(samples_ms):7.3f}ms"
+    )
+
+def write_corpus(directory, docs, entries):
+    """
+    Shipped entries first, then synthetic ones built from their sentences.
+    """
+    sentences = [s for doc in docs for s in re.split(r"(?<=[。！？])", doc.body) if s]
+    keywords = [k for doc in docs for k in doc.keywords]
+    lines = []
+    for doc in docs:
+        lines += [f"# {doc.title}", "关键词: " + ", ".join(doc.keywords), doc.body, ""]
+    for i in range(max(0, entries - len(docs))):
+        base = random.choice(docs)
+        lines += [
+            f"# {base.title}{i}",
+            "关键词: " + ", ".join(f"{k}{i}" for k in random.sample(keywords, 3)),
+            "".join(random.sample(sentences, 3)),
+            "",
+        ]
+    with open(os.path.join(directory, "knowledge.txt"), "w", encoding="utf-8") as f:
+        f.write("\n".join(lines))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, default=20_000)
+    parser.add_argument("--rounds", type=int, default=200, help="passes over the query set")
+    parser.add_argument("--modes", default="keyword,semantic,hybrid")
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from app.api.utils.psychology_knowledge import PsychologyKnowledge
+    from app.knowledge.documents import load_documents
+    from config.settings import settings
+
+    random.seed(7)
+    workdir = tempfile.mkdtemp(prefix="bench_knowledge_")
+    try:
+        write_corpus(workdir, load_documents(settings.KNOWLEDGE_DIR), args.entries)
+        for mode in args.modes.split(","):
+            knowledge = PsychologyKnowledge(
+                knowledge_dir=workdir,
+                index_path=os.path.join(workdir, "knowledge.idx"),
+                mode=mode,
+                vectors_path=os.path.join(workdir, "knowledge.vectors.npy"),
+            )
+            if knowledge.mode != mode:
+                continue
+            t0 = time.perf_counter()
+            knowledge.load()
+            print(f"{mode}: loaded {len(knowledge.index):,} entries in {time.perf_counter() - t0:.2f}s")
+
+            samples = []
+            for _ in range(args.rounds):
+                for query in QUERIES:
+                    t = time.perf_counter()
+                    knowledge.search_entries(query)
+                    samples.append((time.perf_counter() - t) * 1000)
+            report(f"search ({mode})", samples)
+            print("  晚上睡不着怎么办 ->", [title for title, _, _ in knowledge.search_entries("晚上睡不着怎么办")])
+    finally:
+        shutil.rmtree(workdir)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Provider stream decoding benchmark: tokens/sec on one core.
+
+Usage (from backend/):
+    python -m benchmarks.bench_sse --tokens 200000
+
+Builds a synthetic DeepSeek-style stream (reasoning chunks, then answer
+chunks, then usage and [DONE]), cuts it into network-sized reads at random
+byte offsets, and times decoding it into text chunks:
+
+  lines+json     the per-line loop the clients used before: httpx's
+                 iter_lines, strip "data: ", json.loads each line
+  sse+json       app.api.utils.sse.SSEDecoder with the stdlib json module
+  sse+orjson     the same with orjson (only if it is installed)
+
+Each mode is run --repeat times; the best run is reported.
+"""
+import argparse
+import json
+import random
+import time
+
+import httpx
+
+from app.api.utils import sse
+
+WORDS = ["我", "理解", "你", "的", "感受", "，", "压力", "很大", "的时候", "可以", "先", "深呼吸", "。", "慢慢来"]
+
+def build_stream(tokens, reasoning_ratio):
+    frames = []
+    reasoning_tokens = int(tokens * reasoning_ratio)
+    for i in range(tokens):
+        field = "reasoning_content" if i < reasoning_tokens else "content"
+        chunk = {
+            "id": "chatcmpl-bench", "object": "chat.completion.chunk", "created": 1700000000, "model": "deepseek-reasoner",
+            "choices": [{"index": 0, "delta": {field: random.choice(WORDS)}, "finish_reason": None}],
+        }
+        frames.append("data: " + json.dumps(chunk, ensure_ascii=False) + "\n\n")
+    frames.append("data: " + json.dumps({
+        "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 100, "completion_tokens": tokens},
+    }) + "\n\n")
+    frames.append("data: [DONE]\n\n")
+    return "".join(frames).encode("utf-8")
+
+def split_reads(body, min_read, max_read):
+    reads = []
+    start = 0
+    while start < len(body):
+        end = start + random.randint(min_read, max_read)
+        reads.append(body[start:end])
+        start = end
+    return reads
+
+def decode_lines(reads):
+    """
+    The old client loop over httpx's line iterator.
+    """
+    count = 0
+    for line in httpx.Response(200, content=iter(reads)).iter_lines():
+        if line.startswith("data: "):
+            json_str = line[6:]
+            if json_str.strip() == "[DONE]":
+                break
+            data_obj = json.loads(json_str)
+            if "choices" in data_obj and len(data_obj["choices"]) > 0:
+                delta = data_obj["choices"][0].get("delta", {})
+                if delta.get("reasoning_content", ""):
+                    count += 1
+                if delta.get("content", ""):
+                    count += 1
+    return count
+
+def decode_sse(reads):
+    decoder = sse.SSEDecoder("bench")
+    count = 0
+    for data in httpx.Response(200, content=iter(reads)).iter_bytes():
+        for delta in decoder.feed(data):
+            if delta.reasoning:
+                count += 1
+            if delta.content:
+                count += 1
+        if decoder.done:
+            break
+    return count
+
+def run(name, fn, reads, tokens, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        count = fn(reads)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    assert count == tokens, f"{name}: decoded {count} of {tokens} chunks"
+    size_mb = sum(len(r) for r in reads) / 1e6
+    print(f"{name:<14} {tokens / best:>12,.0f} tokens/s  {size_mb / best:7.1f} MB/s  ({best * 1000:.1f}ms)")
+    return tokens / best
+
+def main():
+    parser = argparse.ArgumentParser(description="SSE stream decoding benchmark")
+    parser.add_argument("--tokens", type=int, default=200_000, help="chunks in the synthetic stream")
+    parser.add_argument("--reasoning-ratio", type=float, default=0.5, help="share of chunks that are reasoning")
+    parser.add_argument("--min-read", type=int, default=64, help="smallest network read in bytes")
+    parser.add_argument("--max-read", type=int, default=4096, help="largest network read in bytes")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    body = build_stream(args.tokens, args.reasoning_ratio)
+    reads = split_reads(body, args.min_read, args.max_read)
+    print(f"{args.tokens} chunks, {len(body) / 1e6:.1f} MB in {len(reads)} reads")
+
+    baseline = run("lines+json", decode_lines, reads, args.tokens, args.repeat)
+    loads = sse._loads
+    try:
+        sse._loads = sse._json_loads
+        rate = run("sse+json", decode_sse, reads, args.tokens, args.repeat)
+        print(f"{'':<14} {rate / baseline:.2f}x lines+json")
+        if sse.orjson is not None:
+            sse._loads = sse.orjson.loads
+            rate = run("sse+orjson", decode_sse, reads, args.tokens, args.repeat)
+            print(f"{'':<14} {rate / baseline:.2f}x lines+json")
+        else:
+            print("sse+orjson     skipped (pip install orjson)")
+    finally:
+        sse._loads = loads
+
+if __name__ == "__main__":
+    main()
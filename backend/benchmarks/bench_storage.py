@@ -0,0 +1,127 @@
+"""
+Conversation store benchmark: get_history / save_message latency on a large database.
+
+Usage (from backend/):
+    python -m benchmarks.bench_storage --rows 1000000 --users 20000
+
+Builds a throwaway SQLite database, bulk-loads it, then times the real
+storage functions with the configured PRAGMAs and indexes. Pass
+--no-composite-index to compare against the old single-column indexes, and
+--no-pragmas for the default rollback journal.
+"""
+import argparse
+import datetime
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def report(name, samples_ms):
+    print(
+        f"{name:<28} n={len(samples_ms):<6} "
+        f"p50={percentile(samples_ms, 50):7.3f}ms  "
+        f"p99={percentile(samples_ms, 99):7.3f}ms  "
+        f"mean={statistics.mean(samples_ms):7.3f}ms"
+    )
+
+def bulk_load(path, rows, users, journal_mode):
+    """
+    Fill the conversations table directly with sqlite3; going through the ORM
+    would take far longer than the benchmark itself.
+    """
+    conn = sqlite3.connect(path)
+    # journal_mode is stored in the file, so keep whatever the run is measuring
+    conn.execute(f"PRAGMA journal_mode={journal_mode}")
+    conn.execute("PRAGMA synchronous=OFF")
+    start = datetime.datetime(2025, 1, 1)
+    batch = []
+    for i in range(rows):
+        user = f"user-{random.randrange(users)}"
+        role = "user" if i % 2 == 0 else "assistant"
+        created = start + datetime.timedelta(seconds=i)
+        batch.append((user, role, "最近工作压力很大，晚上总是睡不着。" * 3, created.isoformat(sep=" ")))
+        if len(batch) == 50000:
+            conn.executemany("INSERT INTO conversations (user_id, role, content, created_at) VALUES (?, ?, ?, ?)", batch)
+            batch.clear()
+    if batch:
+        conn.executemany("INSERT INTO conversations (user_id, role, content, created_at) VALUES (?, ?, ?, ?)", batch)
+    conn.commit()
+    conn.execute("ANALYZE")
+    conn.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=20_000)
+    parser.add_argument("--reads", type=int, default=2000)
+    parser.add_argument("--writes", type=int, default=1000)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--no-composite-index", action="store_true")
+    parser.add_argument("--no-pragmas", action="store_true")
+    parser.add_argument("--keep", action="store_true", help="keep the database file")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_storage_")
+    path = os.path.join(workdir, "bench.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+    if args.no_pragmas:
+        os.environ["SQLITE_JOURNAL_MODE"] = "DELETE"
+        os.environ["SQLITE_SYNCHRONOUS"] = "FULL"
+        os.environ["SQLITE_CACHE_SIZE_KB"] = "2000"
+        os.environ["SQLITE_MMAP_SIZE"] = "0"
+
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from app.storage import conversation_storage as storage
+
+    storage.Base.metadata.create_all(bind=storage.engine)
+    if args.no_composite_index:
+        with storage.engine.begin() as conn:
+            conn.exec_driver_sql("DROP INDEX IF EXISTS ix_conversations_user_id_created_at")
+
+    print(f"Loading {args.rows:,} rows for {args.users:,} users into {path} ...")
+    t0 = time.perf_counter()
+    bulk_load(path, args.rows, args.users, os.environ.get("SQLITE_JOURNAL_MODE", "WAL"))
+    print(f"Loaded in {time.perf_counter() - t0:.1f}s")
+
+    with storage.engine.connect() as conn:
+        plan = conn.exec_driver_sql(
+            "EXPLAIN QUERY PLAN SELECT * FROM conversations WHERE user_id = 'user-1' "
+            "ORDER BY created_at DESC LIMIT 20"
+        ).fetchall()
+        print("get_history plan:", "; ".join(row[-1] for row in plan))
+
+    read_ms = []
+    for _ in range(args.reads):
+        user = f"user-{random.randrange(args.users)}"
+        t = time.perf_counter()
+        storage.get_history(user, limit=args.limit)
+        read_ms.append((time.perf_counter() - t) * 1000)
+
+    write_ms = []
+    for _ in range(args.writes):
+        user = f"user-{random.randrange(args.users)}"
+        t = time.perf_counter()
+        storage.save_message(user, "user", "今天又失眠了")
+        write_ms.append((time.perf_counter() - t) * 1000)
+
+    print()
+    report(f"get_history(limit={args.limit})", read_ms)
+    report("save_message", write_ms)
+
+    storage.engine.dispose()
+    if not args.keep:
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+        os.rmdir(workdir)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""
+Load test: many simulated users chatting and asking for cards.
+
+Usage (from backend/), with the backend pointed at benchmarks/mock_provider.py:
+    python -m benchmarks.mock_provider --port 9100 &
+    DEEPSEEK_API_URL=http://127.0.0.1:9100/chat/completions uvicorn main:app --port 8000 &
+    python -m benchmarks.load_test --base-url http://127.0.0.1:8000 --users 50 --duration 60
+
+Each user loops: send a chat message (streamed as NDJSON by default, or the
+legacy text stream with --format text), then with probability --card-ratio
+ask for a card, then wait --think-time seconds. Reports throughput, time to
+first token (first delta, and first reasoning event for reasoning models)
+and total latency percentiles per operation, and errors by kind. --json prints the summary as JSON for comparing runs.
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+import uuid
+from collections import Counter, defaultdict
+
+MESSAGES = [
+    "我最近压力好大，晚上睡不着",
+    "考研复习不下去了，一直拖延",
+    "和男朋友吵架了，心里很难受",
+    "什么都不想做，提不起劲",
+    "一上台发言就心跳加速",
+    "总觉得自己不够好",
+]
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def report(name, samples_ms):
+    if not samples_ms:
+        print(f"{name:<28} n=0")
+        return
+    print(
+        f"{name:<28} n={len(samples_ms):<6} "
+        f"p50={percentile(samples_ms, 50):8.1f}ms  "
+        f"p90={percentile(samples_ms, 90):8.1f}ms  "
+        f"p99={percentile(samples_ms, 99):8.1f}ms  "
+        f"mean={statistics.mean(samples_ms):8.1f}ms"
+    )
+
+class Results:
+    def __init__(self):
+        self.latency = defaultdict(list)  # op -> ms
+        self.ttft = defaultdict(list)     # op -> ms
+        self.ok = Counter()
+        self.errors = Counter()           # "op: kind" -> count
+        self.chars = 0
+
+    def error(self, op, kind):
+        self.errors[f"{op}: {kind}"] += 1
+
+async def chat_once(client, args, user_id, results):
+    payload = {"user_id": user_id, "content": random.choice(MESSAGES), "client_msg_id": uuid.uuid4().hex}
+    if args.format != "text":
+        payload["stream_format"] = args.format
+        payload["show_reasoning"] = True
+    start = time.perf_counter()
+    first = None
+    first_reasoning = None
+    failed = None
+    buffer = ""
+    async with client.stream("POST", "/api/chat", json=payload) as response:
+        if response.status_code != 200:
+            await response.aread()
+            results.error("chat", f"HTTP {response.status_code}")
+            return
+        async for text in response.aiter_text():
+            if args.format == "text":
+                if first is None and text:
+                    first = time.perf_counter()
+                if "[ERROR]" in text:
+                    failed = "stream error"
+                results.chars += len(text)
+                continue
+            buffer += text
+            *lines, buffer = buffer.split("\n")
+            for line in lines:
+                if not line:
+                    continue
+                event = json.loads(line)
+                if event.get("type") == "delta":
+                    if first is None:
+                        first = time.perf_counter()
+                    results.chars += len(event["data"])
+                elif event.get("type") == "reasoning" and first_reasoning is None:
+                    first_reasoning = time.perf_counter()
+                elif event.get("type") == "error":
+                    failed = "stream error"
+    if failed or first is None:
+        results.error("chat", failed or "empty reply")
+        return
+    results.ok["chat"] += 1
+    results.ttft["chat"].append((first - start) * 1000)
+    if first_reasoning is not None:
+        results.ttft["chat (reasoning)"].append((first_reasoning - start) * 1000)
+    results.latency["chat"].append((time.perf_counter() - start) * 1000)
+
+async def card_once(client, user_id, results):
+    start = time.perf_counter()
+    response = await client.post("/api/generate_card", json={"user_id": user_id})
+    if response.status_code != 200:
+        results.error("card", f"HTTP {response.status_code}")
+        return
+    status = response.json().get("freshness", {}).get("status", "unknown")
+    results.ok["card"] += 1
+    results.latency["card"].append((time.perf_counter() - start) * 1000)
+    results.latency[f"card ({status})"].append((time.perf_counter() - start) * 1000)
+
+async def user_loop(client, args, index, deadline, results):
+    user_id = f"loadtest-{args.run_id}-{index}"
+    # Spread the ramp-up so users don't all hit the first request together
+    await asyncio.sleep(random.uniform(0, args.ramp_up))
+    done = 0
+    while time.monotonic() < deadline and (not args.requests_per_user or done < args.requests_per_user):
+        done += 1
+        try:
+            await chat_once(client, args, user_id, results)
+            if random.random() < args.card_ratio:
+                await card_once(client, user_id, results)
+        except Exception as e:
+            results.error("request", type(e).__name__)
+        if args.think_time:
+            await asyncio.sleep(random.expovariate(1 / args.think_time))
+
+async def run(args):
+    import httpx
+
+    results = Results()
+    limits = httpx.Limits(max_connections=args.users * 2, max_keepalive_connections=args.users * 2)
+    timeout = httpx.Timeout(args.timeout, connect=10.0)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=timeout) as client:
+        started = time.monotonic()
+        deadline = started + args.duration
+        await asyncio.gather(*(user_loop(client, args, i, deadline, results) for i in range(args.users)))
+        elapsed = time.monotonic() - started
+    return results, elapsed
+
+def summary(results, elapsed):
+    completed = sum(results.ok.values())
+    return {
+        "elapsed_s": round(elapsed, 2),
+        "completed": dict(results.ok),
+        "throughput_rps": round(completed / elapsed, 2) if elapsed else 0.0,
+        "chars_per_second": round(results.chars / elapsed, 1) if elapsed else 0.0,
+        "ttft_ms": {op: {p: round(percentile(s, p), 1) for p in (50, 90, 99)} for op, s in results.ttft.items() if s},
+        "latency_ms": {op: {p: round(percentile(s, p), 1) for p in (50, 90, 99)} for op, s in results.latency.items() if s},
+        "errors": dict(results.errors),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds; users finish their current turn")
+    parser.add_argument("--requests-per-user", type=int, default=0, help="stop each user after N turns (0 = until --duration)")
+    parser.add_argument("--card-ratio", type=float, default=0.2, help="share of turns followed by a card request")
+    parser.add_argument("--think-time", type=float, default=1.0, help="mean pause between turns, seconds")
+    parser.add_argument("--ramp-up", type=float, default=2.0, help="spread user start times over N seconds")
+    parser.add_argument("--format", choices=("ndjson", "text"), default="ndjson")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", action="store_true", help="print the summary as JSON")
+    args = parser.parse_args()
+    args.run_id = uuid.uuid4().hex[:6]
+
+    random.seed(args.seed)
+    results, elapsed = asyncio.run(run(args))
+
+    if args.json:
+        print(json.dumps(summary(results, elapsed), ensure_ascii=False, indent=2))
+        return
+    completed = sum(results.ok.values())
+    print(f"{args.users} users, {elapsed:.1f}s, {completed} ok, {sum(results.errors.values())} errors")
+    print(f"throughput: {completed / elapsed:.2f} req/s, {results.chars / elapsed:.0f} chars/s streamed")
+    print("-- time to first token")
+    for op, samples in sorted(results.ttft.items()):
+        report(op, samples)
+    print("-- latency")
+    for op, samples in sorted(results.latency.items()):
+        report(op, samples)
+    if results.errors:
+        print("-- errors")
+        for kind, count in results.errors.most_common():
+            print(f"{kind:<28} {count}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+"""
+Mock OpenAI-compatible LLM provider for offline load tests.
+
+Usage (from backend/):
+    python -m benchmarks.mock_provider --port 9100 --ttft 0.8 --tokens-per-second 40
+
+then start the backend against it:
+    DEEPSEEK_API_URL=http://127.0.0.1:9100/chat/completions \\
+    ZHIPU_API_URL=http://127.0.0.1:9100/chat/completions \\
+    uvicorn main:app --port 8000
+
+Streams the same `data: {...}` / `data: [DONE]` SSE lines as DeepSeek and
+Zhipu, including `reasoning_content` deltas before the answer, and ends
+each reply with a suggestions marker so the backend's parser is exercised.
+Non-streaming requests get a card JSON (for card prompts) or a short
+summary. Latency and failures are configurable:
+
+    --ttft / --ttft-jitter      delay before the first delta
+    --tokens-per-second         delta rate afterwards
+    --reply-tokens              answer length, in deltas
+    --reasoning-tokens          reasoning_content deltas before the answer
+    --error-rate                share of requests answered with HTTP 500
+    --rate-limit-rate           share of requests answered with HTTP 429
+    --max-concurrency           429 once this many requests are in flight (0 = no cap)
+
+GET /stats returns request counters.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from dataclasses import dataclass
+
+REPLY_TEXT = (
+    "听起来你最近真的很辛苦，压力一直压在心里。先给自己一点时间喘口气，"
+    "我们可以一起看看是哪些事情让你最焦虑，再一件一件拆开来处理。"
+    "睡前试试把担心的事写下来，告诉自己明天再想，也许会轻松一些。"
+)
+REASONING_TEXT = "用户表达了压力和睡眠问题，先共情，再给出一个可执行的小建议。"
+SUGGESTIONS = ["我想试试写下来", "为什么会这样？", "我现在只想休息"]
+
+CARD = {
+    "mood_tag": "压力大",
+    "encouragement": "你已经做得很好了，慢慢来",
+    "suggestions": ["睡前写下担心的事", "每天散步十分钟"],
+    "healing_quote": "允许自己偶尔停下来",
+    "professional_analysis": "用户在持续的压力下出现了睡眠困扰和自我怀疑，这是一种常见的应激反应。",
+}
+SUMMARY = "用户近期压力较大，睡眠不好，正在尝试调整作息。"
+
+def completion_reply(prompt: str) -> str:
+    """
+    Reply to a non-streaming prompt: a summary for PromptTemplates.SUMMARY_UPDATE_PROMPT,
+    card JSON for CONCISE_SYSTEM_PROMPT. The summary prompt mentions cards
+    too, so each is recognised by text only it contains.
+    """
+    if "滚动摘要" in prompt:
+        return SUMMARY
+    if "mood_tag" in prompt:
+        return json.dumps(CARD, ensure_ascii=False)
+    return SUMMARY
+
+@dataclass
+class MockConfig:
+    ttft: float = 0.5
+    ttft_jitter: float = 0.2
+    tokens_per_second: float = 40.0
+    reply_tokens: int = 60
+    reasoning_tokens: int = 0
+    error_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    max_concurrency: int = 0
+    seed: int = None
+
+def _tokens(text: str, count: int):
+    """
+    `count` deltas of 1-3 characters, cycling through `text`.
+    """
+    out, pos = [], 0
+    for _ in range(count):
+        size = random.randint(1, 3)
+        out.append((text * 2)[pos:pos + size])
+        pos = (pos + size) % len(text)
+    return out
+
+def _chunk(model: str, content: str = None, reasoning: str = None, finish: str = None) -> str:
+    delta = {}
+    if content is not None:
+        delta["content"] = content
+    if reasoning is not None:
+        delta["reasoning_content"] = reasoning
+    body = {
+        "id": "mock",
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish}],
+    }
+    return "data: " + json.dumps(body, ensure_ascii=False) + "\n\n"
+
+def create_app(config: MockConfig):
+    from fastapi import FastAPI, Request
+    from fastapi.responses import JSONResponse, StreamingResponse
+
+    app = FastAPI(title="Mock LLM provider")
+    rng = random.Random(config.seed)
+    stats = {"requests": 0, "streams": 0, "in_flight": 0, "max_in_flight": 0, "rate_limited": 0, "errors": 0, "cancelled": 0}
+
+    def admit():
+        """
+        None to serve the request, or the error response to send instead.
+        """
+        if config.max_concurrency and stats["in_flight"] >= config.max_concurrency:
+            stats["rate_limited"] += 1
+            return JSONResponse({"error": {"message": "Too many concurrent requests"}}, status_code=429, headers={"Retry-After": "1"})
+        roll = rng.random()
+        if roll < config.rate_limit_rate:
+            stats["rate_limited"] += 1
+            return JSONResponse({"error": {"message": "Rate limit reached"}}, status_code=429, headers={"Retry-After": "1"})
+        if roll < config.rate_limit_rate + config.error_rate:
+            stats["errors"] += 1
+            return JSONResponse({"error": {"message": "Injected server error"}}, status_code=500)
+        return None
+
+    async def stream(model: str):
+        stats["in_flight"] += 1
+        stats["max_in_flight"] = max(stats["max_in_flight"], stats["in_flight"])
+        interval = 1.0 / config.tokens_per_second if config.tokens_per_second > 0 else 0.0
+        try:
+            await asyncio.sleep(max(0.0, config.ttft + rng.uniform(-config.ttft_jitter, config.ttft_jitter)))
+            for i, piece in enumerate(_tokens(REASONING_TEXT, config.reasoning_tokens)):
+                if i:
+                    await asyncio.sleep(interval)
+                yield _chunk(model, reasoning=piece)
+            for i, piece in enumerate(_tokens(REPLY_TEXT, config.reply_tokens)):
+                if i or config.reasoning_tokens:
+                    await asyncio.sleep(interval)
+                yield _chunk(model, content=piece)
+            marker = "|||SUGGESTIONS=" + json.dumps(SUGGESTIONS, ensure_ascii=False) + "|||"
+            # Split so the marker crosses delta boundaries, as it does upstream
+            for piece in (marker[:5], marker[5:20], marker[20:]):
+                yield _chunk(model, content=piece)
+            yield _chunk(model, content="", finish="stop")
+            yield "data: [DONE]\n\n"
+        except asyncio.CancelledError:
+            stats["cancelled"] += 1
+            raise
+        finally:
+            stats["in_flight"] -= 1
+
+    @app.post("/chat/completions")
+    @app.post("/v1/chat/completions")
+    @app.post("/api/paas/v4/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        stats["requests"] += 1
+        model = body.get("model", "mock")
+        rejected = admit()
+        if rejected is not None:
+            return rejected
+
+        if body.get("stream"):
+            stats["streams"] += 1
+            return StreamingResponse(stream(model), media_type="text/event-stream")
+
+        stats["in_flight"] += 1
+        try:
+            await asyncio.sleep(max(0.0, config.ttft + rng.uniform(-config.ttft_jitter, config.ttft_jitter)))
+            prompt = " ".join(str(m.get("content", "")) for m in body.get("messages", []))
+            content = completion_reply(prompt)
+        finally:
+            stats["in_flight"] -= 1
+        return {
+            "id": "mock",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": len(prompt) // 2, "completion_tokens": len(content) // 2},
+        }
+
+    @app.get("/stats")
+    async def get_stats():
+        return stats
+
+    return app
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--ttft", type=float, default=MockConfig.ttft)
+    parser.add_argument("--ttft-jitter", type=float, default=MockConfig.ttft_jitter)
+    parser.add_argument("--tokens-per-second", type=float, default=MockConfig.tokens_per_second)
+    parser.add_argument("--reply-tokens", type=int, default=MockConfig.reply_tokens)
+    parser.add_argument("--reasoning-tokens", type=int, default=MockConfig.reasoning_tokens)
+    parser.add_argument("--error-rate", type=float, default=MockConfig.error_rate)
+    parser.add_argument("--rate-limit-rate", type=float, default=MockConfig.rate_limit_rate)
+    parser.add_argument("--max-concurrency", type=int, default=MockConfig.max_concurrency)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    import uvicorn
+    config = MockConfig(**{k: v for k, v in vars(args).items() if k not in ("host", "port")})
+    print(f"Mock provider on http://{args.host}:{args.port}/chat/completions ({config})")
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
@@ -3,30 +3,180 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
-MODEL_NAME = 'deepseek'
-# MODEL_NAME = 'zhipu'
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
-class ZhiPuSettings: # 'zhipu'
+# 'deepseek' or 'zhipu'
+MODEL_NAME = os.getenv("LLM_PROVIDER", 'deepseek')
+
+class CommonSettings:
     PROJECT_NAME: str = "GreenBanana"
-    
+
+    # Conversation store
+    DATABASE_URL: str = os.getenv("DATABASE_URL", "sqlite:///./greenbanana.db")
+    SQLITE_JOURNAL_MODE: str = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+    SQLITE_SYNCHRONOUS: str = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")   # NORMAL is durable enough under WAL
+    SQLITE_CACHE_SIZE_KB: int = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))
+    SQLITE_MMAP_SIZE: int = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+    SQLITE_BUSY_TIMEOUT_MS: int = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+    DB_EXECUTOR_WORKERS: int = int(os.getenv("DB_EXECUTOR_WORKERS", "4"))  # threads running blocking DB calls
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "10"))                # non-SQLite backends only
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+
+    # Chat message persistence: "sync" (one transaction per message),
+    # "batched" (group commit, durable when save returns) or "async" (write-behind)
+    MESSAGE_WRITE_MODE: str = os.getenv("MESSAGE_WRITE_MODE", "batched")
+    MESSAGE_FLUSH_BATCH_SIZE: int = int(os.getenv("MESSAGE_FLUSH_BATCH_SIZE", "64"))
+    MESSAGE_FLUSH_INTERVAL_MS: float = float(os.getenv("MESSAGE_FLUSH_INTERVAL_MS", "20"))
+
+    # In-memory recent history of active users, in front of get_history
+    HISTORY_CACHE_MAX_MB: int = int(os.getenv("HISTORY_CACHE_MAX_MB", "64"))
+    HISTORY_CACHE_MESSAGES_PER_USER: int = int(os.getenv("HISTORY_CACHE_MESSAGES_PER_USER", "50"))
+
+    # Cache of non-streaming LLM responses, used by calls that pass cache=True
+    # (card generation, summaries). LLM_CACHE_DIR adds an on-disk store.
+    LLM_CACHE_ENABLED: bool = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+    LLM_CACHE_TTL_SECONDS: float = float(os.getenv("LLM_CACHE_TTL_SECONDS", "3600"))
+    LLM_CACHE_MAX_ENTRIES: int = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1024"))
+    LLM_CACHE_DIR: str = os.getenv("LLM_CACHE_DIR", "")
+
+    # Psychology knowledge base: TXT files in KNOWLEDGE_DIR, indexed into KNOWLEDGE_INDEX_PATH
+    KNOWLEDGE_DIR: str = os.getenv("KNOWLEDGE_DIR", os.path.join(BASE_DIR, "data", "knowledge"))
+    KNOWLEDGE_INDEX_PATH: str = os.getenv("KNOWLEDGE_INDEX_PATH", os.path.join(BASE_DIR, "data", "knowledge_index", "knowledge.idx"))
+    KNOWLEDGE_TOP_K: int = int(os.getenv("KNOWLEDGE_TOP_K", "3"))
+    KNOWLEDGE_MAX_CHARS: int = int(os.getenv("KNOWLEDGE_MAX_CHARS", "600"))   # budget for the system prompt
+    KNOWLEDGE_MIN_SCORE: float = float(os.getenv("KNOWLEDGE_MIN_SCORE", "6.0")) # BM25-only matches below this are dropped
+    # "keyword" (automaton + BM25), "semantic" (vector similarity) or "hybrid" (both, rank-fused).
+    # semantic/hybrid need numpy; KNOWLEDGE_EMBEDDING_MODEL additionally needs sentence-transformers,
+    # otherwise a hashed character n-gram embedder is used. That one only matches paraphrases
+    # sharing characters with an entry ("睡不着" finds "睡眠", never a bare "失眠").
+    KNOWLEDGE_SEARCH_MODE: str = os.getenv("KNOWLEDGE_SEARCH_MODE", "keyword")
+    KNOWLEDGE_EMBEDDING_MODEL: str = os.getenv("KNOWLEDGE_EMBEDDING_MODEL", "")
+    KNOWLEDGE_VECTOR_DIM: int = int(os.getenv("KNOWLEDGE_VECTOR_DIM", "512"))
+    KNOWLEDGE_VECTORS_PATH: str = os.getenv("KNOWLEDGE_VECTORS_PATH", os.path.join(BASE_DIR, "data", "knowledge_index", "knowledge.vectors.npy"))
+    KNOWLEDGE_MIN_SIMILARITY: float = float(os.getenv("KNOWLEDGE_MIN_SIMILARITY", "0.15"))
+
+    # Upstream HTTP connection pool (one per provider, shared by the async clients)
+    HTTP_MAX_CONNECTIONS: int = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+    HTTP_KEEPALIVE_EXPIRY: float = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60"))
+
+    # Per-phase timeouts (seconds). READ is the max gap between two stream chunks.
+    HTTP_CONNECT_TIMEOUT: float = float(os.getenv("HTTP_CONNECT_TIMEOUT", "10"))
+    HTTP_READ_TIMEOUT: float = float(os.getenv("HTTP_READ_TIMEOUT", "60"))
+    HTTP_WRITE_TIMEOUT: float = float(os.getenv("HTTP_WRITE_TIMEOUT", "10"))
+    HTTP_POOL_TIMEOUT: float = float(os.getenv("HTTP_POOL_TIMEOUT", "10"))
+
+    # Extra "provider:model" clients registered next to the default one,
+    # e.g. "deepseek:deepseek-chat,zhipu:glm-4-flash"
+    LLM_EXTRA_MODELS: str = os.getenv("LLM_EXTRA_MODELS", "")
+
+    # Per-provider admission control (app/api/utils/rate_limiter.py): AIMD concurrency
+    # limit, optional request-rate cap (0 = none), retries with jittered backoff.
+    # Streams hold a slot only until the headers arrive; replies in progress
+    # are bounded by HTTP_MAX_CONNECTIONS.
+    LLM_CONCURRENCY_INITIAL: int = int(os.getenv("LLM_CONCURRENCY_INITIAL", "8"))
+    LLM_CONCURRENCY_MIN: int = int(os.getenv("LLM_CONCURRENCY_MIN", "1"))
+    LLM_CONCURRENCY_MAX: int = int(os.getenv("LLM_CONCURRENCY_MAX", "64"))
+    LLM_INTERACTIVE_RESERVE: int = int(os.getenv("LLM_INTERACTIVE_RESERVE", "1"))  # slots background work can't take
+    LLM_RATE_LIMIT_RPS: float = float(os.getenv("LLM_RATE_LIMIT_RPS", "0"))
+    LLM_RATE_LIMIT_BURST: int = int(os.getenv("LLM_RATE_LIMIT_BURST", "10"))
+    LLM_MAX_RETRIES: int = int(os.getenv("LLM_MAX_RETRIES", "3"))                # background calls
+    LLM_STREAM_MAX_RETRIES: int = int(os.getenv("LLM_STREAM_MAX_RETRIES", "1"))  # chat streams, before the first byte
+    LLM_RETRY_BASE_DELAY: float = float(os.getenv("LLM_RETRY_BASE_DELAY", "0.5"))
+    LLM_RETRY_MAX_DELAY: float = float(os.getenv("LLM_RETRY_MAX_DELAY", "20"))
+
+    # Provider failover: registry names in preference order, e.g. "deepseek,zhipu".
+    # Empty keeps a single provider (MODEL_NAME) with no routing.
+    LLM_FAILOVER_ORDER: str = os.getenv("LLM_FAILOVER_ORDER", "")
+    LLM_FIRST_TOKEN_TIMEOUT: float = float(os.getenv("LLM_FIRST_TOKEN_TIMEOUT", "15"))
+    LLM_THINKING_FIRST_TOKEN_TIMEOUT: float = float(os.getenv("LLM_THINKING_FIRST_TOKEN_TIMEOUT", "60"))  # reasoning precedes content
+    LLM_CIRCUIT_FAILURE_THRESHOLD: int = int(os.getenv("LLM_CIRCUIT_FAILURE_THRESHOLD", "3"))
+    LLM_CIRCUIT_COOLDOWN_SECONDS: float = float(os.getenv("LLM_CIRCUIT_COOLDOWN_SECONDS", "30"))
+    LLM_HEDGE_DELAY_SECONDS: float = float(os.getenv("LLM_HEDGE_DELAY_SECONDS", "0"))  # for hedge=True calls; 0 disables
+
+    # Background card generation queue
+    CARD_DEBOUNCE_SECONDS: float = float(os.getenv("CARD_DEBOUNCE_SECONDS", "8"))
+    CARD_MAX_CONCURRENCY: int = int(os.getenv("CARD_MAX_CONCURRENCY", "2"))
+    CARD_MAX_PENDING: int = int(os.getenv("CARD_MAX_PENDING", "1000"))
+    # Database lease held while generating, so one worker at a time works on a user's card
+    CARD_LEASE_SECONDS: float = float(os.getenv("CARD_LEASE_SECONDS", "120"))  # expiry if the holder dies; 0 disables
+    CARD_LEASE_WAIT_SECONDS: float = float(os.getenv("CARD_LEASE_WAIT_SECONDS", "30"))
+
+    # Production server (python run.py --prod)
+    SERVER_HOST: str = os.getenv("SERVER_HOST", "0.0.0.0")
+    SERVER_PORT: int = int(os.getenv("SERVER_PORT", "8000"))
+    SERVER_WORKERS: int = int(os.getenv("SERVER_WORKERS", "0"))  # 0 = one per CPU core
+    SERVER_DRAIN_SECONDS: float = float(os.getenv("SERVER_DRAIN_SECONDS", "60"))  # in-flight streams finish before shutdown
+
+    # Rolling conversation summary used to build card prompts
+    SUMMARY_KEEP_RECENT: int = int(os.getenv("SUMMARY_KEEP_RECENT", "12"))   # raw messages sent verbatim
+    SUMMARY_FOLD_MIN: int = int(os.getenv("SUMMARY_FOLD_MIN", "8"))          # fold once this many older messages pile up
+    SUMMARY_FOLD_MAX: int = int(os.getenv("SUMMARY_FOLD_MAX", "40"))         # messages folded per LLM call
+    SUMMARY_MAX_CHARS: int = int(os.getenv("SUMMARY_MAX_CHARS", "400"))
+
+    # Framed /api/chat streams (SSE / NDJSON)
+    STREAM_HEARTBEAT_SECONDS: float = float(os.getenv("STREAM_HEARTBEAT_SECONDS", "15"))
+    STREAM_PACK_INTERVAL_MS: float = float(os.getenv("STREAM_PACK_INTERVAL_MS", "20"))  # merge deltas this close together
+    STREAM_PACK_MAX_CHARS: int = int(os.getenv("STREAM_PACK_MAX_CHARS", "256"))
+    # Resumable generations (app/services/stream_registry.py)
+    STREAM_REPLAY_MAX_EVENTS: int = int(os.getenv("STREAM_REPLAY_MAX_EVENTS", "4096"))  # per stream
+    STREAM_RETENTION_SECONDS: float = float(os.getenv("STREAM_RETENTION_SECONDS", "120"))  # resumable after finishing
+    STREAM_SHUTDOWN_GRACE_SECONDS: float = float(os.getenv("STREAM_SHUTDOWN_GRACE_SECONDS", "10"))
+    STREAM_DISCONNECT_GRACE_SECONDS: float = float(os.getenv("STREAM_DISCONNECT_GRACE_SECONDS", "10"))  # then cancel upstream
+
+    # Instrumentation (app/api/utils/metrics.py)
+    METRICS_ENABLED: bool = os.getenv("METRICS_ENABLED", "true").lower() == "true"  # GET /metrics
+    METRICS_SERVER_TIMING: bool = os.getenv("METRICS_SERVER_TIMING", "false").lower() == "true"
+
+    # Logging (app/api/utils/logger.py): JSON lines on stdout, written off the event loop
+    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
+    LOG_LEVELS: str = os.getenv("LOG_LEVELS", "")  # per category, e.g. "llm=DEBUG,cards=WARNING"
+    LOG_FORMAT: str = os.getenv("LOG_FORMAT", "json")  # or "text"
+    LOG_DEBUG_SAMPLE_RATE: float = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "0.01"))  # share of large debug payloads kept
+    LOG_QUEUE_SIZE: int = int(os.getenv("LOG_QUEUE_SIZE", "10000"))  # records beyond this are dropped, never blocking
+    LOG_FRONTEND_MAX_BATCH: int = int(os.getenv("LOG_FRONTEND_MAX_BATCH", "100"))
+
+    # Reasoning models (app/services/reasoning.py). A reply still reasoning after
+    # either budget (0 = unlimited, seconds counted from the first reasoning chunk)
+    # is answered by CHAT_REASONING_FALLBACK instead: a registry name
+    # ("provider:model" entries are registered on demand). With "" only failover
+    # setups are budgeted, their other providers answering; a single client is
+    # never asked twice. deepseek-reasoner always reasons, so it needs a
+    # non-reasoning fallback.
+    CHAT_REASONING_MAX_SECONDS: float = float(os.getenv("CHAT_REASONING_MAX_SECONDS", "30"))
+    CHAT_REASONING_MAX_TOKENS: int = int(os.getenv("CHAT_REASONING_MAX_TOKENS", "0"))  # estimated
+    CHAT_REASONING_FALLBACK: str = os.getenv("CHAT_REASONING_FALLBACK", "deepseek:deepseek-chat" if MODEL_NAME == "deepseek" else "")
+
+    # Chat prompt assembly (estimated prompt tokens, see app/services/context_builder.py)
+    CHAT_HISTORY_LIMIT: int = int(os.getenv("CHAT_HISTORY_LIMIT", "20"))
+    CONTEXT_TOKEN_BUDGET_DEFAULT: int = int(os.getenv("CONTEXT_TOKEN_BUDGET", "6000"))
+    CONTEXT_TOKEN_BUDGETS: dict = {
+        "deepseek-reasoner": 6000,
+        "deepseek-chat": 6000,
+        "glm-4.7": 8000,
+    }
+    CONTEXT_MAX_TURN_TOKENS: int = int(os.getenv("CONTEXT_MAX_TURN_TOKENS", "600"))
+    CONTEXT_FULL_RECENT_TURNS: int = int(os.getenv("CONTEXT_FULL_RECENT_TURNS", "4"))
+
+class ZhiPuSettings(CommonSettings): # 'zhipu'
     # LLM Configuration
     ZHIPU_API_KEY: str = os.getenv("ZHIPU_API_KEY", "00000000000000000000000000000000")
     LLM_PROVIDER: str = "zhipu"
     LLM_MODEL: str = os.getenv("ZHIPU_MODEL", "glm-4.7")
+    LLM_MAX_TOKENS: int = int(os.getenv("ZHIPU_MAX_TOKENS", "65536"))
     
-    # API URLs
-    ZHIPU_API_URL: str = "https://open.bigmodel.cn/api/paas/v4/chat/completions"
+    # API URLs (override to point at benchmarks/mock_provider.py)
+    ZHIPU_API_URL: str = os.getenv("ZHIPU_API_URL", "https://open.bigmodel.cn/api/paas/v4/chat/completions")
 
-class DeepseekR1Settings: # 'deepseek'
-    PROJECT_NAME: str = "GreenBanana"
-    
+class DeepseekR1Settings(CommonSettings): # 'deepseek'
     # LLM Configuration
     DEEPSEEK_API_KEY: str = os.getenv("DEEPSEEK_API_KEY", "sk-00000000000000000000000000000000")
     LLM_PROVIDER: str = "deepseek"
     LLM_MODEL: str = os.getenv("DEEPSEEK_MODEL", "deepseek-reasoner")
+    LLM_MAX_TOKENS: int = int(os.getenv("DEEPSEEK_MAX_TOKENS", "8000"))
     
-    # API URLs
-    DEEPSEEK_API_URL: str = "https://api.deepseek.com/chat/completions"
+    # API URLs (override to point at benchmarks/mock_provider.py)
+    DEEPSEEK_API_URL: str = os.getenv("DEEPSEEK_API_URL", "https://api.deepseek.com/chat/completions")
 
 MODEL_SETTINGS = {
     'zhipu': ZhiPuSettings,
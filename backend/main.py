@@ -1,22 +1,62 @@
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 from app.api.views import router as api_router
-from app.storage.conversation_storage import init_db
+from app.storage.async_storage import init_db, shutdown_db_executor, message_writer
+from app.api.utils.registry import llm_registry
+from app.services.card_service import card_scheduler
+from app.api.utils.psychology_knowledge import psychology_knowledge
+from app.services.stream_registry import stream_registry
+from app.api.utils.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, RequestMetricsMiddleware, metrics
+from app.api.utils.logger import dropped_records, setup_logging
 from config.settings import settings
 import os
 
+# Before the app starts logging
+setup_logging(
+    level=settings.LOG_LEVEL,
+    levels=settings.LOG_LEVELS,
+    fmt=settings.LOG_FORMAT,
+    sample_rate=settings.LOG_DEBUG_SAMPLE_RATE,
+    queue_size=settings.LOG_QUEUE_SIZE,
+)
+
 app = FastAPI(title=settings.PROJECT_NAME)
 
+metrics.gauge_callback("log_records_dropped", "Log records dropped because the log queue was full", dropped_records)
+
+if settings.METRICS_ENABLED:
+    app.add_middleware(RequestMetricsMiddleware, server_timing=settings.METRICS_SERVER_TIMING)
+
 # Ensure static directory exists
 os.makedirs("static", exist_ok=True)
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
 @app.on_event("startup")
-def on_startup():
-    init_db()
+async def on_startup():
+    await init_db()
+    # Build (if stale) and map the knowledge index before the first request
+    psychology_knowledge.load()
+    await message_writer.start()
+    await llm_registry.startup()
+    await card_scheduler.start()
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    # Let running replies finish and be saved before their dependencies go away
+    await stream_registry.stop()
+    await card_scheduler.stop()
+    await llm_registry.shutdown()
+    await message_writer.stop()
+    shutdown_db_executor()
 
 app.include_router(api_router, prefix="/api")
 
 @app.get("/")
 def read_root():
     return {"message": "Welcome to GreenBanana API"}
+
+if settings.METRICS_ENABLED:
+    @app.get("/metrics", include_in_schema=False)
+    def read_metrics():
+        return PlainTextResponse(metrics.render(), media_type=METRICS_CONTENT_TYPE)
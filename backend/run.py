@@ -1,5 +1,68 @@
-import uvicorn
+"""
+Start the API server.
+
+    python run.py                      # development: one process, auto-reload
+    python run.py --prod               # production: SERVER_WORKERS processes (one per core by default)
+    python run.py --prod --workers 4
+
+Production mode runs the one-time startup work (database migrations, the
+knowledge index build) once in this process before the workers start, so
+workers don't race each other on it and only open what is already built.
+On SIGTERM / Ctrl+C each worker stops accepting connections and lets
+in-flight chat streams finish for up to SERVER_DRAIN_SECONDS before the
+application shuts down.
+
+Workers share the database, and card generation is coordinated through
+leases in it (app/storage/leases.py). Other state stays per worker: the
+in-memory history cache is turned off with more than one worker, since a
+user's next message may land on another worker, and resuming a chat
+stream (GET /api/chat/streams/{id}) only works on the worker that started
+it, so put a proxy with sticky sessions in front if clients resume.
+"""
+import argparse
 import os
+import uvicorn
+
+def preload():
+    """
+    One-time startup work, done before any worker imports the app.
+    """
+    from app.api.utils.logger import setup_logging
+    from config.settings import settings
+    setup_logging(level=settings.LOG_LEVEL, levels=settings.LOG_LEVELS, fmt=settings.LOG_FORMAT)
+    from app.storage.conversation_storage import init_db
+    from app.api.utils.psychology_knowledge import psychology_knowledge
+    init_db()
+    psychology_knowledge.load()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--prod", action="store_true", help="multi-worker production mode")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default SERVER_WORKERS, 0 = CPU cores)")
+    parser.add_argument("--host", default=None)
+    parser.add_argument("--port", type=int, default=None)
+    args = parser.parse_args()
+
+    if not args.prod:
+        uvicorn.run("main:app", host=args.host or "0.0.0.0", port=args.port or 8000, reload=True)
+        return
+
+    workers = args.workers if args.workers is not None else int(os.getenv("SERVER_WORKERS", "0"))
+    workers = workers or os.cpu_count() or 1
+    if workers > 1:
+        # Set before settings are imported here or in the workers, which inherit the environment
+        os.environ.setdefault("HISTORY_CACHE_MAX_MB", "0")
+
+    from config.settings import settings
+    preload()
+    uvicorn.run(
+        "main:app",
+        host=args.host or settings.SERVER_HOST,
+        port=args.port or settings.SERVER_PORT,
+        workers=workers,
+        timeout_graceful_shutdown=settings.SERVER_DRAIN_SECONDS,
+        access_log=False,  # requests are in /metrics; the access log would double log volume
+    )
 
 if __name__ == "__main__":
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
+    main()
@@ -0,0 +1,64 @@
+import inspect
+import threading
+import unittest
+from unittest import mock
+from app.storage import async_storage
+from app.storage import conversation_storage as storage
+
+# Storage functions the async facade mirrors, with the same names and arguments
+FACADE = [
+    "init_db", "save_message", "get_history", "get_messages_after", "count_messages_after",
+    "save_card_cache", "get_card_cache", "get_summary", "save_summary", "acquire_lease", "release_lease",
+]
+
+class TestRunInDbThread(unittest.IsolatedAsyncioTestCase):
+    async def test_runs_on_the_db_executor(self):
+        loop_thread = threading.current_thread()
+        thread = await async_storage.run_in_db_thread(threading.current_thread)
+        self.assertIsNot(thread, loop_thread)
+        self.assertTrue(thread.name.startswith("db"))
+
+    async def test_passes_arguments_and_errors_through(self):
+        self.assertEqual(await async_storage.run_in_db_thread(int, "17", base=8), 15)
+        with self.assertRaises(ZeroDivisionError):
+            await async_storage.run_in_db_thread(divmod, 1, 0)
+
+class TestAsyncFacade(unittest.TestCase):
+    def test_keeps_sync_names_and_arguments(self):
+        for name in FACADE:
+            with self.subTest(name=name):
+                sync_fn = getattr(storage, name)
+                async_fn = getattr(async_storage, name)
+                self.assertTrue(inspect.iscoroutinefunction(async_fn))
+                self.assertEqual(
+                    list(inspect.signature(async_fn).parameters),
+                    list(inspect.signature(sync_fn).parameters),
+                )
+
+class TestCreateStorageEngine(unittest.TestCase):
+    def setUp(self):
+        self.create_engine = mock.Mock()
+        self.configure_sqlite = mock.Mock()
+        for patch in (
+            mock.patch.object(storage, "create_engine", self.create_engine),
+            mock.patch.object(storage, "configure_sqlite", self.configure_sqlite),
+        ):
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_other_backends_skip_sqlite_setup(self):
+        engine = storage.create_storage_engine("postgresql+psycopg://user:pass@db/greenbanana")
+        self.assertIs(engine, self.create_engine.return_value)
+        self.configure_sqlite.assert_not_called()
+        args, kwargs = self.create_engine.call_args
+        self.assertEqual(args, ("postgresql+psycopg://user:pass@db/greenbanana",))
+        self.assertNotIn("connect_args", kwargs)
+        self.assertTrue(kwargs["pool_pre_ping"])
+
+    def test_sqlite_gets_its_setup(self):
+        engine = storage.create_storage_engine("sqlite:///./test.db")
+        self.configure_sqlite.assert_called_once_with(engine)
+        self.assertEqual(self.create_engine.call_args.kwargs["connect_args"], {"check_same_thread": False})
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+import asyncio
+import unittest
+from app.services.card_scheduler import CardGenerationScheduler
+
+class TestCardGenerationScheduler(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.calls = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+        async def generate(user_id):
+            self.calls.append(user_id)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            await asyncio.sleep(0.05)
+            self.in_flight -= 1
+            return {"mood_tag": "ok"}
+
+        self.scheduler = CardGenerationScheduler(generate, debounce_seconds=0.05, max_concurrency=2, max_pending=3)
+
+    async def asyncTearDown(self):
+        await self.scheduler.stop()
+
+    async def test_burst_is_coalesced(self):
+        for _ in range(10):
+            self.scheduler.schedule("u1")
+        await asyncio.sleep(0.2)
+        self.assertEqual(self.calls, ["u1"])
+        self.assertEqual(self.scheduler.stats()["coalesced"], 9)
+
+    async def test_request_during_run_is_requeued_once(self):
+        self.scheduler.schedule("u1")
+        await asyncio.sleep(0.07)
+        self.scheduler.schedule("u1")
+        self.scheduler.schedule("u1")
+        await asyncio.sleep(0.3)
+        self.assertEqual(self.calls, ["u1", "u1"])
+
+    async def test_concurrency_cap_and_drops(self):
+        for user_id in ["a", "b", "c", "d"]:
+            self.scheduler.schedule(user_id)
+        await asyncio.sleep(0.3)
+        self.assertEqual(sorted(self.calls), ["a", "b", "c"])
+        self.assertEqual(self.max_in_flight, 2)
+        self.assertEqual(self.scheduler.stats()["dropped"], 1)
+
+class FakeLeases:
+    """
+    In-memory stand-in for the database leases shared by workers.
+    """
+    def __init__(self):
+        self.holders = {}
+
+    async def acquire(self, name, ttl):
+        return self.holders.setdefault(name, id(asyncio.current_task())) == id(asyncio.current_task())
+
+    async def release(self, name):
+        self.holders.pop(name, None)
+
+class TestCardLeases(unittest.IsolatedAsyncioTestCase):
+    async def test_workers_take_turns_on_a_user(self):
+        leases = FakeLeases()
+        running = []
+        overlaps = []
+
+        async def generate(user_id):
+            overlaps.append(len(running))
+            running.append(user_id)
+            await asyncio.sleep(0.05)
+            running.remove(user_id)
+            return {"mood_tag": "ok"}
+
+        # Two schedulers sharing the lease store, as two worker processes would
+        workers = [
+            CardGenerationScheduler(generate, debounce_seconds=0, leases=leases, lease_seconds=60, lease_wait=1, lease_poll=0.01)
+            for _ in range(2)
+        ]
+        try:
+            results = await asyncio.gather(*(w.run_now("u1") for w in workers))
+        finally:
+            for w in workers:
+                await w.stop()
+        self.assertEqual(results, [{"mood_tag": "ok"}] * 2)
+        self.assertEqual(overlaps, [0, 0])
+        self.assertEqual(leases.holders, {})
+
+    async def test_gives_up_after_lease_wait(self):
+        leases = FakeLeases()
+        leases.holders["card:u1"] = "another worker"
+
+        async def generate(user_id):
+            return {"mood_tag": "ok"}
+
+        scheduler = CardGenerationScheduler(generate, leases=leases, lease_seconds=60, lease_wait=0.05, lease_poll=0.01)
+        try:
+            result = await scheduler.run_now("u1")
+        finally:
+            await scheduler.stop()
+        self.assertIn("error", result)
+        self.assertEqual(scheduler.stats()["lease_timeouts"], 1)
+        self.assertEqual(leases.holders["card:u1"], "another worker")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import asyncio
+import datetime
+import json
+import unittest
+from unittest import mock
+from app.services import card_service
+from app.services.card_scheduler import CardGenerationScheduler
+
+CARD = {"mood_tag": "压力大", "encouragement": "慢慢来"}
+
+class CacheRow:
+    def __init__(self, card_json, last_message_id):
+        self.card_json = card_json
+        self.last_message_id = last_message_id
+        self.updated_at = datetime.datetime(2024, 1, 1)
+
+class TestGetOrCreateCard(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.cache = None
+        self.newest_id = 10  # newest stored message
+        self.count_calls = []
+        self.generated = []
+
+        async def get_card_cache(user_id):
+            return self.cache
+
+        async def count_messages_after(user_id, message_id=None):
+            self.count_calls.append(message_id)
+            return self.newest_id - (message_id or 0)
+
+        async def generate(user_id):
+            self.generated.append(user_id)
+            await asyncio.sleep(0.01)
+            return {"mood_tag": "新卡片"}
+
+        self.scheduler = CardGenerationScheduler(generate, debounce_seconds=0.05)
+        for patch in (
+            mock.patch.object(card_service, "get_card_cache", get_card_cache),
+            mock.patch.object(card_service, "count_messages_after", count_messages_after),
+            mock.patch.object(card_service, "card_scheduler", self.scheduler),
+        ):
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    async def asyncTearDown(self):
+        await self.scheduler.stop()
+
+    async def test_fresh_card_is_served_without_regeneration(self):
+        self.cache = CacheRow(json.dumps(CARD), last_message_id=10)
+        card = await card_service.get_or_create_card("u1")
+        self.assertEqual(card["mood_tag"], "压力大")
+        self.assertEqual(card["freshness"]["status"], "fresh")
+        self.assertFalse(card["freshness"]["updating"])
+        await asyncio.sleep(0.1)
+        self.assertEqual(self.generated, [])
+
+    async def test_stale_card_is_served_and_refreshed_once(self):
+        self.cache = CacheRow(json.dumps(CARD), last_message_id=7)
+        card = await card_service.get_or_create_card("u1")
+        self.assertEqual(card["mood_tag"], "压力大")
+        self.assertEqual(card["freshness"]["status"], "stale")
+        self.assertEqual(card["freshness"]["messages_behind"], 3)
+        self.assertTrue(card["freshness"]["updating"])
+        # A second stale read before the refresh ran joins it
+        await card_service.get_or_create_card("u1")
+        await asyncio.sleep(0.1)
+        self.assertEqual(self.generated, ["u1"])
+
+    async def test_legacy_row_without_version_is_stale(self):
+        self.cache = CacheRow(json.dumps(CARD), last_message_id=None)
+        card = await card_service.get_or_create_card("u1")
+        self.assertEqual(self.count_calls, [None])
+        self.assertEqual(card["freshness"]["status"], "stale")
+        await asyncio.sleep(0.1)
+        self.assertEqual(self.generated, ["u1"])
+
+    async def test_missing_card_is_generated_inline(self):
+        card = await card_service.get_or_create_card("u1")
+        self.assertEqual(card["mood_tag"], "新卡片")
+        self.assertEqual(card["freshness"]["status"], "generated")
+        self.assertEqual(self.generated, ["u1"])
+
+    async def test_invalid_cached_json_is_regenerated(self):
+        self.cache = CacheRow("{not json", last_message_id=10)
+        card = await card_service.get_or_create_card("u1")
+        self.assertEqual(card["freshness"]["status"], "generated")
+        self.assertEqual(self.generated, ["u1"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+import asyncio
+import unittest
+from unittest import mock
+from app.services import chat_service
+from app.services.card_scheduler import CardGenerationScheduler
+
+class FakeStreamingClient:
+    provider = "fake"
+    model = "fake-model"
+
+    async def chat_completion_stream(self, messages, thinking_enabled=False, reasoning=False, **kwargs):
+        yield "抱抱你"
+
+class TestChatCardScheduling(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.saved = []
+        self.generated = []
+
+        async def save_message(user_id, role, content):
+            self.saved.append((user_id, role, content))
+
+        async def get_history(user_id, limit=None):
+            return []
+
+        async def generate(user_id):
+            self.generated.append(user_id)
+            return {"mood_tag": "平静"}
+
+        client = FakeStreamingClient()
+        self.scheduler = CardGenerationScheduler(generate, debounce_seconds=0.05)
+        for patch in (
+            mock.patch.object(chat_service, "save_message", save_message),
+            mock.patch.object(chat_service, "get_history", get_history),
+            mock.patch.object(chat_service, "get_async_llm_client", lambda name=None: client),
+            mock.patch.object(chat_service, "_reasoning_fallback", lambda: None),
+            mock.patch.object(chat_service.psychology_knowledge, "search", lambda content: ""),
+            mock.patch.object(chat_service, "card_scheduler", self.scheduler),
+        ):
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    async def asyncTearDown(self):
+        await self.scheduler.stop()
+
+    async def chat(self, user_id, content="最近压力好大"):
+        return [event async for event in chat_service.ChatService.chat_events(user_id, content, "standard", False)]
+
+    async def test_burst_of_messages_generates_one_card(self):
+        for _ in range(5):
+            events = await self.chat("u1")
+            self.assertNotIn("error", [event.type for event in events])
+        self.assertEqual(len(self.saved), 5)
+        self.assertEqual(self.generated, [])
+        await asyncio.sleep(0.2)
+        self.assertEqual(self.generated, ["u1"])
+        self.assertEqual(self.scheduler.stats()["coalesced"], 4)
+
+    async def test_each_user_gets_their_own_card(self):
+        for user_id in ("u1", "u2", "u1"):
+            await self.chat(user_id)
+        await asyncio.sleep(0.2)
+        self.assertEqual(sorted(self.generated), ["u1", "u2"])
+
+    async def test_failed_reply_schedules_nothing(self):
+        async def failing_stream(messages, **kwargs):
+            yield "[ERROR] upstream down"
+        with mock.patch.object(FakeStreamingClient, "chat_completion_stream", staticmethod(failing_stream)):
+            events = await self.chat("u1")
+        self.assertEqual([event.type for event in events], ["error"])
+        await asyncio.sleep(0.1)
+        self.assertEqual(self.generated, [])
+
+if __name__ == "__main__":
+    unittest.main()
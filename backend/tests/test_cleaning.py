@@ -1,9 +1,9 @@
 import unittest
-import re
+from app.services.stream_parser import strip_suggestions
 
 class TestResponseCleaning(unittest.TestCase):
     def clean_content(self, content):
-        return re.sub(r'\|\|\|SUGGESTIONS?=.*?\|\|\|', '', content, flags=re.DOTALL).strip()
+        return strip_suggestions(content)
 
     def test_clean_standard_suggestions(self):
         text = 'Hello world.\n|||SUGGESTIONS=["Option 1", "Option 2"]|||'
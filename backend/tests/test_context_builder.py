@@ -0,0 +1,39 @@
+import unittest
+from app.services.context_builder import build_chat_context, estimate_tokens, truncate_to_tokens, TRUNCATION_MARKER
+
+class TestContextBuilder(unittest.TestCase):
+    def test_estimate_tokens(self):
+        self.assertEqual(estimate_tokens(""), 0)
+        self.assertGreater(estimate_tokens("焦虑" * 100), estimate_tokens("ab" * 100))
+
+    def test_truncate_keeps_head(self):
+        text = "很长的倾诉" * 500
+        cut = truncate_to_tokens(text, 100)
+        self.assertTrue(cut.endswith(TRUNCATION_MARKER))
+        self.assertTrue(text.startswith(cut[:-len(TRUNCATION_MARKER)]))
+        self.assertLessEqual(estimate_tokens(cut), 101)
+
+    def test_everything_fits(self):
+        history = [{"role": "user", "content": "你好"}, {"role": "assistant", "content": "嗨"}]
+        ctx = build_chat_context("system", history, "最近压力好大", budget=1000)
+        self.assertEqual([m["role"] for m in ctx.messages], ["system", "user", "assistant", "user"])
+        self.assertEqual(ctx.history_dropped, 0)
+        self.assertEqual(ctx.messages[-1]["content"], "最近压力好大")
+
+    def test_drops_oldest_turns_and_uses_summary(self):
+        history = [{"role": "user", "content": f"第{i}轮" + "很长的倾诉" * 100} for i in range(10)]
+        ctx = build_chat_context("system", history, "现在", budget=1200, summary="用户工作压力大")
+        self.assertLessEqual(ctx.prompt_tokens, 1200)
+        self.assertGreater(ctx.history_dropped, 0)
+        self.assertTrue(ctx.summary_used)
+        self.assertIn("用户工作压力大", ctx.messages[0]["content"])
+        # Kept turns are the most recent ones, in order
+        self.assertTrue(ctx.messages[-2]["content"].startswith("第9轮"))
+
+    def test_oversized_current_message_is_truncated(self):
+        ctx = build_chat_context("system", [], "啊" * 20000, budget=2000)
+        self.assertTrue(ctx.messages[-1]["content"].endswith(TRUNCATION_MARKER))
+        self.assertLessEqual(ctx.prompt_tokens, 2000)
+
+if __name__ == '__main__':
+    unittest.main()
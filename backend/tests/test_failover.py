@@ -0,0 +1,106 @@
+import asyncio
+import unittest
+from app.api.utils.failover import FailoverClient, ProviderHealth
+from app.api.utils.llm_interface import AsyncLLMClient, stream_provider
+
+class FakeClient(AsyncLLMClient):
+    def __init__(self, name, chunks=("你好",), delay=0.0, error=None):
+        self.provider = name
+        self.chunks = chunks
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+
+    @property
+    def model(self):
+        return f"{self.provider}-model"
+
+    def request_payload(self, messages, thinking_enabled=False):
+        return {"model": self.model, "messages": messages}
+
+    async def _chat_completion(self, messages, thinking_enabled=False):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.error:
+            return {"error": self.error}
+        return {"choices": [{"message": {"content": self.provider}}]}
+
+    async def chat_completion_stream(self, messages, thinking_enabled=False, reasoning=False):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.error:
+            yield f"[ERROR] {self.error}"
+            return
+        for chunk in self.chunks:
+            yield chunk
+
+async def collect(stream):
+    return [chunk async for chunk in stream]
+
+MESSAGES = [{"role": "user", "content": "hi"}]
+
+class TestFailoverClient(unittest.IsolatedAsyncioTestCase):
+    async def test_stream_fails_over_on_first_token_deadline(self):
+        slow, backup = FakeClient("slow", delay=1.0), FakeClient("backup", chunks=("a", "b"))
+        router = FailoverClient([("slow", slow), ("backup", backup)], first_token_timeout=0.05)
+        self.assertEqual(await collect(router.chat_completion_stream(MESSAGES)), ["a", "b"])
+        self.assertEqual(router.stats()["failovers"], 1)
+        self.assertEqual(router.health["slow"].failures, 1)
+
+    async def test_stream_fails_over_on_error(self):
+        router = FailoverClient([("bad", FakeClient("bad", error="503")), ("good", FakeClient("good"))])
+        self.assertEqual(await collect(router.chat_completion_stream(MESSAGES)), ["你好"])
+
+    async def test_all_failing_yields_error(self):
+        router = FailoverClient([("a", FakeClient("a", error="boom")), ("b", FakeClient("b", error="boom"))])
+        chunks = await collect(router.chat_completion_stream(MESSAGES))
+        self.assertEqual(len(chunks), 1)
+        self.assertTrue(chunks[0].startswith("[ERROR]"))
+
+    async def test_circuit_breaker_skips_open_provider(self):
+        bad, good = FakeClient("bad", error="500"), FakeClient("good")
+        router = FailoverClient([("bad", bad), ("good", good)], failure_threshold=2, cooldown=60)
+        for _ in range(4):
+            response = await router.chat_completion(MESSAGES)
+            self.assertEqual(response["choices"][0]["message"]["content"], "good")
+        self.assertEqual(bad.calls, 2)
+        self.assertEqual(router.health["bad"].state, "open")
+
+    async def test_skipped_provider_is_not_a_failover(self):
+        bad, good = FakeClient("bad", error="500"), FakeClient("good")
+        router = FailoverClient([("bad", bad), ("good", good)])
+        # Half open with its one probe already in flight: listed, but not tried
+        router.health["bad"].state = "half_open"
+        router.health["bad"]._probing = True
+        response = await router.chat_completion(MESSAGES)
+        self.assertEqual(response["choices"][0]["message"]["content"], "good")
+        self.assertEqual(await collect(router.chat_completion_stream(MESSAGES)), ["你好"])
+        self.assertEqual(bad.calls, 0)
+        self.assertEqual(router.stats()["failovers"], 0)
+
+    async def test_stream_reports_serving_provider(self):
+        router = FailoverClient([("bad", FakeClient("bad", error="503")), ("good", FakeClient("good"))])
+        stream = router.chat_completion_stream(MESSAGES)
+        self.assertIsNone(stream.provider)
+        await collect(stream)
+        self.assertEqual((stream.name, stream_provider(router, stream)), ("good", "good"))
+
+    async def test_hedged_request_takes_faster_backup(self):
+        slow, fast = FakeClient("slow", delay=0.5), FakeClient("fast")
+        router = FailoverClient([("slow", slow), ("fast", fast)], hedge_delay=0.02)
+        response = await router.chat_completion(MESSAGES, hedge=True)
+        self.assertEqual(response["choices"][0]["message"]["content"], "fast")
+        self.assertEqual(router.stats()["hedge_wins"], 1)
+
+class TestProviderHealth(unittest.TestCase):
+    def test_half_open_allows_single_probe(self):
+        health = ProviderHealth("p", failure_threshold=1, cooldown=10)
+        health.record_failure("timeout")
+        self.assertFalse(health.allow(now=health.opened_at + 1))
+        self.assertTrue(health.allow(now=health.opened_at + 11))
+        self.assertFalse(health.allow(now=health.opened_at + 11))
+        health.record_success(0.5)
+        self.assertEqual(health.state, "closed")
+
+if __name__ == "__main__":
+    unittest.main()
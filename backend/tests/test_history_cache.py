@@ -0,0 +1,59 @@
+import datetime
+import unittest
+from app.storage.history_cache import HistoryCache
+from app.storage.records import MessageRecord
+
+def record(i, user_id="u", content="msg"):
+    return MessageRecord(i, user_id, "user", f"{content}{i}", datetime.datetime(2025, 1, 1) + datetime.timedelta(seconds=i))
+
+class TestHistoryCache(unittest.TestCase):
+    def test_miss_then_fill_then_hit(self):
+        cache = HistoryCache(max_bytes=10**6, max_messages_per_user=50)
+        self.assertIsNone(cache.get("u", 20))
+        token = cache.begin_read("u")
+        cache.fill("u", [record(3), record(2), record(1)], 20, token)
+        self.assertEqual([m.id for m in cache.get("u", 20)], [3, 2, 1])
+        self.assertEqual([m.id for m in cache.get("u", 2)], [3, 2])
+        self.assertEqual(cache.stats()["hits"], 2)
+
+    def test_write_through(self):
+        cache = HistoryCache(max_bytes=10**6, max_messages_per_user=50)
+        cache.fill("u", [record(1)], 20, cache.begin_read("u"))
+        cache.append(record(2))
+        self.assertEqual([m.id for m in cache.get("u", 20)], [2, 1])
+
+    def test_partial_window_misses_larger_limits(self):
+        cache = HistoryCache(max_bytes=10**6, max_messages_per_user=50)
+        rows = [record(i) for i in range(20, 0, -1)]
+        cache.fill("u", rows, 20, cache.begin_read("u"))
+        self.assertIsNotNone(cache.get("u", 20))
+        self.assertIsNone(cache.get("u", 50))
+
+    def test_fill_discarded_if_user_wrote_during_read(self):
+        cache = HistoryCache(max_bytes=10**6, max_messages_per_user=50)
+        token = cache.begin_read("u")
+        cache.append(record(2))
+        cache.fill("u", [record(1)], 20, token)
+        self.assertIsNone(cache.get("u", 20))
+        self.assertEqual(cache.stats()["rejected_fills"], 1)
+
+    def test_per_user_cap(self):
+        cache = HistoryCache(max_bytes=10**6, max_messages_per_user=3)
+        cache.fill("u", [record(1)], 20, cache.begin_read("u"))
+        for i in range(2, 6):
+            cache.append(record(i))
+        self.assertEqual([m.id for m in cache.get("u", 3)], [5, 4, 3])
+        self.assertIsNone(cache.get("u", 4))
+
+    def test_evicts_least_recently_used_user(self):
+        cache = HistoryCache(max_bytes=1500, max_messages_per_user=50)
+        for user_id in ["a", "b", "c"]:
+            cache.fill(user_id, [record(1, user_id, "x" * 500)], 20, cache.begin_read(user_id))
+            cache.get(user_id, 20)
+        self.assertIsNone(cache.get("a", 20))
+        self.assertIsNotNone(cache.get("c", 20))
+        self.assertLessEqual(cache.stats()["bytes"], 1500)
+        self.assertGreater(cache.stats()["evictions"], 0)
+
+if __name__ == '__main__':
+    unittest.main()
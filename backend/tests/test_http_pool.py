@@ -0,0 +1,66 @@
+import unittest
+from unittest import mock
+import httpx
+from app.api.utils import http_pool, zhipu_client
+from app.api.utils.registry import LLMClientRegistry
+from app.api.utils.deepseek_client import AsyncDeepSeekClient
+from app.api.utils.zhipu_client import AsyncZhipuClient
+
+MESSAGES = [{"role": "user", "content": "hi"}]
+
+class TestHttpPool(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.pools = []
+        pools = self.pools
+
+        class RecordingClient(httpx.AsyncClient):
+            def __init__(self, **kwargs):
+                super().__init__(transport=httpx.MockTransport(
+                    lambda request: httpx.Response(200, json={"choices": [{"message": {"content": "ok"}}]})
+                ), **kwargs)
+                pools.append(self)
+
+        for patch in (
+            mock.patch.object(http_pool.httpx, "AsyncClient", RecordingClient),
+            mock.patch.dict(http_pool._clients, clear=True),
+        ):
+            patch.start()
+            self.addCleanup(patch.stop)
+
+        self.registry = LLMClientRegistry()
+        self.registry.register("deepseek", AsyncDeepSeekClient())
+        self.registry.register("deepseek:deepseek-chat", AsyncDeepSeekClient(model="deepseek-chat"))
+        self.registry.register("zhipu", AsyncZhipuClient())
+
+    async def test_one_pool_per_provider_closed_at_shutdown(self):
+        for _ in range(3):
+            for name in self.registry.names():
+                response = await self.registry.get(name).chat_completion(MESSAGES)
+                self.assertEqual(response["choices"][0]["message"]["content"], "ok")
+        self.assertEqual(len(self.pools), 2)
+        self.assertEqual(sorted(http_pool._clients), ["deepseek", "zhipu"])
+        self.assertIs(http_pool.get_http_client("deepseek"), http_pool._clients["deepseek"])
+
+        await self.registry.shutdown()
+        self.assertTrue(all(pool.is_closed for pool in self.pools))
+        self.assertEqual(http_pool._clients, {})
+
+    async def test_closed_pool_is_replaced(self):
+        pool = http_pool.get_http_client("deepseek")
+        await http_pool.close_http_clients()
+        self.assertTrue(pool.is_closed)
+        self.assertIsNot(http_pool.get_http_client("deepseek"), pool)
+
+class TestZhipuErrors(unittest.IsolatedAsyncioTestCase):
+    async def test_failed_completion_is_logged(self):
+        failing = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: httpx.Response(401, json={"error": "bad key"})))
+        self.addAsyncCleanup(failing.aclose)
+        with mock.patch.dict(http_pool._clients, {"zhipu": failing}, clear=True), \
+                mock.patch.object(zhipu_client, "log") as log:
+            response = await AsyncZhipuClient().chat_completion(MESSAGES)
+        self.assertIn("401", response["error"])
+        log.error.assert_called_once()
+        self.assertEqual(log.error.call_args.kwargs["provider"], "zhipu")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+import os
+import tempfile
+import unittest
+from app.api.utils.psychology_knowledge import PsychologyKnowledge
+from app.knowledge.aho_corasick import build_automaton
+from app.knowledge.documents import KnowledgeDoc
+from app.knowledge.index import KnowledgeIndex, build_index
+
+DOCS = [
+    KnowledgeDoc("焦虑", ["焦虑", "紧张"], "焦虑是一种常见的情绪反应。"),
+    KnowledgeDoc("失眠", ["失眠"], "失眠可能由压力引起，建立规律的作息时间非常重要。"),
+    KnowledgeDoc("拖延", ["拖延"], "拖延常常和完美主义、害怕失败有关。"),
+]
+
+class TestAutomaton(unittest.TestCase):
+    def test_overlapping_matches(self):
+        automaton = build_automaton(["he", "she", "hers", "his"])
+        matches = sorted(automaton.iter_matches("ushers"))
+        self.assertEqual(matches, [(3, 0), (3, 1), (5, 2)])
+
+class TestKnowledgeIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "knowledge.idx")
+        build_index(DOCS, self.path, fingerprint="v1")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_round_trip(self):
+        index = KnowledgeIndex(self.path)
+        self.assertEqual(len(index), 3)
+        self.assertEqual(index.fingerprint, "v1")
+        self.assertEqual(index.document(1), ("失眠", DOCS[1].body))
+
+    def test_keyword_hits_rank_first(self):
+        index = KnowledgeIndex(self.path)
+        results = index.search("最近总是拖延，还很紧张", top_k=2)
+        self.assertEqual(sorted(doc_id for doc_id, _ in results), [0, 2])
+        self.assertEqual(index.search("今天天气不错", min_score=5.0), [])
+
+    def test_search_respects_char_budget(self):
+        knowledge = PsychologyKnowledge(knowledge_dir=self.tmp.name, index_path=self.path)
+        text = knowledge.search("焦虑到失眠", max_chars=40)
+        self.assertTrue(text.startswith("【"))
+        self.assertLessEqual(len(text), 40)
+
+if __name__ == "__main__":
+    unittest.main()
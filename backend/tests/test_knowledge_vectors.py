@@ -0,0 +1,41 @@
+import os
+import tempfile
+import unittest
+from app.knowledge import vectors
+
+@unittest.skipUnless(vectors.numpy_available(), "numpy not installed")
+class TestVectorIndex(unittest.TestCase):
+    # Shipped entries, unchanged: title, keywords, text
+    TEXTS = [
+        "失眠 失眠 睡眠 熬夜 失眠可能由压力、焦虑或不良睡眠习惯引起。建立规律的作息时间非常重要。",
+        "拖延 拖延 拖延症 不想动 做不下去 拖延往往不是懒，而是在回避任务带来的不适感，比如怕做不好、任务太大无从下手。",
+        "愤怒 愤怒 生气 发火 控制不住脾气 愤怒常常在提醒我们边界被触碰了。在情绪最激烈时先暂停离开现场。",
+    ]
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "knowledge.vectors.npy")
+        vectors.build_vectors(self.TEXTS, self.path, vectors.HashingEmbedder(256), fingerprint="v1")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_paraphrase_sharing_a_character_ranks_first(self):
+        index = vectors.open_vectors(self.path, vectors.HashingEmbedder(256), "v1")
+        self.assertEqual(len(index), 3)
+        # None of the insomnia entry's keywords; only the "睡" of "睡眠" in common
+        self.assertEqual(index.search("睡不着怎么办", top_k=1)[0][0], 0)
+
+    def test_batch_matches_single(self):
+        index = vectors.VectorIndex(self.path, vectors.HashingEmbedder(256))
+        queries = ["睡不着", "总想发火"]
+        batch = index.search_batch(queries, top_k=2)
+        for query, result in zip(queries, batch):
+            self.assertEqual([d for d, _ in result], [d for d, _ in index.search(query, top_k=2)])
+
+    def test_stale_or_mismatched_files_are_rejected(self):
+        self.assertIsNone(vectors.open_vectors(self.path, vectors.HashingEmbedder(256), "v2"))
+        self.assertIsNone(vectors.open_vectors(self.path, vectors.HashingEmbedder(128), "v1"))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+import io
+import json
+import logging
+import unittest
+from app.api.utils import logger as logger_module
+from app.api.utils.logger import get_logger, parse_levels, setup_logging, shutdown_logging
+
+class TestStructuredLogging(unittest.TestCase):
+    def setUp(self):
+        self.out = io.StringIO()
+        setup_logging(level="INFO", levels="testcat.quiet=ERROR", sample_rate=1.0, stream=self.out)
+
+    def tearDown(self):
+        shutdown_logging()
+        logging.getLogger("greenbanana.testcat.quiet").setLevel(logging.NOTSET)
+
+    def records(self):
+        shutdown_logging() # flushes the queue
+        return [json.loads(line) for line in self.out.getvalue().splitlines()]
+
+    def test_json_record_with_fields(self):
+        get_logger("testcat").info("Stream cancelled", stream_id="abc", tokens=12)
+        (record,) = self.records()
+        self.assertEqual(record["category"], "testcat")
+        self.assertEqual(record["level"], "info")
+        self.assertEqual(record["msg"], "Stream cancelled")
+        self.assertEqual((record["stream_id"], record["tokens"]), ("abc", 12))
+
+    def test_category_levels_and_lazy_sampling(self):
+        calls = []
+        get_logger("testcat.quiet").warning("hidden")
+        get_logger("testcat").debug("hidden too")
+        get_logger("testcat").sampled("payload", messages=lambda: calls.append(1))
+        self.assertEqual(self.records(), [])
+        self.assertEqual(calls, []) # DEBUG is off, so the payload was never built
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        shutdown_logging()
+        setup_logging(queue_size=1, stream=self.out)
+        logger_module._state["listener"].stop() # nothing drains the queue
+        logger_module._state["listener"] = None
+        for _ in range(3):
+            get_logger("testcat").info("x")
+        self.assertEqual(logger_module.dropped_records(), 2)
+
+    def test_parse_levels(self):
+        self.assertEqual(parse_levels("llm=DEBUG, chat=warning,bad=LOUD,=INFO"), {"llm": 10, "chat": 30})
+
+if __name__ == "__main__":
+    unittest.main()
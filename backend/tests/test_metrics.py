@@ -0,0 +1,40 @@
+import unittest
+from app.api.utils.metrics import MetricsRegistry, format_server_timing
+
+class TestMetrics(unittest.TestCase):
+    def test_counter_and_gauge_render(self):
+        registry = MetricsRegistry()
+        counter = registry.counter("requests_total", "Requests", ["provider", "status"])
+        counter.inc(provider="deepseek", status="429")
+        counter.inc(2, provider="deepseek", status="429")
+        registry.gauge_callback("queue", "Queue depth", lambda: 4)
+        text = registry.render()
+        self.assertIn("# TYPE greenbanana_requests_total counter", text)
+        self.assertIn('greenbanana_requests_total{provider="deepseek",status="429"} 3', text)
+        self.assertIn("greenbanana_queue 4", text)
+
+    def test_histogram_buckets_are_cumulative(self):
+        registry = MetricsRegistry()
+        histogram = registry.histogram("latency_seconds", "Latency", ["stage"], buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 0.5, 5.0):
+            histogram.observe(value, stage="db")
+        lines = registry.render().splitlines()
+        self.assertIn('greenbanana_latency_seconds_bucket{stage="db",le="0.1"} 1', lines)
+        self.assertIn('greenbanana_latency_seconds_bucket{stage="db",le="1"} 3', lines)
+        self.assertIn('greenbanana_latency_seconds_bucket{stage="db",le="+Inf"} 4', lines)
+        self.assertIn('greenbanana_latency_seconds_count{stage="db"} 4', lines)
+        self.assertIn('greenbanana_latency_seconds_sum{stage="db"} 6.05', lines)
+
+    def test_label_values_are_escaped(self):
+        registry = MetricsRegistry()
+        registry.counter("errors_total", "Errors", ["reason"]).inc(reason='bad "quote"\n')
+        self.assertIn('reason="bad \\"quote\\"\\n"', registry.render())
+
+    def test_server_timing_header(self):
+        self.assertEqual(
+            format_server_timing({"db_read": 0.0012, "retrieval": 0.0004}, 0.01),
+            "db_read;dur=1.2, retrieval;dur=0.4, total;dur=10.0",
+        )
+
+if __name__ == "__main__":
+    unittest.main()
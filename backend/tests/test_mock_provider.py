@@ -0,0 +1,65 @@
+import json
+import unittest
+import httpx
+from app.api.utils import http_pool
+from app.api.utils.deepseek_client import AsyncDeepSeekClient
+from app.services.stream_parser import SuggestionStreamParser
+from app.templates.prompt_templates import PromptTemplates
+from benchmarks.mock_provider import CARD, SUMMARY, MockConfig, create_app
+
+class TestMockProvider(unittest.IsolatedAsyncioTestCase):
+    """
+    The load-test mock must stay parseable by the real provider client.
+    """
+    def make_client(self, **config):
+        app = create_app(MockConfig(ttft=0, ttft_jitter=0, tokens_per_second=0, seed=1, **config))
+        http_pool._clients["mock"] = httpx.AsyncClient(transport=httpx.ASGITransport(app=app))
+        client = AsyncDeepSeekClient()
+        # Own pool and limiter, so the shared "deepseek" ones are untouched
+        client.provider = "mock"
+        client.config.DEEPSEEK_API_URL = "http://mock/chat/completions"
+        client.config.LLM_MAX_RETRIES = 0
+        client.config.LLM_STREAM_MAX_RETRIES = 0
+        return client
+
+    async def asyncTearDown(self):
+        await http_pool._clients.pop("mock").aclose()
+
+    async def test_stream_parses_into_reply_and_suggestions(self):
+        client = self.make_client(reply_tokens=20, reasoning_tokens=5)
+        parser = SuggestionStreamParser()
+        events = []
+        async for chunk in client.chat_completion_stream([{"role": "user", "content": "hi"}]):
+            self.assertFalse(chunk.startswith("[ERROR]"), chunk)
+            events += parser.feed(chunk)
+        events += parser.finish()
+        self.assertTrue(any(e.type == "delta" for e in events))
+        suggestions = [e.data for e in events if e.type == "suggestions"]
+        self.assertEqual(len(suggestions), 1)
+        self.assertEqual(len(suggestions[0]), 3)
+        self.assertNotIn("|||", parser.text)
+
+    async def test_each_prompt_template_gets_its_reply(self):
+        conversation = "user: 最近压力好大\nassistant: 抱抱你"
+        prompts = {
+            "card": PromptTemplates.CONCISE_SYSTEM_PROMPT.replace("{conversation_content}", conversation),
+            "summary": (
+                PromptTemplates.SUMMARY_UPDATE_PROMPT
+                .replace("{max_chars}", "800").replace("{previous_summary}", "（暂无）").replace("{new_messages}", conversation)
+            ),
+        }
+        client = self.make_client()
+        for kind, prompt in prompts.items():
+            with self.subTest(kind=kind):
+                response = await client.chat_completion([{"role": "user", "content": prompt}])
+                content = response["choices"][0]["message"]["content"]
+                if kind == "card":
+                    self.assertEqual(json.loads(content), CARD)
+                else:
+                    self.assertEqual(content, SUMMARY)
+
+    async def test_injected_rate_limit_surfaces_as_error(self):
+        client = self.make_client(rate_limit_rate=1.0)
+        chunks = [c async for c in client.chat_completion_stream([{"role": "user", "content": "hi"}])]
+        self.assertEqual(len(chunks), 1)
+        self.assertTrue(chunks[0].startswith("[ERROR] 429"))
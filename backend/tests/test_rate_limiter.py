@@ -0,0 +1,122 @@
+import asyncio
+import unittest
+import httpx
+from app.api.utils.rate_limiter import UPSTREAM_RESPONSES, AdaptiveLimiter, backoff_delay, parse_retry_after
+
+def mock_client(statuses, headers=None):
+    """
+    AsyncClient answering with `statuses` in order (the last one repeats).
+    """
+    calls = []
+
+    def handler(request):
+        status = statuses[min(len(calls), len(statuses) - 1)]
+        calls.append(status)
+        return httpx.Response(status, headers=headers or {}, json={"ok": status == 200})
+
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler)), calls
+
+class TestAdaptiveLimiter(unittest.IsolatedAsyncioTestCase):
+    async def test_interactive_lane_goes_first(self):
+        limiter = AdaptiveLimiter("p", initial_limit=1, interactive_reserve=0)
+        order = []
+        await limiter.acquire("background")
+
+        async def worker(lane, tag):
+            async with limiter.slot(lane):
+                order.append(tag)
+
+        tasks = [asyncio.create_task(worker("background", "bg"))]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(worker("interactive", "chat")))
+        await asyncio.sleep(0)
+        limiter.release()
+        await asyncio.gather(*tasks)
+        self.assertEqual(order, ["chat", "bg"])
+
+    async def test_background_keeps_reserve_free(self):
+        limiter = AdaptiveLimiter("p", initial_limit=2, interactive_reserve=1)
+        await limiter.acquire("background")
+        waiting = asyncio.create_task(limiter.acquire("background"))
+        await asyncio.sleep(0)
+        self.assertFalse(waiting.done())
+        await asyncio.wait_for(limiter.acquire("interactive"), 0.1)
+        waiting.cancel()
+
+    async def test_aimd(self):
+        limiter = AdaptiveLimiter("p", initial_limit=8, decrease_interval=10)
+        limiter.on_overload("HTTP 429")
+        limiter.on_overload("HTTP 429")  # same burst, counted once
+        self.assertEqual(limiter.limit, 4)
+        for _ in range(4):
+            limiter.on_success()
+        self.assertAlmostEqual(limiter.limit, 5, delta=0.1)
+
+    async def test_request_retries_429_then_succeeds(self):
+        client, calls = mock_client([429, 429, 200], headers={"Retry-After": "0"})
+        limiter = AdaptiveLimiter("p", retry_base_delay=0.001)
+        response = await limiter.request(lambda: client.post("https://llm.test/chat"), max_retries=3)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(calls, [429, 429, 200])
+        self.assertEqual(limiter.stats()["retries"], 2)
+        await client.aclose()
+
+    async def test_request_gives_up_after_max_retries(self):
+        client, calls = mock_client([503])
+        limiter = AdaptiveLimiter("p", retry_base_delay=0.001)
+        response = await limiter.request(lambda: client.post("https://llm.test/chat"), max_retries=2)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(limiter.in_flight, 0)
+        await client.aclose()
+
+    async def test_stream_retries_opening(self):
+        client, calls = mock_client([429, 200], headers={"Retry-After": "0"})
+        limiter = AdaptiveLimiter("p")
+        async with limiter.stream(lambda: client.stream("POST", "https://llm.test/chat"), max_retries=1) as response:
+            self.assertEqual(response.status_code, 200)
+            # The slot is only held until the headers arrive
+            self.assertEqual(limiter.in_flight, 0)
+        self.assertEqual(limiter.in_flight, 0)
+        self.assertEqual(calls, [429, 200])
+        await client.aclose()
+
+    async def test_open_stream_does_not_block_the_next_one(self):
+        client, _ = mock_client([200])
+        limiter = AdaptiveLimiter("p", initial_limit=1, max_limit=1)
+        async with limiter.stream(lambda: client.stream("POST", "https://llm.test/chat")):
+            second = limiter.stream(lambda: client.stream("POST", "https://llm.test/chat"))
+            response = await asyncio.wait_for(second.__aenter__(), timeout=1)
+            self.assertEqual(response.status_code, 200)
+            await second.__aexit__(None, None, None)
+        await client.aclose()
+
+    async def test_timeout_while_reading_body_is_counted_once(self):
+        async def body():
+            yield b"data: {}\n\n"
+            raise httpx.ReadTimeout("stalled")
+
+        client = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: httpx.Response(200, content=body())))
+        limiter = AdaptiveLimiter("p-body-timeout")
+        with self.assertRaises(httpx.ReadTimeout):
+            async with limiter.stream(lambda: client.stream("POST", "https://llm.test/chat")) as response:
+                async for _ in response.aiter_bytes():
+                    pass
+        self.assertEqual(UPSTREAM_RESPONSES.value(provider="p-body-timeout", status="200"), 1)
+        self.assertEqual(UPSTREAM_RESPONSES.value(provider="p-body-timeout", status="ReadTimeout"), 0)
+        self.assertEqual(limiter.in_flight, 0)
+        await client.aclose()
+
+class TestBackoff(unittest.TestCase):
+    def test_retry_after_wins_and_is_capped(self):
+        self.assertEqual(backoff_delay(0, 0.5, 20, retry_after=3), 3)
+        self.assertEqual(backoff_delay(0, 0.5, 20, retry_after=120), 20)
+        self.assertLessEqual(backoff_delay(10, 0.5, 20), 20)
+
+    def test_parse_retry_after(self):
+        self.assertEqual(parse_retry_after("7"), 7)
+        self.assertIsNone(parse_retry_after("soon"))
+        self.assertEqual(parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT"), 0)
+
+if __name__ == "__main__":
+    unittest.main()
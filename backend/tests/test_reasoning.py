@@ -0,0 +1,117 @@
+import asyncio
+import unittest
+from app.api.utils.llm_interface import AsyncLLMClient, Reasoning
+from app.api.utils.failover import FailoverClient
+from app.services.reasoning import ReasoningStream
+
+MESSAGES = [{"role": "user", "content": "hi"}]
+
+class FakeReasoner(AsyncLLMClient):
+    def __init__(self, model, reasoning=(), answer=(), delay=0.0, start_delay=0.0):
+        self.provider = "fake"
+        self._model = model
+        self.reasoning_chunks = reasoning
+        self.answer_chunks = answer
+        self.delay = delay
+        self.start_delay = start_delay
+        self.calls = []
+        self.closed = 0
+
+    @property
+    def model(self):
+        return self._model
+
+    def request_payload(self, messages, thinking_enabled=False):
+        return {}
+
+    async def _chat_completion(self, messages, thinking_enabled=False):
+        return {}
+
+    async def chat_completion_stream(self, messages, thinking_enabled=False, reasoning=False):
+        self.calls.append(thinking_enabled)
+        try:
+            await asyncio.sleep(self.start_delay)
+            if thinking_enabled:
+                for chunk in self.reasoning_chunks:
+                    await asyncio.sleep(self.delay)
+                    if reasoning:
+                        yield Reasoning(chunk)
+            for chunk in self.answer_chunks:
+                yield chunk
+        finally:
+            self.closed += 1
+
+async def collect(reply):
+    return [chunk async for chunk in reply]
+
+class TestReasoningStream(unittest.IsolatedAsyncioTestCase):
+    async def test_reasoning_then_answer_within_budget(self):
+        client = FakeReasoner("r1", reasoning=["想", "一想"], answer=["你好"])
+        reply = ReasoningStream(client, MESSAGES, thinking_enabled=True, max_seconds=5)
+        chunks = await collect(reply)
+        self.assertEqual(chunks, ["想", "一想", "你好"])
+        self.assertEqual([isinstance(c, Reasoning) for c in chunks], [True, True, False])
+        self.assertIsNone(reply.cut)
+        self.assertIs(reply.answered_by, client)
+        self.assertLessEqual(reply.first_reasoning_at, reply.first_answer_at)
+        self.assertGreater(reply.reasoning_tokens, 0)
+
+    async def test_time_budget_switches_to_fallback(self):
+        client = FakeReasoner("r1", reasoning=["想"] * 100, answer=["慢"], delay=0.01)
+        fallback = FakeReasoner("chat", answer=["快"])
+        reply = ReasoningStream(client, MESSAGES, thinking_enabled=True, max_seconds=0.05, fallback=fallback)
+        chunks = await collect(reply)
+        self.assertEqual(reply.cut, "seconds")
+        self.assertEqual(chunks[-1], "快")
+        self.assertNotIn("慢", chunks)
+        self.assertIs(reply.answered_by, fallback)
+        self.assertEqual(fallback.calls, [False])
+        self.assertEqual(client.closed, 1)
+
+    async def test_token_budget_switches_to_fallback(self):
+        client = FakeReasoner("glm", reasoning=["想一想"] * 10, answer=["慢"])
+        fallback = FakeReasoner("chat", answer=["好的"])
+        reply = ReasoningStream(client, MESSAGES, thinking_enabled=True, max_tokens=5, fallback=fallback)
+        chunks = await collect(reply)
+        self.assertEqual(reply.cut, "tokens")
+        self.assertEqual(chunks[-1], "好的")
+        self.assertLess(sum(isinstance(c, Reasoning) for c in chunks), 10)
+
+    async def test_without_fallback_the_same_client_is_not_asked_again(self):
+        client = FakeReasoner("glm", reasoning=["想一想"] * 10, answer=["好的"], delay=0.01)
+        reply = ReasoningStream(client, MESSAGES, thinking_enabled=True, max_seconds=0.02, max_tokens=5, fallback=None)
+        chunks = await collect(reply)
+        self.assertIsNone(reply.cut)
+        self.assertEqual(client.calls, [True])
+        self.assertEqual(chunks[-1], "好的")
+
+    async def test_slow_answer_without_reasoning_is_not_cut(self):
+        client = FakeReasoner("chat", answer=["你好"], start_delay=0.1)
+        fallback = FakeReasoner("other", answer=["别的"])
+        reply = ReasoningStream(client, MESSAGES, max_seconds=0.02, fallback=fallback)
+        self.assertEqual(await collect(reply), ["你好"])
+        self.assertIsNone(reply.cut)
+        self.assertEqual(fallback.calls, [])
+
+    async def test_budget_starts_at_first_reasoning_chunk(self):
+        client = FakeReasoner("r1", reasoning=["想"] * 3, answer=["你好"], delay=0.02, start_delay=0.15)
+        fallback = FakeReasoner("chat", answer=["快"])
+        # Reasoning takes ~0.04s after its first chunk, which arrives after 0.17s
+        reply = ReasoningStream(client, MESSAGES, thinking_enabled=True, max_seconds=0.12, fallback=fallback)
+        chunks = await collect(reply)
+        self.assertIsNone(reply.cut)
+        self.assertEqual(chunks[-1], "你好")
+
+    async def test_failover_falls_back_to_other_providers(self):
+        reasoner = FakeReasoner("r1", reasoning=["想"] * 100, answer=["慢"], delay=0.01)
+        chat = FakeReasoner("chat", answer=["快"])
+        router = FailoverClient([("r1", reasoner), ("chat", chat)])
+        reply = ReasoningStream(router, MESSAGES, thinking_enabled=True, max_seconds=0.05)
+        chunks = await collect(reply)
+        self.assertEqual(reply.cut, "seconds")
+        self.assertEqual(chunks[-1], "快")
+        self.assertEqual(reasoner.calls, [True])
+        self.assertEqual(chat.calls, [False])
+
+if __name__ == "__main__":
+    unittest.main()
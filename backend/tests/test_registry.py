@@ -0,0 +1,94 @@
+import unittest
+from unittest import mock
+from app.api.utils import registry
+from app.api.utils.llm_interface import AsyncLLMClient
+from app.api.utils.registry import LLMClientRegistry
+from config.settings import settings
+
+class FakeClient(AsyncLLMClient):
+    """
+    Records how many were built and which were closed.
+    """
+    built = []
+    closed = []
+    default_model = "default"
+
+    def __init__(self, model=None):
+        self.model = model or self.default_model
+        FakeClient.built.append(self)
+
+    def request_payload(self, messages, thinking_enabled=False):
+        return {}
+
+    async def _chat_completion(self, messages, thinking_enabled=False):
+        return {}
+
+    async def chat_completion_stream(self, messages, thinking_enabled=False, reasoning=False):
+        yield ""
+
+    async def aclose(self):
+        FakeClient.closed.append(self)
+
+class FakeDeepSeek(FakeClient):
+    provider = "deepseek"
+
+class FakeZhipu(FakeClient):
+    provider = "zhipu"
+
+class TestLLMClientRegistry(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        FakeClient.built, FakeClient.closed = [], []
+        self.close_http_clients = mock.AsyncMock()
+        for patch in (
+            mock.patch.dict(registry.CLIENT_CLASSES, {"deepseek": FakeDeepSeek, "zhipu": FakeZhipu}, clear=True),
+            mock.patch.object(registry, "MODEL_NAME", "zhipu"),
+            mock.patch.object(registry, "close_http_clients", self.close_http_clients),
+            mock.patch.object(settings, "LLM_EXTRA_MODELS", "deepseek:deepseek-chat, zhipu:glm-4-flash"),
+            mock.patch.object(settings, "LLM_FAILOVER_ORDER", ""),
+            mock.patch.object(settings, "CHAT_REASONING_FALLBACK", ""),
+        ):
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.registry = LLMClientRegistry()
+        await self.registry.startup()
+
+    async def test_startup_builds_each_client_once(self):
+        self.assertEqual(len(FakeClient.built), 4)
+        for _ in range(3):
+            for name in self.registry.names():
+                self.registry.get(name)
+        self.assertEqual(len(FakeClient.built), 4)
+
+    async def test_get_returns_the_shared_instance(self):
+        self.assertIs(self.registry.get("deepseek"), self.registry.get("deepseek"))
+        self.assertIsInstance(self.registry.get("deepseek"), FakeDeepSeek)
+
+    async def test_default_is_the_configured_provider(self):
+        self.assertEqual(self.registry.default_name, "zhipu")
+        self.assertIs(self.registry.get(), self.registry.get("zhipu"))
+        self.assertIs(self.registry.get(None), self.registry.get("zhipu"))
+
+    async def test_extra_models_are_registered_side_by_side(self):
+        self.assertEqual(
+            sorted(self.registry.names()),
+            ["deepseek", "deepseek:deepseek-chat", "zhipu", "zhipu:glm-4-flash"],
+        )
+        extra = self.registry.get("deepseek:deepseek-chat")
+        self.assertIsNot(extra, self.registry.get("deepseek"))
+        self.assertEqual((extra.provider, extra.model), ("deepseek", "deepseek-chat"))
+        self.assertEqual(self.registry.get("zhipu:glm-4-flash").model, "glm-4-flash")
+
+    async def test_unknown_name_is_rejected(self):
+        with self.assertRaises(ValueError):
+            self.registry.get("openai")
+
+    async def test_shutdown_closes_every_client(self):
+        clients = [self.registry.get(name) for name in self.registry.names()]
+        await self.registry.shutdown()
+        self.assertCountEqual(FakeClient.closed, clients)
+        self.close_http_clients.assert_awaited_once()
+        self.assertEqual(self.registry.names(), [])
+        self.assertIsNone(self.registry.default_name)
+
+if __name__ == "__main__":
+    unittest.main()
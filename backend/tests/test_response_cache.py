@@ -0,0 +1,89 @@
+import asyncio
+import tempfile
+import unittest
+from app.api.utils.response_cache import ResponseCache
+
+def completion(text, tokens=100):
+    return {"choices": [{"message": {"content": text}}], "usage": {"total_tokens": tokens}}
+
+class CountingFetch:
+    def __init__(self, response, delay=0):
+        self.response = response
+        self.delay = delay
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return self.response
+
+class TestResponseCache(unittest.IsolatedAsyncioTestCase):
+    async def test_hit_counts_saved_tokens(self):
+        cache = ResponseCache()
+        key = ResponseCache.make_key("deepseek", {"model": "m", "messages": [{"role": "user", "content": "hi"}]})
+        fetch = CountingFetch(completion("card", tokens=250))
+        first = await cache.get_or_fetch(key, fetch)
+        second = await cache.get_or_fetch(key, fetch)
+        self.assertEqual(first, second)
+        self.assertEqual(fetch.calls, 1)
+        self.assertEqual(cache.stats()["saved_tokens"], 250)
+
+    async def test_key_depends_on_payload(self):
+        a = ResponseCache.make_key("deepseek", {"model": "m", "temperature": 1.0})
+        b = ResponseCache.make_key("deepseek", {"temperature": 1.0, "model": "m"})
+        c = ResponseCache.make_key("zhipu", {"model": "m", "temperature": 1.0})
+        self.assertEqual(a, b)
+        self.assertNotEqual(a, c)
+
+    async def test_concurrent_identical_requests_share_one_call(self):
+        cache = ResponseCache()
+        fetch = CountingFetch(completion("card"), delay=0.02)
+        results = await asyncio.gather(*[cache.get_or_fetch("k", fetch) for _ in range(5)])
+        self.assertEqual(fetch.calls, 1)
+        self.assertEqual(len(results), 5)
+        self.assertEqual(cache.stats()["joined_inflight"], 4)
+
+    async def test_cancelled_leader_hands_over_to_joiners(self):
+        cache = ResponseCache()
+        fetch = CountingFetch(completion("card"), delay=0.05)
+        leader = asyncio.create_task(cache.get_or_fetch("k", fetch))
+        await asyncio.sleep(0.01)
+        joiners = [asyncio.create_task(cache.get_or_fetch("k", fetch)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        results = await asyncio.gather(*joiners)
+        self.assertTrue(leader.cancelled())
+        self.assertEqual([r["choices"][0]["message"]["content"] for r in results], ["card"] * 3)
+        # One of the joiners fetched again, the others joined it
+        self.assertEqual(fetch.calls, 2)
+
+    async def test_errors_are_not_cached(self):
+        cache = ResponseCache()
+        fetch = CountingFetch({"error": "timeout"})
+        await cache.get_or_fetch("k", fetch)
+        await cache.get_or_fetch("k", fetch)
+        self.assertEqual(fetch.calls, 2)
+
+    async def test_ttl_and_lru(self):
+        cache = ResponseCache(max_entries=2, ttl=0)
+        fetch = CountingFetch(completion("x"))
+        await cache.get_or_fetch("k", fetch)
+        await cache.get_or_fetch("k", fetch)
+        self.assertEqual(fetch.calls, 2)
+
+        cache = ResponseCache(max_entries=2)
+        for key in ("a", "b", "c"):
+            await cache.get_or_fetch(key, fetch)
+        self.assertEqual(cache.stats()["entries"], 2)
+
+    async def test_disk_store_survives_restart(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            fetch = CountingFetch(completion("card"))
+            await ResponseCache(disk_dir=tmp).get_or_fetch("k", fetch)
+            restarted = ResponseCache(disk_dir=tmp)
+            await restarted.get_or_fetch("k", fetch)
+            self.assertEqual(fetch.calls, 1)
+            self.assertEqual(restarted.stats()["disk_hits"], 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,48 @@
+import os
+import shutil
+import tempfile
+import unittest
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+from app.storage import conversation_storage as storage
+from config.settings import settings
+
+SYNCHRONOUS_LEVELS = {"OFF": 0, "NORMAL": 1, "FULL": 2, "EXTRA": 3}
+
+def pragma(connection, name):
+    return connection.execute(text(f"PRAGMA {name}")).scalar()
+
+class TestSqlitePragmas(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, True)
+        self.engine = storage.create_storage_engine(f"sqlite:///{os.path.join(self.tmp, 'test.db')}")
+        self.addCleanup(self.engine.dispose)
+
+    def assert_configured(self, connection):
+        self.assertEqual(pragma(connection, "journal_mode"), "wal")
+        self.assertEqual(pragma(connection, "busy_timeout"), settings.SQLITE_BUSY_TIMEOUT_MS)
+        self.assertEqual(pragma(connection, "synchronous"), SYNCHRONOUS_LEVELS[settings.SQLITE_SYNCHRONOUS.upper()])
+        self.assertEqual(pragma(connection, "cache_size"), -settings.SQLITE_CACHE_SIZE_KB)
+        self.assertEqual(pragma(connection, "foreign_keys"), 1)
+
+    def test_fresh_connection_is_configured(self):
+        with self.engine.connect() as connection:
+            self.assert_configured(connection)
+
+    def test_every_pooled_connection_is_configured(self):
+        # Per-connection settings must not only apply to the first one
+        with self.engine.connect() as first, self.engine.connect() as second:
+            self.assert_configured(first)
+            self.assert_configured(second)
+
+    def test_session_connection_is_configured(self):
+        storage.Base.metadata.create_all(bind=self.engine)
+        session = sessionmaker(bind=self.engine)()
+        try:
+            self.assert_configured(session.connection())
+        finally:
+            session.close()
+
+if __name__ == "__main__":
+    unittest.main()
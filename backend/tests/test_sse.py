@@ -0,0 +1,118 @@
+import json
+import unittest
+from app.api.utils import sse
+from app.api.utils.llm_interface import Reasoning
+from app.api.utils.sse import SSEDecoder, iter_chat_chunks
+
+def frame(delta=None, finish_reason=None, **extra):
+    chunk = {"choices": [{"index": 0, "delta": delta or {}, "finish_reason": finish_reason}], **extra}
+    return "data: " + json.dumps(chunk, ensure_ascii=False) + "\n\n"
+
+BODY = (
+    ": keep-alive\n\n"
+    + frame({"reasoning_content": "先想想"})
+    + frame({"content": "抱抱你，"})
+    + "event: message\nid: 3\n" + frame({"content": "辛苦了。"})
+    + frame(finish_reason="stop", usage={"completion_tokens": 7})
+    + "data: [DONE]\n\n"
+).encode("utf-8")
+
+def decode(reads):
+    decoder = SSEDecoder("test")
+    deltas = []
+    for data in reads:
+        deltas.extend(decoder.feed(data))
+    deltas.extend(decoder.finish())
+    return decoder, deltas
+
+class TestSSEDecoder(unittest.TestCase):
+    def assert_decoded(self, reads):
+        decoder, deltas = decode(reads)
+        self.assertTrue(decoder.done)
+        self.assertEqual(decoder.undecodable, 0)
+        self.assertEqual([d.reasoning for d in deltas if d.reasoning], ["先想想"])
+        self.assertEqual("".join(d.content for d in deltas if d.content), "抱抱你，辛苦了。")
+        self.assertEqual(deltas[-1].finish_reason, "stop")
+        self.assertEqual(deltas[-1].usage, {"completion_tokens": 7})
+
+    def test_whole_body(self):
+        self.assert_decoded([BODY])
+
+    def test_every_split_point(self):
+        # Including inside multi-byte characters and between the two \n of a frame end
+        for i in range(1, len(BODY)):
+            with self.subTest(split=i):
+                self.assert_decoded([BODY[:i], BODY[i:]])
+
+    def test_single_bytes(self):
+        self.assert_decoded([BODY[i:i + 1] for i in range(len(BODY))])
+
+    def test_crlf_line_endings(self):
+        body = BODY.replace(b"\n", b"\r\n")
+        for i in range(1, len(body)):
+            with self.subTest(split=i):
+                self.assert_decoded([body[:i], body[i:]])
+
+    def test_multi_line_event(self):
+        payload = json.dumps({"choices": [{"delta": {"content": "多行"}}]}, indent=1, ensure_ascii=False)
+        body = "".join(f"data: {line}\n" for line in payload.split("\n")) + "\n"
+        _, deltas = decode([body.encode("utf-8")])
+        self.assertEqual([d.content for d in deltas], ["多行"])
+
+    def test_data_lines_without_blank_lines(self):
+        body = (frame({"content": "a"}) + frame({"content": "b"})).replace("\n\n", "\n") + "\n"
+        _, deltas = decode([body.encode("utf-8")])
+        self.assertEqual([d.content for d in deltas], ["a", "b"])
+
+    def test_data_without_space(self):
+        _, deltas = decode([frame({"content": "x"}).replace("data: ", "data:").encode("utf-8")])
+        self.assertEqual([d.content for d in deltas], ["x"])
+
+    def test_unterminated_last_event(self):
+        _, deltas = decode([frame({"content": "x"}).rstrip("\n").encode("utf-8")])
+        self.assertEqual([d.content for d in deltas], ["x"])
+
+    def test_error_body(self):
+        _, deltas = decode([b'{"error": {"message": "rate limited"}}\n'])
+        self.assertEqual([d.error for d in deltas], [{"message": "rate limited"}])
+
+    def test_undecodable_event_is_skipped(self):
+        decoder, deltas = decode([b"data: {oops\n\n" + frame({"content": "x"}).encode("utf-8")])
+        self.assertEqual([d.content for d in deltas], ["x"])
+        self.assertEqual(decoder.undecodable, 1)
+
+    def test_stdlib_json_fallback(self):
+        loads = sse._loads
+        sse._loads = sse._json_loads
+        try:
+            self.assert_decoded([BODY])
+        finally:
+            sse._loads = loads
+
+class TestChatChunks(unittest.IsolatedAsyncioTestCase):
+    async def test_async_chunks(self):
+        async def reads():
+            for i in range(0, len(BODY), 7):
+                yield BODY[i:i + 7]
+        chunks = [c async for c in iter_chat_chunks(reads(), "test", reasoning=True)]
+        self.assertEqual(chunks, ["先想想", "抱抱你，", "辛苦了。"])
+        self.assertIsInstance(chunks[0], Reasoning)
+
+    async def chunks(self, reads, **kwargs):
+        async def stream():
+            for data in reads:
+                yield data
+        return [c async for c in iter_chat_chunks(stream(), "test", **kwargs)]
+
+    async def test_chunks_without_reasoning(self):
+        self.assertEqual(await self.chunks([BODY]), ["抱抱你，", "辛苦了。"])
+
+    async def test_error_chunk(self):
+        self.assertEqual(await self.chunks([b'{"error": "bad key"}']), ["[ERROR] bad key"])
+
+    async def test_stops_at_done(self):
+        chunks = await self.chunks([BODY, frame({"content": "after"}).encode("utf-8")])
+        self.assertNotIn("after", chunks)
+
+if __name__ == "__main__":
+    unittest.main()
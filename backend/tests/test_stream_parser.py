@@ -0,0 +1,54 @@
+import unittest
+from app.services.stream_parser import SuggestionStreamParser, format_suggestions_marker, parse_suggestions
+
+REPLY = '抱抱你，今天辛苦了。\n|||SUGGESTIONS=["我也想罢工啊！", "求个抱抱"]|||'
+
+def run(chunks):
+    parser = SuggestionStreamParser()
+    events = []
+    for chunk in chunks:
+        events.extend(parser.feed(chunk))
+    events.extend(parser.finish())
+    return parser, events
+
+class TestSuggestionStreamParser(unittest.TestCase):
+    def assert_parsed(self, chunks):
+        parser, events = run(chunks)
+        deltas = "".join(e.data for e in events if e.type == "delta")
+        self.assertEqual(deltas, "抱抱你，今天辛苦了。")
+        self.assertEqual(parser.text, deltas)
+        self.assertEqual([e.data for e in events if e.type == "suggestions"], [["我也想罢工啊！", "求个抱抱"]])
+        self.assertNotIn("|", deltas)
+
+    def test_whole_reply(self):
+        self.assert_parsed([REPLY])
+
+    def test_every_split_point(self):
+        for i in range(1, len(REPLY)):
+            with self.subTest(split=i):
+                self.assert_parsed([REPLY[:i], REPLY[i:]])
+
+    def test_single_characters(self):
+        self.assert_parsed(list(REPLY))
+
+    def test_pipes_in_text_are_kept(self):
+        parser, events = run(["a || b", " |", "|x"])
+        self.assertEqual(parser.text, "a || b ||x")
+        self.assertFalse([e for e in events if e.type == "suggestions"])
+
+    def test_unterminated_marker(self):
+        parser, events = run(['好的|||SUGGESTION=["再说说"'])
+        self.assertEqual(parser.text, "好的")
+        self.assertEqual(parser.suggestions, ["再说说"])
+
+    def test_loose_list(self):
+        self.assertEqual(parse_suggestions("[一, '二', \"三\"]"), ["一", "二", "三"])
+
+    def test_marker_round_trip(self):
+        marker = format_suggestions_marker(["一", "二"])
+        self.assertEqual(marker, '|||SUGGESTIONS=["一","二"]|||')
+        parser, _ = run(["text", marker])
+        self.assertEqual(parser.suggestions, ["一", "二"])
+
+if __name__ == "__main__":
+    unittest.main()
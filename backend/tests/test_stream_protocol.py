@@ -0,0 +1,87 @@
+import asyncio
+import json
+import unittest
+from app.services.stream_parser import StreamEvent
+from app.services.stream_registry import StreamExpired
+from app.services.stream_protocol import EventEncoder, encode_events, encode_text, negotiate_format
+
+async def scripted(items):
+    for seq, (delay, event) in enumerate(items, start=1):
+        await asyncio.sleep(delay)
+        yield seq, event
+
+async def ndjson_frames(items, **kwargs):
+    out = b"".join([chunk async for chunk in encode_events(scripted(items), EventEncoder("ndjson"), **kwargs)])
+    return [json.loads(line) for line in out.decode("utf-8").splitlines()]
+
+class TestNegotiation(unittest.TestCase):
+    def test_negotiate(self):
+        self.assertEqual(negotiate_format(None), "text")
+        self.assertEqual(negotiate_format("*/*"), "text")
+        self.assertEqual(negotiate_format("text/event-stream"), "sse")
+        self.assertEqual(negotiate_format("application/x-ndjson"), "ndjson")
+        self.assertEqual(negotiate_format("text/event-stream", "ndjson"), "ndjson")
+        with self.assertRaises(ValueError):
+            negotiate_format(None, "xml")
+
+    def test_sse_frame(self):
+        frame = EventEncoder("sse").frame(1, "suggestions", ["好"]).decode("utf-8")
+        lines = frame.split("\n")
+        self.assertEqual(lines[:2], ["id: 1", "event: suggestions"])
+        self.assertEqual(json.loads(lines[2][len("data: "):])["data"], ["好"])
+        self.assertTrue(frame.endswith("\n\n"))
+
+class TestEncodeEvents(unittest.IsolatedAsyncioTestCase):
+    async def test_first_delta_alone_then_packed(self):
+        items = [(0, StreamEvent("delta", "你"))] + [(0, StreamEvent("delta", c)) for c in "好呀"]
+        items.append((0, StreamEvent("suggestions", ["嗯"])))
+        items.append((0, StreamEvent("done", {"ok": True})))
+        frames = await ndjson_frames(items, pack_interval=0.05)
+        self.assertEqual([(f["type"], f["data"]) for f in frames], [
+            ("delta", "你"), ("delta", "好呀"), ("suggestions", ["嗯"]), ("done", {"ok": True}),
+        ])
+        # A packed frame carries the seq of its last event, so resuming skips all of it
+        self.assertEqual([f["seq"] for f in frames], [1, 3, 4, 5])
+
+    async def test_reasoning_packed_separately_from_answer(self):
+        items = [(0, StreamEvent("reasoning", c)) for c in "先共情"]
+        items += [(0, StreamEvent("delta", c)) for c in "你好呀"]
+        frames = await ndjson_frames(items, pack_interval=0.05)
+        self.assertEqual([(f["type"], f["data"], f["seq"]) for f in frames], [
+            ("reasoning", "先", 1), ("reasoning", "共情", 3), ("delta", "你", 4), ("delta", "好呀", 6),
+        ])
+        # Plain-text clients only ever see the answer
+        out = b"".join([chunk async for chunk in encode_text(scripted(items))]).decode("utf-8")
+        self.assertEqual(out, "你好呀")
+
+    async def test_heartbeat_while_idle(self):
+        frames = await ndjson_frames([(0.05, StreamEvent("delta", "hi"))], heartbeat_interval=0.01)
+        self.assertEqual(frames[0]["type"], "heartbeat")
+        self.assertNotIn("seq", frames[0])
+        self.assertEqual(frames[-1]["type"], "delta")
+
+    async def test_follow_failure_becomes_error_frame(self):
+        async def failing():
+            yield 1, StreamEvent("delta", "hi")
+            raise RuntimeError("expired")
+
+        out = b"".join([chunk async for chunk in encode_events(failing(), EventEncoder("ndjson"))])
+        frames = [json.loads(line) for line in out.decode("utf-8").splitlines()]
+        self.assertEqual([(f["type"], f["seq"]) for f in frames], [("delta", 1), ("error", 1)])
+
+class TestEncodeText(unittest.IsolatedAsyncioTestCase):
+    async def test_follow_failure_becomes_error_text(self):
+        async def failing():
+            yield 1, StreamEvent("delta", "hi")
+            raise StreamExpired("events after seq 1 are no longer buffered")
+
+        out = b"".join([chunk async for chunk in encode_text(failing())]).decode("utf-8")
+        self.assertEqual(out, "hi[ERROR] events after seq 1 are no longer buffered")
+
+    async def test_marker_appended_at_end(self):
+        items = [(0, StreamEvent("delta", "你好")), (0, StreamEvent("suggestions", ["嗯"])), (0, StreamEvent("done", {"ok": True}))]
+        out = b"".join([chunk async for chunk in encode_text(scripted(items))]).decode("utf-8")
+        self.assertEqual(out, '你好|||SUGGESTIONS=["嗯"]|||')
+
+if __name__ == "__main__":
+    unittest.main()
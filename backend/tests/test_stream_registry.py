@@ -0,0 +1,103 @@
+import asyncio
+import unittest
+from app.services.stream_parser import StreamEvent
+from app.services.stream_registry import StreamExpired, StreamRegistry
+
+async def scripted(events, gate: asyncio.Event = None):
+    for event in events:
+        if gate is not None:
+            await gate.wait()
+        yield event
+
+async def collect(stream, after=0):
+    return [(seq, event.type, event.data) async for seq, event in stream.follow(after)]
+
+class TestStreamRegistry(unittest.IsolatedAsyncioTestCase):
+    async def test_replay_from_offset(self):
+        registry = StreamRegistry()
+        stream = registry.create("u1")
+        registry.run(stream, scripted([StreamEvent("delta", "a"), StreamEvent("delta", "b")]))
+        self.assertEqual(await collect(stream), [(1, "delta", "a"), (2, "delta", "b"), (3, "done", {"ok": True})])
+        self.assertEqual(await collect(stream, after=2), [(3, "done", {"ok": True})])
+
+    async def test_live_follow_sees_later_events(self):
+        registry = StreamRegistry()
+        stream = registry.create("u1")
+        gate = asyncio.Event()
+        registry.run(stream, scripted([StreamEvent("delta", "a")], gate))
+        follower = asyncio.create_task(collect(stream))
+        await asyncio.sleep(0.01)
+        self.assertFalse(follower.done())
+        gate.set()
+        self.assertEqual([seq for seq, _, _ in await follower], [1, 2])
+
+    async def test_detached_generation_is_cancelled_after_grace(self):
+        registry = StreamRegistry(disconnect_grace=0.02)
+        stream = registry.create("u1")
+        cancelled = asyncio.Event()
+
+        async def endless():
+            try:
+                while True:
+                    yield StreamEvent("delta", "a")
+                    await asyncio.sleep(0.005)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        registry.run(stream, endless())
+        await asyncio.wait_for(cancelled.wait(), 1)
+        await asyncio.sleep(0)
+        self.assertTrue(stream.finished)
+        self.assertEqual(stream._events[-1].data, {"ok": False, "abandoned": True})
+        self.assertEqual(registry.stats()["abandoned"], 1)
+
+    async def test_follower_within_grace_keeps_generation(self):
+        registry = StreamRegistry(disconnect_grace=0.03)
+        stream = registry.create("u1")
+        gate = asyncio.Event()
+        registry.run(stream, scripted([StreamEvent("delta", "a")], gate))
+        follower = asyncio.create_task(collect(stream))
+        await asyncio.sleep(0.06)
+        gate.set()
+        self.assertEqual([t for _, t, _ in await follower], ["delta", "done"])
+        self.assertFalse(stream.abandoned)
+
+    async def test_producer_runs_without_followers(self):
+        registry = StreamRegistry()
+        stream = registry.create("u1")
+        registry.run(stream, scripted([StreamEvent("delta", "a")]))
+        self.assertEqual(registry.stats()["detached"], 1)
+        await asyncio.sleep(0.01)
+        self.assertTrue(stream.finished)
+        self.assertEqual(registry.stats()["running"], 0)
+
+    async def test_find_by_idempotency_key(self):
+        registry = StreamRegistry()
+        stream = registry.create("u1", "msg-1")
+        self.assertIs(registry.find("u1", "msg-1"), stream)
+        self.assertIsNone(registry.find("u2", "msg-1"))
+        self.assertIsNone(registry.find("u1", None))
+        registry.discard(stream)
+        self.assertIsNone(registry.find("u1", "msg-1"))
+
+    async def test_expired_offset_raises(self):
+        registry = StreamRegistry(max_events=2)
+        stream = registry.create("u1")
+        registry.run(stream, scripted([StreamEvent("delta", c) for c in "abc"]))
+        await asyncio.sleep(0.01)
+        self.assertEqual(stream.first_seq, 3)
+        with self.assertRaises(StreamExpired):
+            await collect(stream, after=1)
+        self.assertEqual([seq for seq, _, _ in await collect(stream, after=2)], [3, 4])
+
+    async def test_finished_streams_expire_after_retention(self):
+        registry = StreamRegistry(retention=0)
+        stream = registry.create("u1", "msg-1")
+        registry.run(stream, scripted([]))
+        await asyncio.sleep(0.01)
+        self.assertIsNone(registry.get(stream.stream_id))
+        self.assertIsNone(registry.find("u1", "msg-1"))
+
+if __name__ == "__main__":
+    unittest.main()
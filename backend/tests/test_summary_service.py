@@ -0,0 +1,95 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+from sqlalchemy.orm import sessionmaker
+from app.services import summary_service
+from app.storage import conversation_storage as storage
+from app.storage.async_storage import history_cache
+from config.settings import settings
+
+class FakeLLM:
+    """
+    Summarises by counting calls; fails while `fail` is set.
+    """
+    def __init__(self):
+        self.prompts = []
+        self.fail = False
+
+    async def chat_completion(self, messages, thinking_enabled=False, **kwargs):
+        self.prompts.append(messages[0]["content"])
+        if self.fail:
+            return {"error": "upstream down"}
+        return {"choices": [{"message": {"content": f"摘要{len(self.prompts)}"}}]}
+
+class TestSummaryService(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        # A throwaway database in place of the configured one
+        self.tmp = tempfile.mkdtemp()
+        engine = storage.create_storage_engine(f"sqlite:///{os.path.join(self.tmp, 'test.db')}")
+        storage.Base.metadata.create_all(bind=engine)
+        self.llm = FakeLLM()
+        for patch in (
+            mock.patch.object(storage, "engine", engine),
+            mock.patch.object(storage, "SessionLocal", sessionmaker(autoflush=False, expire_on_commit=False, bind=engine)),
+            mock.patch.object(summary_service, "get_async_llm_client", lambda: self.llm),
+        ):
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.addCleanup(engine.dispose)
+        self.addCleanup(shutil.rmtree, self.tmp, True)
+        self.addCleanup(history_cache.invalidate, "u1")
+
+    def add_messages(self, count, start=0):
+        return [storage.save_message("u1", "user", f"消息{i}").id for i in range(start, start + count)]
+
+    async def test_short_history_is_not_summarised(self):
+        ids = self.add_messages(10)
+        text, last_id = await summary_service.build_card_conversation("u1")
+        self.assertEqual(self.llm.prompts, [])
+        self.assertIsNone(storage.get_summary("u1"))
+        self.assertEqual(text.count("消息"), 10)
+        self.assertEqual(last_id, ids[-1])
+
+    async def test_bootstrap_folds_all_but_recent(self):
+        ids = self.add_messages(30)
+        summary, upto = await summary_service.refresh_summary("u1")
+        keep = settings.SUMMARY_KEEP_RECENT
+        self.assertEqual((summary, upto), ("摘要1", ids[-keep - 1]))
+        row = storage.get_summary("u1")
+        self.assertEqual((row.summary, row.last_message_id), (summary, upto))
+
+    async def test_incremental_fold_only_sends_new_messages(self):
+        ids = self.add_messages(30)
+        storage.save_summary("u1", "旧摘要", ids[9])
+        summary, upto = await summary_service.refresh_summary("u1")
+        self.assertEqual(len(self.llm.prompts), 1)
+        self.assertIn("旧摘要", self.llm.prompts[0])
+        self.assertNotIn("消息9\n", self.llm.prompts[0])
+        self.assertIn("消息10\n", self.llm.prompts[0])
+        self.assertEqual(upto, ids[-settings.SUMMARY_KEEP_RECENT - 1])
+        self.assertEqual(storage.get_summary("u1").last_message_id, upto)
+
+    async def test_llm_failure_keeps_old_summary(self):
+        ids = self.add_messages(30)
+        storage.save_summary("u1", "旧摘要", ids[4])
+        self.llm.fail = True
+        summary, upto = await summary_service.refresh_summary("u1")
+        self.assertEqual((summary, upto), ("旧摘要", ids[4]))
+        row = storage.get_summary("u1")
+        self.assertEqual((row.summary, row.last_message_id), ("旧摘要", ids[4]))
+
+    async def test_card_prompt_stays_bounded_when_folding_fails(self):
+        ids = self.add_messages(300)
+        storage.save_summary("u1", "旧摘要", ids[0])
+        self.llm.fail = True
+        text, last_id = await summary_service.build_card_conversation("u1")
+        limit = settings.SUMMARY_KEEP_RECENT + settings.SUMMARY_FOLD_MIN
+        self.assertEqual(text.count("user: "), limit)
+        self.assertIn("消息299", text)
+        self.assertNotIn(f"消息{299 - limit}\n", text)
+        self.assertEqual(last_id, ids[-1])
+
+if __name__ == "__main__":
+    unittest.main()
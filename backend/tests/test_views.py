@@ -0,0 +1,41 @@
+import unittest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.api import views
+from app.services.stream_parser import StreamEvent
+
+class TestResumeChatStream(unittest.TestCase):
+    def setUp(self):
+        app = FastAPI()
+        app.include_router(views.router, prefix="/api")
+        self.client = TestClient(app)
+        # A finished stream whose first events have left the replay buffer
+        self.stream = views.stream_registry.create("u1", "msg-1")
+        for i in range(views.stream_registry.max_events + 5):
+            self.stream.append(StreamEvent("delta", str(i)))
+        self.stream._finish()
+        self.addCleanup(views.stream_registry.discard, self.stream)
+
+    def test_negative_offset_is_rejected(self):
+        response = self.client.get(f"/api/chat/streams/{self.stream.stream_id}", params={"after": -1})
+        self.assertEqual(response.status_code, 422)
+
+    def test_expired_offset_is_gone_in_every_format(self):
+        for fmt in ("ndjson", "sse", "text"):
+            with self.subTest(fmt=fmt):
+                response = self.client.get(f"/api/chat/streams/{self.stream.stream_id}", params={"after": 0, "stream_format": fmt})
+                self.assertEqual(response.status_code, 410)
+
+    def test_duplicate_chat_request_with_expired_buffer_is_gone(self):
+        response = self.client.post("/api/chat", json={"user_id": "u1", "content": "hi", "client_msg_id": "msg-1"})
+        self.assertEqual(response.status_code, 410)
+
+    def test_buffered_offset_replays(self):
+        after = self.stream.first_seq - 1
+        response = self.client.get(f"/api/chat/streams/{self.stream.stream_id}", params={"after": after})
+        self.assertEqual(response.status_code, 200)
+        # Deltas are packed into fewer frames; the newest ones are all there
+        self.assertIn(str(views.stream_registry.max_events + 4), response.text)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+import asyncio
+import threading
+import time
+import unittest
+from app.storage.write_behind import MessageWriteBehind
+
+class FakeStore:
+    def __init__(self):
+        self.batches = []
+        self.next_id = 1
+        self.fail_next = 0
+
+    def write_batch(self, records):
+        if self.fail_next:
+            self.fail_next -= 1
+            raise RuntimeError("database is locked")
+        ids = list(range(self.next_id, self.next_id + len(records)))
+        self.next_id += len(records)
+        self.batches.append([r.content for r in records])
+        return ids
+
+async def run_inline(fn, *args):
+    return fn(*args)
+
+async def run_in_thread(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+
+class TestMessageWriteBehind(unittest.IsolatedAsyncioTestCase):
+    async def test_batched_mode_groups_concurrent_writes(self):
+        store = FakeStore()
+        writer = MessageWriteBehind(store.write_batch, run_inline, mode="batched", flush_interval=0.01)
+        records = await asyncio.gather(*[writer.save("u", "user", f"m{i}") for i in range(10)])
+        await writer.stop()
+        self.assertEqual(len(store.batches), 1)
+        self.assertEqual([r.id for r in records], list(range(1, 11)))
+
+    async def test_async_mode_exposes_unflushed_messages(self):
+        store = FakeStore()
+        writer = MessageWriteBehind(store.write_batch, run_inline, mode="async", flush_interval=0.05)
+        record = await writer.save("u", "user", "hello")
+        self.assertIsNone(record.id)
+        self.assertEqual(writer.pending_for("u"), [record])
+        self.assertEqual(writer.pending_for("other"), [])
+        await writer.stop()
+        self.assertEqual(record.id, 1)
+        self.assertEqual(writer.pending_for("u"), [])
+
+    async def test_failed_batch_is_retried(self):
+        store = FakeStore()
+        store.fail_next = 1
+        writer = MessageWriteBehind(store.write_batch, run_inline, mode="batched", flush_interval=0.01)
+        record = await writer.save("u", "user", "hello")
+        await writer.stop()
+        self.assertEqual(record.id, 1)
+        self.assertEqual(writer.stats()["failed"], 0)
+
+    async def test_sync_mode_writes_immediately(self):
+        store = FakeStore()
+        writer = MessageWriteBehind(store.write_batch, run_inline, mode="sync")
+        record = await writer.save("u", "user", "hello")
+        self.assertEqual(record.id, 1)
+        self.assertEqual(store.batches, [["hello"]])
+
+    async def test_stop_during_slow_commit_settles_the_batch(self):
+        store = FakeStore()
+        writing = threading.Event()
+
+        def slow_write_batch(records):
+            writing.set()
+            time.sleep(0.1)
+            return store.write_batch(records)
+
+        writer = MessageWriteBehind(slow_write_batch, run_in_thread, mode="batched", flush_interval=0.01)
+        save = asyncio.create_task(writer.save("u", "user", "hello"))
+        while not writing.is_set():
+            await asyncio.sleep(0.005)
+        await writer.stop()
+        record = await asyncio.wait_for(save, timeout=1)
+        self.assertEqual(record.id, 1)
+        self.assertEqual(store.batches, [["hello"]])
+        self.assertEqual(writer.pending_for("u"), [])
+
+    async def test_writer_restarts_after_stop(self):
+        store = FakeStore()
+        writer = MessageWriteBehind(store.write_batch, run_inline, mode="batched", flush_interval=0.01)
+        await writer.save("u", "user", "first")
+        await writer.stop()
+        record = await asyncio.wait_for(writer.save("u", "user", "second"), timeout=1)
+        await writer.stop()
+        self.assertEqual(record.id, 2)
+
+if __name__ == '__main__':
+    unittest.main()
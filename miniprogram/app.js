@@ -1,4 +1,6 @@
 // app.js
+const api = require('./utils/api.js');
+
 App({
   onLaunch() {
     // Load Custom Font via Backend Static File (Workaround for Simulator)
@@ -28,6 +30,10 @@ App({
       }
     })
   },
+  onHide() {
+    // Don't lose buffered logs when the mini-program goes to the background
+    api.flushLogs();
+  },
   globalData: {
     userInfo: null
   }
@@ -2,6 +2,8 @@ const api = require('../../utils/api.js');
 const { ASSETS } = require('../../utils/assets.js');
 const app = getApp();
 
+const REASONING_PREVIEW_CHARS = 60;
+
 Page({
   data: {
     messages: [],
@@ -18,6 +20,7 @@ Page({
     isUserTyping: false,
     userCatUrl: ASSETS.avatars.user.src,
     typeStep: 0,
+    reasoningPreview: '', // tail of the model's thinking, shown while waiting for the reply
     assets: ASSETS
   },
 
@@ -193,12 +196,28 @@ Page({
     this.isTyping = false;
     this.networkFinished = false;
     this.pendingBuffer = ''; // Initialize pending buffer to avoid "undefined" prefix
+    this.streamSuggestions = null; // Sent by the server as a separate event
+    this.reasoningText = '';
+    this.reasoningShownAt = 0;
 
     api.chatStream(this.data.userId, content, this.data.mode, {
+      onReasoning: (text) => {
+        this.reasoningText = (this.reasoningText + text).slice(-REASONING_PREVIEW_CHARS);
+        // Thinking streams fast; a few updates a second are enough to show progress
+        const now = Date.now();
+        if (now - this.reasoningShownAt > 200) {
+          this.reasoningShownAt = now;
+          this.setData({ reasoningPreview: this.reasoningText });
+        }
+      },
       onChunk: (text) => {
+        if (this.data.reasoningPreview) this.setData({ reasoningPreview: '' });
         this.streamBuffer += text;
         this.processStreamBuffer(assistantMsgIndex);
       },
+      onSuggestions: (items) => {
+        this.streamSuggestions = items;
+      },
       onComplete: () => {
         this.networkFinished = true;
         this.processStreamBuffer(assistantMsgIndex);
@@ -212,7 +231,7 @@ Page({
       onError: (err) => {
         console.error('[Chat Error]:', err);
         this.networkFinished = true;
-        this.setData({ loading: false, isTalking: false });
+        this.setData({ loading: false, isTalking: false, reasoningPreview: '' });
       }
     });
   },
@@ -292,7 +311,10 @@ Page({
            }
 
            // 2. Process suggestions if any (if stream ended abruptly)
-           if (this.suggestionText) {
+           if (this.streamSuggestions) {
+               this.checkSuggestions(JSON.stringify(this.streamSuggestions), true);
+               this.streamSuggestions = null;
+           } else if (this.suggestionText) {
                // If we were parsing, try to extract whatever we got
                // But usually we expect ||| at end. 
                // If network finished and we are still parsing, maybe the closing tag was missing?
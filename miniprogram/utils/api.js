@@ -24,32 +24,56 @@ const request = (url, method, data, timeout = 60000) => {
   });
 };
 
+const LOG_BATCH_SIZE = 20;
+const LOG_FLUSH_MS = 2000;
+let logBuffer = [];
+let logTimer = null;
+
+const flushLogs = () => {
+  if (logTimer) {
+    clearTimeout(logTimer);
+    logTimer = null;
+  }
+  if (!logBuffer.length) return;
+  const entries = logBuffer;
+  logBuffer = [];
+  // Fire and forget
+  wx.request({
+    url: BASE_URL + '/log',
+    method: 'POST',
+    data: { entries: entries }
+  });
+};
+
+const queueLog = (level, message, context) => {
+  logBuffer.push({ level: level, message: message, context: context, ts: Date.now() });
+  if (logBuffer.length >= LOG_BATCH_SIZE) {
+    flushLogs();
+  } else if (!logTimer) {
+    logTimer = setTimeout(flushLogs, LOG_FLUSH_MS);
+  }
+};
+
 const api = {
   chat: (userId, content, mode = 'concise') => request('/chat', 'POST', { user_id: userId, content: content, mode: mode }),
   
+  // Streams the reply as NDJSON events (one JSON object per line).
+  // Lines are split on the raw bytes before decoding: '\n' never occurs inside
+  // a multibyte UTF-8 character, so a character cut across chunks can't break decoding.
+  // If the connection drops mid-reply, it resumes once from the last seen event
+  // (GET /chat/streams/{id}?after=seq); client_msg_id stops a retried POST from
+  // saving and answering the message twice. With an onReasoning callback,
+  // a reasoning model's thinking arrives before the first chunk.
   chatStream: (userId, content, mode = 'concise', callbacks) => {
-    const { onChunk, onComplete, onError } = callbacks;
-    const requestTask = wx.request({
-      url: BASE_URL + '/chat',
-      method: 'POST',
-      enableChunked: true,
-      data: { user_id: userId, content: content, mode: mode },
-      header: {
-        'content-type': 'application/json'
-      },
-      success(res) {
-        if (res.statusCode >= 200 && res.statusCode < 300) {
-          if (onComplete) onComplete();
-        } else {
-          if (onError) onError({ error: 'Request failed', statusCode: res.statusCode });
-        }
-      },
-      fail(err) {
-        if (onError) onError(err);
-      }
-    });
+    const { onChunk, onReasoning, onSuggestions, onComplete, onError } = callbacks;
+    const clientMsgId = `${userId}-${Date.now()}-${Math.random().toString(36).slice(2, 8)}`;
+    let failed = false;
+    let finished = false;
+    let streamId = null;
+    let lastSeq = 0;
+    let resumed = false;
+    let pending = new Uint8Array(0);
 
-    // Try to use TextDecoder if available
     let decoder;
     try {
         decoder = new TextDecoder('utf-8');
@@ -57,57 +81,134 @@ const api = {
         console.warn('TextDecoder not supported, falling back to simple decode');
     }
 
-    requestTask.onChunkReceived((res) => {
-      let text = '';
-      if (decoder) {
-        text = decoder.decode(res.data, { stream: true });
-      } else {
-        // Fallback for older environments (might have issues with split multibyte chars)
-        const uint8Arr = new Uint8Array(res.data);
-        // Avoid stack overflow on large chunks
-        if (uint8Arr.length < 10000) {
-            try {
-                text = decodeURIComponent(escape(String.fromCharCode(...uint8Arr)));
-            } catch (e) {
-                console.error('Decode error', e);
-            }
-        } else {
-             console.error('Chunk too large for fallback decoder');
+    const decodeLine = (bytes) => {
+      if (decoder) return decoder.decode(bytes);
+      let binary = '';
+      // Build the string in slices to avoid stack overflow on long lines
+      for (let i = 0; i < bytes.length; i += 4096) {
+        binary += String.fromCharCode.apply(null, bytes.subarray(i, i + 4096));
+      }
+      return decodeURIComponent(escape(binary));
+    };
+
+    const handleEvent = (event) => {
+      if (event.seq) {
+        // Replayed events we already handled
+        if (event.seq <= lastSeq) return;
+        lastSeq = event.seq;
+      }
+      switch (event.type) {
+        case 'delta':
+          if (onChunk) onChunk(event.data);
+          break;
+        case 'reasoning':
+          if (onReasoning) onReasoning(event.data);
+          break;
+        case 'suggestions':
+          if (onSuggestions) onSuggestions(event.data);
+          break;
+        case 'error':
+          failed = true;
+          if (onError) onError({ error: event.data });
+          break;
+        case 'done':
+          finished = true;
+          break;
+        default:
+          // heartbeat, usage
+          break;
+      }
+    };
+
+    const flushLine = (bytes) => {
+      if (!bytes.length) return;
+      try {
+        handleEvent(JSON.parse(decodeLine(bytes)));
+      } catch (e) {
+        console.error('Bad stream line', e);
+      }
+    };
+
+    const onChunkReceived = (res) => {
+      const chunk = new Uint8Array(res.data);
+      let buffer = chunk;
+      if (pending.length) {
+        buffer = new Uint8Array(pending.length + chunk.length);
+        buffer.set(pending);
+        buffer.set(chunk, pending.length);
+      }
+      let start = 0;
+      for (let i = 0; i < buffer.length; i++) {
+        if (buffer[i] === 10) {
+          flushLine(buffer.subarray(start, i));
+          start = i + 1;
         }
       }
-      
-      if (text && onChunk) {
-          onChunk(text);
+      pending = buffer.slice(start);
+    };
+
+    const finish = (res) => {
+      if (res.statusCode >= 200 && res.statusCode < 300) {
+        flushLine(pending);
+        pending = new Uint8Array(0);
+        if (!failed && !finished && resume()) return;
+        if (!failed && onComplete) onComplete();
+      } else {
+        if (onError) onError({ error: 'Request failed', statusCode: res.statusCode });
       }
-    });
+    };
 
-    return requestTask;
-  },
+    const fail = (err) => {
+      pending = new Uint8Array(0);
+      if (!resume() && onError) onError(err);
+    };
 
-  generateCard: (userId) => request('/generate_card', 'POST', { user_id: userId }, 120000), // 生成卡片可能较慢，设置 120秒超时
-  logError: (message, context = {}) => {
-    // Fire and forget log request
-    wx.request({
-      url: BASE_URL + '/log',
+    const open = (options) => {
+      const task = wx.request(Object.assign({
+        enableChunked: true,
+        header: {
+          'content-type': 'application/json',
+          'accept': 'application/x-ndjson'
+        },
+        success: finish,
+        fail: fail
+      }, options));
+      task.onHeadersReceived((res) => {
+        const header = res.header || {};
+        streamId = header['X-Stream-Id'] || header['x-stream-id'] || streamId;
+      });
+      task.onChunkReceived(onChunkReceived);
+      return task;
+    };
+
+    // One resume attempt per message, picking up after the last event seen
+    const resume = () => {
+      if (resumed || !streamId) return false;
+      resumed = true;
+      open({
+        url: `${BASE_URL}/chat/streams/${streamId}?after=${lastSeq}&stream_format=ndjson`,
+        method: 'GET'
+      });
+      return true;
+    };
+
+    return open({
+      url: BASE_URL + '/chat',
       method: 'POST',
       data: {
-        level: 'error',
-        message: message,
-        context: context
+        user_id: userId, content: content, mode: mode, stream_format: 'ndjson', client_msg_id: clientMsgId,
+        // Only ask for the model's thinking when the page shows it
+        show_reasoning: !!onReasoning
       }
     });
   },
-  logInfo: (message, context = {}) => {
-    wx.request({
-      url: BASE_URL + '/log',
-      method: 'POST',
-      data: {
-        level: 'info',
-        message: message,
-        context: context
-      }
-    });
-  }
+
+  generateCard: (userId) => request('/generate_card', 'POST', { user_id: userId }, 120000), // 生成卡片可能较慢，设置 120秒超时
+  // Logs are buffered and sent to /log in batches, at most every
+  // LOG_FLUSH_MS or as soon as LOG_BATCH_SIZE entries are waiting.
+  logError: (message, context = {}) => queueLog('error', message, context),
+  logInfo: (message, context = {}) => queueLog('info', message, context),
+  flushLogs: () => flushLogs()
 };
 
 module.exports = api;